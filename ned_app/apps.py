@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class NedAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ned_app'
+
+    def ready(self):
+        from ned_app.signals import connect_receivers
+
+        connect_receivers(self)
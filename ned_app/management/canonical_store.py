@@ -0,0 +1,409 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from django.conf import settings
+
+from ned_app.models import derive_reference_id
+from ned_app.serialization.file_and_path_utiles import is_ndjson_path
+from ned_app.serialization.json_backend import loads
+
+
+# A file modified this recently may change again within the filesystem's
+# timestamp resolution without its (mtime, size) changing, so its stamp is not
+# trusted on its own (the same "racy" rule git applies to its index): its
+# bytes are re-read and compared by digest, which is far cheaper than parsing.
+RACY_WINDOW_NS = 2_000_000_000
+
+# Files smaller than this parse faster than their pickles load, so they are
+# not put in the parse cache.
+_MIN_CACHED_SIZE = 1 << 16
+
+# The parse cache keeps at most this many files, dropping the least recently
+# written.
+_MAX_CACHED_FILES = 64
+
+
+def file_stamp(path):
+    """
+    Return a file's (mtime_ns, size, inode) stamp.
+
+    A file whose stamp is unchanged, and whose mtime is older than
+    RACY_WINDOW_NS, is taken to be unchanged without reading it.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        tuple[int, int, int] | None: The stamp, or None if there is no file.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _fields_key(*fields):
+    """
+    Build a natural-key function over stored fields.
+
+    The key is a tuple of the fields' values as strings, with missing and
+    empty values as '', the form the importers compare CSV rows against.
+
+    Args:
+        *fields (str): The fields making up the key.
+
+    Returns:
+        Callable[[dict], tuple[str, ...]]: The key function.
+    """
+
+    def key(record):
+        return tuple(str(record.get(field, '') or '') for field in fields)
+
+    return key
+
+
+def _reference_key(record):
+    # reference_id is derived, not stored.
+    return (
+        derive_reference_id(record.get('reference_label', ''), record['csl_data']),
+    )
+
+
+# How records in each canonical file are identified.
+NATURAL_KEYS = {
+    'reference.json': _reference_key,
+    'component.json': _fields_key('component_id'),
+    'experiment.json': _fields_key('id'),
+    'fragility_model.json': _fields_key('reference', 'model_id'),
+    'fragility_curve.json': _fields_key('fragility_model', 'ds_rank'),
+    'component_fragility_model_bridge.json': _fields_key(
+        'component', 'fragility_model'
+    ),
+    'experiment_fragility_model_bridge.json': _fields_key(
+        'experiment', 'fragility_model'
+    ),
+}
+
+
+def parse_records(path, data):
+    """
+    Parse the bytes of a canonical data file.
+
+    Args:
+        path (str): The file's path; a '.ndjson' file holds one record per
+            line, any other a JSON array.
+        data (bytes): The file's contents.
+
+    Returns:
+        list[dict]: The records.
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON.
+    """
+    if is_ndjson_path(path):
+        return [loads(line) for line in data.splitlines() if line.strip()]
+    return loads(data)
+
+
+def natural_key_for(path):
+    """
+    Return the natural-key function for a data file, its variants and shards.
+
+    Args:
+        path (str): The file's path, e.g. '.../fragility_model.ndjson'.
+
+    Returns:
+        Callable[[dict], tuple]: The file's entry in NATURAL_KEYS.
+    """
+    return NATURAL_KEYS[os.path.splitext(os.path.basename(path))[0] + '.json']
+
+
+class ParseCache:
+    """
+    Parsed data files pickled to disk, shared between processes.
+
+    Each file's records are stored under a name derived from its path, with
+    the (mtime_ns, size, inode) stamp and SHA-1 digest of the bytes they were
+    parsed from. A file whose stamp is unchanged, and old enough to trust
+    (see RACY_WINDOW_NS), is served without being read; otherwise the
+    pickle is used only if the file's digest still matches.
+
+    By default the cache lives in the 'parsed' directory of
+    settings.NED_CACHE_DIR and is used only while settings.NED_PARSE_CACHE is
+    on; it is safe to delete.
+    """
+
+    def __init__(self, directory=None):
+        # None: resolved from the settings when used.
+        self._directory = directory
+
+    @property
+    def enabled(self):
+        if self._directory is not None:
+            return True
+        return getattr(settings, 'NED_PARSE_CACHE', False)
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return os.path.join(settings.NED_CACHE_DIR, 'parsed')
+
+    def _path(self, path):
+        name = hashlib.sha256(path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(
+            self.directory, f'{name}-{os.path.basename(path)}.pickle'
+        )
+
+    def get(self, path):
+        """
+        Return a file's cached parse.
+
+        Args:
+            path (str): The data file's absolute path.
+
+        Returns:
+            tuple[tuple | None, bytes, list[dict]] | None: The stamp,
+            digest and records, or None if nothing usable is cached.
+        """
+        try:
+            with open(self._path(path), 'rb') as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A truncated or stale-format pickle is a miss; it is replaced
+            # on the next put.
+            return None
+        if not isinstance(cached, dict) or cached.get('path') != path:
+            return None
+        return cached['stamp'], cached['digest'], cached['records']
+
+    def put(self, path, stamp, digest, records):
+        """
+        Cache a file's parse.
+
+        Failures to write are ignored: the cache only saves time.
+
+        Args:
+            path (str): The data file's absolute path.
+            stamp (tuple | None): The stamp the file was read at, or None
+                if the stamp cannot identify the file's contents yet.
+            digest (bytes): The SHA-1 digest of the bytes parsed.
+            records (list[dict]): The parsed records.
+        """
+        cache_path = self._path(path)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        cached = {'path': path, 'stamp': stamp, 'digest': digest, 'records': records}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+            self._prune()
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pickle'):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    continue
+        entries.sort(reverse=True)
+        for _, path in entries[_MAX_CACHED_FILES:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class _Entry:
+    """One parsed file, with the stamp it was parsed at and its indexes."""
+
+    def __init__(self, stamp, records, digest=None):
+        self.stamp = stamp
+        self.records = records
+        self.indexes = {}
+        # Set while the stamp alone cannot be trusted.
+        self.digest = digest
+
+
+class CanonicalStore:
+    """
+    Parsed canonical JSON files, shared by everything in a process.
+
+    Each file is parsed once and kept with its (mtime_ns, size, inode) stamp;
+    later requests reuse the parsed records for as long as the stamp is
+    unchanged, and re-parse the file when it is not. A file modified in the
+    last few seconds is also compared by digest, since a rewrite may keep
+    its stamp. Writes made through import_utils invalidate their files
+    directly. Indexed views map each
+    record's natural key to the record and are memoized with the records.
+    With a ParseCache, a file first requested in this process is loaded from
+    the cache's pickle when that is fresh, instead of being parsed.
+
+    The records are shared between callers and must not be modified.
+    """
+
+    def __init__(self, parse_cache=None):
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Optional ParseCache consulted before parsing a file.
+        self._parse_cache = parse_cache
+
+    @property
+    def parse_cache(self):
+        """The ParseCache in use, or None if there is none or it is off."""
+        if self._parse_cache is not None and self._parse_cache.enabled:
+            return self._parse_cache
+        return None
+
+    def _entry(self, path):
+        path = os.path.abspath(path)
+        # The stamp is taken before reading: if the file changes while it is
+        # read, the next request sees a different stamp.
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry.stamp == stamp and entry.digest is None:
+            return entry
+        if stamp is None:
+            entry = _Entry(None, [])
+        else:
+            read_at = time.time_ns()
+            trusted = stamp[0] < read_at - RACY_WINDOW_NS
+            cached = None
+            parse_cache = self.parse_cache
+            if entry is None and parse_cache is not None:
+                cached = parse_cache.get(path)
+            if cached is not None and trusted and cached[0] == stamp:
+                entry = _Entry(stamp, cached[2])
+            else:
+                entry = self._read(path, stamp, trusted, entry, cached)
+                # Once the file is old enough, its stamp alone identifies it.
+                if trusted:
+                    entry.digest = None
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def _read(self, path, stamp, trusted, entry, cached):
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).digest()
+        if entry is not None and entry.stamp == stamp and entry.digest == digest:
+            # Unchanged: keep the parsed records and indexes.
+            return entry
+        if cached is not None and cached[1] == digest:
+            records = cached[2]
+        else:
+            records = parse_records(path, data)
+        # A stamp taken while the file was racy may be shared by a later
+        # version of it, so it is only cached once it can be trusted.
+        cached_stamp = stamp if trusted else None
+        parse_cache = self.parse_cache
+        if (
+            parse_cache is not None
+            and len(data) >= _MIN_CACHED_SIZE
+            and (cached is None or cached[:2] != (cached_stamp, digest))
+        ):
+            parse_cache.put(path, cached_stamp, digest, records)
+        return _Entry(stamp, records, digest)
+
+    def records(self, path):
+        """
+        Return the records of a canonical JSON file.
+
+        Args:
+            path (str): The file's path.
+
+        Returns:
+            list[dict]: The parsed records (shared; do not modify), or an
+            empty list if the file does not exist.
+
+        Raises:
+            json.JSONDecodeError: If the file is not valid JSON.
+        """
+        return self._entry(path).records
+
+    def index(self, path, key=None):
+        """
+        Return a view of a file's records by natural key.
+
+        Records whose key cannot be computed (e.g. a reference without a
+        year) and '_comment' records are left out. For a key shared by
+        several records, the first one wins.
+
+        Args:
+            path (str): The file's path.
+            key (Callable[[dict], Hashable] | None): The key function
+                (default: the file's entry in NATURAL_KEYS). Pass the same
+                function object to share the memoized view.
+
+        Returns:
+            dict: Natural key to record (shared; do not modify).
+        """
+        return self._view(path, key, 'records')
+
+    def positions(self, path, key=None):
+        """
+        Return a view of where each natural key's record sits in a file.
+
+        Args:
+            path (str): The file's path.
+            key (Callable[[dict], Hashable] | None): As for index().
+
+        Returns:
+            dict: Natural key to the record's position in records(path)
+            (shared; do not modify).
+        """
+        return self._view(path, key, 'positions')
+
+    def _view(self, path, key, kind):
+        key = key or natural_key_for(path)
+        entry = self._entry(path)
+        views = entry.indexes.get(key)
+        if views is None:
+            positions = {}
+            for position, record in enumerate(entry.records):
+                if '_comment' in record:
+                    continue
+                try:
+                    positions.setdefault(key(record), position)
+                except (KeyError, IndexError, TypeError):
+                    continue
+            records = entry.records
+            views = entry.indexes[key] = {
+                'positions': positions,
+                'records': {k: records[p] for k, p in positions.items()},
+            }
+        return views[kind]
+
+    def invalidate(self, path=None):
+        """
+        Forget a parsed file, or every file.
+
+        Args:
+            path (str | None): The file written to, or None for all files.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+
+# The process-wide store used by the management commands; its parse cache
+# follows settings.NED_PARSE_CACHE.
+canonical_store = CanonicalStore(ParseCache())
@@ -0,0 +1,113 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ned_app.management.data_sources import open_data_source
+from ned_app.management.data_manifest import (
+    MANIFEST_FILE,
+    build_manifest,
+    diff_manifests,
+    load_manifest,
+    write_manifest,
+)
+
+# Record labels listed per data file and change kind before summarizing.
+_MAX_LISTED = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Hash every canonical record in resources/data/ by its natural key and '
+        f'write the per-file and dataset root hashes to {MANIFEST_FILE}. '
+        'Comparing two manifests shows which records differ without parsing '
+        'the data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help=f'Where to write the manifest (default: {MANIFEST_FILE}).',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help=(
+                'Do not write anything; fail, listing the differing records, '
+                'if the stored manifest does not match the data.'
+            ),
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='MANIFEST',
+            help=(
+                'List the records that differ between this manifest (e.g. from '
+                'another checkout) and the data.'
+            ),
+        )
+        parser.add_argument(
+            '--source',
+            help=(
+                'Where to read the data files: a directory, a .zip archive or '
+                'git:<revision> (default: the NED_DATA_SOURCE setting, or '
+                'resources/data/).'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        stored = load_manifest(options['output'])
+        try:
+            source = open_data_source(options['source'])
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        try:
+            manifest = build_manifest(previous=stored, source=source)
+        except json.JSONDecodeError as ex:
+            raise CommandError(f'Invalid JSON in the data files: {ex}')
+        finally:
+            if source is not None:
+                source.close()
+
+        if options['compare']:
+            other = load_manifest(options['compare'])
+            if other is None:
+                raise CommandError(f"Cannot read manifest '{options['compare']}'.")
+            self._report(diff_manifests(other, manifest))
+            return
+
+        if options['check']:
+            if stored is None:
+                raise CommandError('No manifest stored; run build_manifest.')
+            differences = diff_manifests(stored, manifest)
+            if differences:
+                self._report(differences)
+                raise CommandError(
+                    'The stored manifest is out of date; run build_manifest.'
+                )
+            self.stdout.write(self.style.SUCCESS(f'Up to date: {manifest["root"]}'))
+            return
+
+        write_manifest(manifest, options['output'])
+        count = sum(entry['count'] for entry in manifest['files'].values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote the manifest of {count} record(s): {manifest["root"]}'
+            )
+        )
+
+    def _report(self, differences):
+        if not differences:
+            self.stdout.write('No differences.')
+            return
+        for filename, kinds in differences.items():
+            self.stdout.write(f'{filename}:')
+            for kind in ('added', 'removed', 'changed'):
+                labels = kinds[kind]
+                if not labels:
+                    continue
+                self.stdout.write(f'  {kind} ({len(labels)}):')
+                for label in labels[:_MAX_LISTED]:
+                    self.stdout.write(f'    {label}')
+                if len(labels) > _MAX_LISTED:
+                    self.stdout.write(
+                        f'    ... and {len(labels) - _MAX_LISTED} more'
+                    )
@@ -0,0 +1,71 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ned_app.management.canonical_store import NATURAL_KEYS
+from ned_app.management.import_utils import convert_data_file
+from ned_app.serialization.file_and_path_utiles import (
+    NDJSON_SUFFIX,
+    build_json_data_file_path,
+    list_data_file_paths,
+)
+
+_SUFFIXES = {'json': '.json', 'ndjson': NDJSON_SUFFIX}
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the canonical data files in resources/data/ (and their '
+        'shards) between indented JSON arrays (.json) and newline-delimited '
+        'JSON (.ndjson). The records are unchanged; every reader accepts '
+        'either format.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to',
+            choices=sorted(_SUFFIXES),
+            required=True,
+            help='The format to convert the data files to.',
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='List the files that would be converted without changing them.',
+        )
+
+    def handle(self, *args, **options):
+        suffix = _SUFFIXES[options['to']]
+        conversions = []
+        for filename in NATURAL_KEYS:
+            for path in list_data_file_paths(build_json_data_file_path(filename)):
+                target = os.path.splitext(path)[0] + suffix
+                if target == path:
+                    continue
+                if os.path.exists(target):
+                    raise CommandError(
+                        f"Both '{path}' and '{target}' exist. Merge them into "
+                        'one file first; nothing was converted.'
+                    )
+                conversions.append((path, target))
+
+        if not conversions:
+            self.stdout.write(f'All data files are already {options["to"]}.')
+            return
+        if options['dry_run']:
+            for path, target in conversions:
+                self.stdout.write(f'[DRY RUN] {path} -> {target}')
+            return
+
+        # Each file is converted atomically, so an interrupted run leaves a
+        # mix of formats that every reader accepts; re-run to finish.
+        for path, target in conversions:
+            try:
+                count = convert_data_file(path, target)
+            except json.JSONDecodeError as ex:
+                raise CommandError(f'Invalid JSON in {path}: {ex}')
+            self.stdout.write(f'{path} -> {target} ({count} record(s))')
+        self.stdout.write(
+            self.style.SUCCESS(f'Converted {len(conversions)} data file(s).')
+        )
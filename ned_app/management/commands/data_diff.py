@@ -0,0 +1,104 @@
+import json
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ned_app.management.data_diff import (
+    MISSING,
+    describe_change,
+    diff_data_sources,
+)
+from ned_app.management.data_sources import DirectorySource, open_data_source
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the canonical records of two versions of the data (directories, '
+        '.zip archives or git revisions) by natural key, and list the records '
+        'added, removed and changed in each data file, field by field.'
+    )
+
+    def add_arguments(self, parser):
+        source_help = 'A directory, a .zip archive or git:<revision>'
+        parser.add_argument(
+            'old', help=f'The data before. {source_help} (e.g. git:main).'
+        )
+        parser.add_argument(
+            'new',
+            nargs='?',
+            help=(
+                f'The data after. {source_help} (default: the NED_DATA_SOURCE '
+                'setting, or resources/data/).'
+            ),
+        )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json'],
+            default='text',
+            help='Output format (default: text).',
+        )
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            sources = []
+            for spec in (options['old'], options['new']):
+                try:
+                    source = open_data_source(spec) or DirectorySource()
+                except ValueError as ex:
+                    raise CommandError(str(ex))
+                sources.append(stack.enter_context(source))
+            old, new = sources
+            try:
+                differences = diff_data_sources(old, new)
+            except json.JSONDecodeError as ex:
+                raise CommandError(f'Invalid JSON in the data files: {ex}')
+
+        if options['format'] == 'json':
+            self.stdout.write(self._as_json(old, new, differences))
+        else:
+            self._write_text(old, new, differences)
+
+    def _as_json(self, old, new, differences):
+        files = {
+            filename: {
+                'added': kinds['added'],
+                'removed': kinds['removed'],
+                'changed': {
+                    label: {
+                        field: {
+                            side: value
+                            for side, value in zip(('old', 'new'), values)
+                            if value is not MISSING
+                        }
+                        for field, values in fields.items()
+                    }
+                    for label, fields in kinds['changed'].items()
+                },
+            }
+            for filename, kinds in differences.items()
+        }
+        return json.dumps(
+            {'old': old.label, 'new': new.label, 'files': files},
+            indent=4,
+            ensure_ascii=False,
+        )
+
+    def _write_text(self, old, new, differences):
+        self.stdout.write(f'--- {old.label}\n+++ {new.label}')
+        if not differences:
+            self.stdout.write('No differences.')
+            return
+        for filename, kinds in differences.items():
+            self.stdout.write(
+                f'{filename}: {len(kinds["added"])} added, '
+                f'{len(kinds["removed"])} removed, '
+                f'{len(kinds["changed"])} changed'
+            )
+            for label in kinds['added']:
+                self.stdout.write(self.style.SUCCESS(f'  + {label}'))
+            for label in kinds['removed']:
+                self.stdout.write(self.style.ERROR(f'  - {label}'))
+            for label, fields in kinds['changed'].items():
+                self.stdout.write(self.style.WARNING(f'  ~ {label}'))
+                for field, values in fields.items():
+                    self.stdout.write(f'      {describe_change(field, *values)}')
@@ -1,7 +1,37 @@
 import os
 import json
-from decimal import Decimal
-from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from ned_app.management.dataset_versions import (
+    changes_since,
+    filter_by_keys,
+    latest_version,
+    natural_key,
+)
+from ned_app.management.partition_utils import (
+    concatenate_json_arrays,
+    filter_range,
+    part_filename,
+    partition_ranges,
+    parts_dir,
+    remove_parts,
+    run_partitions,
+    sha256_file,
+    write_manifest,
+)
+from ned_app.serialization.file_and_path_utiles import (
+    NDJSON_SUFFIX,
+    SHARD_FIELDS,
+    build_shard_filename,
+    get_ndjson_path,
+    get_shard_dir,
+    is_ndjson_path,
+)
+from ned_app.serialization.json_backend import (
+    DecimalEncoder,
+    dumps_canonical,
+    dumps_line,
+)
 from ned_app.models import (
     Reference,
     Component,
@@ -13,27 +43,333 @@ from ned_app.models import (
 )
 
 
-class DecimalEncoder(json.JSONEncoder):
+def reference_record(ref):
     """
-    Custom JSON encoder to handle Decimal objects.
+    Build the canonical JSON record for a Reference.
 
-    Converts Decimal instances to float for JSON serialization.
+    Excludes auto-populated denormalized fields (title, author, year) and
+    includes only the source-of-truth fields.
+
+    Args:
+        ref (Reference): The reference to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    # reference_id is derived at ingest, not stored in the source JSON.
+    ref_data = {
+        'study_type': ref.study_type,
+        'comp_type': ref.comp_type,
+        'pdf_saved': ref.pdf_saved,
+        'csl_data': ref.csl_data,
+    }
+    # Only emit reference_label when set, to keep unlabeled records clean.
+    if ref.reference_label:
+        ref_data['reference_label'] = ref.reference_label
+    return ref_data
+
+
+def component_record(comp):
     """
+    Build the canonical JSON record for a Component.
 
-    def default(self, obj):
-        """
-        Override default JSON encoding to handle Decimal objects.
+    Excludes auto-populated fields (major_group, group, element, subelement)
+    and uses the natural key (component_id) instead of database primary key.
 
-        Args:
-            obj: The object to encode.
+    Args:
+        comp (Component): The component to export.
 
-        Returns:
-            float: The float representation of a Decimal object.
-            Any: The default encoding for non-Decimal objects.
-        """
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super().default(obj)
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'component_id': comp.component_id,
+        'name': comp.name,
+    }
+
+
+def experiment_record(exp):
+    """
+    Build the canonical JSON record for an Experiment.
+
+    Args:
+        exp (Experiment): The experiment to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'id': exp.id,
+        'reference': exp.reference_id,
+        'specimen': exp.specimen,
+        'specimen_inspection_sequence': exp.specimen_inspection_sequence,
+        'reviewer': exp.reviewer,
+        # The FK's stored to_field value; no join or per-row query needed.
+        'component': exp.component_id,
+        'comp_detail': exp.comp_detail,
+        'material': exp.material,
+        'size_class': exp.size_class,
+        'test_type': exp.test_type,
+        'loading_protocol': exp.loading_protocol,
+        'peak_test_amplitude': exp.peak_test_amplitude,
+        'location': exp.location,
+        'governing_design_standard': exp.governing_design_standard,
+        'design_objective': exp.design_objective,
+        'comp_description': exp.comp_description,
+        'ds_description': exp.ds_description,
+        'prior_damage': exp.prior_damage,
+        'prior_damage_repaired': exp.prior_damage_repaired,
+        'edp_metric': exp.edp_metric,
+        'edp_unit': exp.edp_unit,
+        'edp_value': exp.edp_value,
+        'alt_edp_metric': exp.alt_edp_metric,
+        'alt_edp_unit': exp.alt_edp_unit,
+        'alt_edp_value': exp.alt_edp_value,
+        'ds_rank': exp.ds_rank,
+        'ds_class': exp.ds_class,
+        'notes': exp.notes,
+    }
+
+
+def fragility_model_record(fm):
+    """
+    Build the canonical JSON record for a FragilityModel.
+
+    Args:
+        fm (FragilityModel): The fragility model to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'reference': fm.reference_id,
+        'model_id': fm.model_id,
+        'p58_fragility': fm.p58_fragility,
+        'comp_detail': fm.comp_detail,
+        'material': fm.material,
+        'size_class': fm.size_class,
+        'comp_description': fm.comp_description,
+        'reviewer': fm.reviewer,
+        'source': fm.source,
+        'edp_metric': fm.edp_metric,
+        'edp_unit': fm.edp_unit,
+    }
+
+
+def component_fragility_bridge_record(bridge):
+    """
+    Build the canonical JSON record for a ComponentFragilityModelBridge.
+
+    Args:
+        bridge (ComponentFragilityModelBridge): The bridge row to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'component': bridge.component_id,
+        'fragility_model': bridge.fragility_model_id,
+    }
+
+
+def experiment_fragility_bridge_record(bridge):
+    """
+    Build the canonical JSON record for an ExperimentFragilityModelBridge.
+
+    Args:
+        bridge (ExperimentFragilityModelBridge): The bridge row to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'experiment': bridge.experiment_id,
+        'fragility_model': bridge.fragility_model_id,
+    }
+
+
+def fragility_curve_record(curve):
+    """
+    Build the canonical JSON record for a FragilityCurve.
+
+    Args:
+        curve (FragilityCurve): The curve to export.
+
+    Returns:
+        dict: The JSON record.
+    """
+    return {
+        'fragility_model': curve.fragility_model_id,
+        'basis': curve.basis,
+        'num_observations': curve.num_observations,
+        'ds_rank': curve.ds_rank,
+        'ds_description': curve.ds_description,
+        'median': curve.median,
+        'beta': curve.beta,
+        'probability': curve.probability,
+    }
+
+
+# Exported models, in export order, with their file and record builder.
+EXPORT_CONFIG = [
+    {'model': Reference, 'file': 'reference.json', 'record': reference_record},
+    {'model': Component, 'file': 'component.json', 'record': component_record},
+    {'model': Experiment, 'file': 'experiment.json', 'record': experiment_record},
+    {
+        'model': FragilityModel,
+        'file': 'fragility_model.json',
+        'record': fragility_model_record,
+    },
+    {
+        'model': ComponentFragilityModelBridge,
+        'file': 'component_fragility_model_bridge.json',
+        'record': component_fragility_bridge_record,
+    },
+    {
+        'model': ExperimentFragilityModelBridge,
+        'file': 'experiment_fragility_model_bridge.json',
+        'record': experiment_fragility_bridge_record,
+    },
+    {
+        'model': FragilityCurve,
+        'file': 'fragility_curve.json',
+        'record': fragility_curve_record,
+    },
+]
+
+# Version range and tombstones written by export_data --since.
+DELTA_FILENAME = 'delta.json'
+
+# Rows fetched per database round trip while exporting.
+_CHUNK_SIZE = 2000
+
+
+def write_records(file_path, instances, build_record):
+    """
+    Write model instances as a canonical JSON array of records.
+
+    A '.ndjson' file gets one sorted-key record per line instead, written as
+    the instances are read.
+
+    Args:
+        file_path (str): The JSON file to write.
+        instances (Iterable): The model instances to export.
+        build_record (Callable): Builds one record from a model instance.
+
+    Returns:
+        int: The number of records written.
+    """
+    if is_ndjson_path(file_path):
+        count = 0
+        with open(file_path, 'w') as f:
+            for obj in instances:
+                f.write(dumps_line(build_record(obj)))
+                count += 1
+        return count
+    data = [build_record(obj) for obj in instances]
+    with open(file_path, 'w') as f:
+        f.write(dumps_canonical(data))
+    return len(data)
+
+
+def output_path(output_dir, filename, data_format):
+    """
+    Return where a data file is exported, and remove its other variant.
+
+    A directory holding both experiment.json and experiment.ndjson would be
+    read as both, so writing one replaces the other.
+
+    Args:
+        output_dir (str): The export directory.
+        filename (str): The data file's EXPORT_CONFIG name, e.g.
+            'experiment.json'.
+        data_format (str): 'json' or 'ndjson'.
+
+    Returns:
+        str: The path to write.
+    """
+    json_path = os.path.join(output_dir, filename)
+    ndjson_path = get_ndjson_path(json_path)
+    path, other = (
+        (ndjson_path, json_path)
+        if data_format == 'ndjson'
+        else (json_path, ndjson_path)
+    )
+    if os.path.exists(other):
+        os.remove(other)
+    return path
+
+
+def export_partition(spec):
+    """
+    Export one primary-key range of a model's rows to a JSON part file.
+
+    Runs in a worker process, so it takes and returns only picklable values.
+    Rows are written in primary-key order, as in a plain export, so the parts
+    joined in order are that export.
+
+    Args:
+        spec (dict): 'model' (ned_app model name), 'low'/'high' (range
+            bounds), 'file' (part file name) and 'directory'.
+
+    Returns:
+        dict: The manifest entry for the part (file, range, rows, sha256).
+    """
+    model = apps.get_model('ned_app', spec['model'])
+    (config,) = [c for c in EXPORT_CONFIG if c['model'] is model]
+    path = os.path.join(spec['directory'], spec['file'])
+    queryset = filter_range(model.objects.all(), spec['low'], spec['high'])
+    rows = write_records(
+        path, queryset.iterator(chunk_size=_CHUNK_SIZE), config['record']
+    )
+    return {
+        'file': spec['file'],
+        'low': spec['low'],
+        'high': spec['high'],
+        'rows': rows,
+        'sha256': sha256_file(path),
+    }
+
+
+def export_shard(spec):
+    """
+    Export the records of a model with some values of its shard field.
+
+    Runs in a worker process, so it takes and returns only picklable values.
+
+    Args:
+        spec (dict): 'model' (ned_app model name), 'field' (the shard
+            field), 'values' (its values to export) and 'path' (the file).
+
+    Returns:
+        int: The number of records written.
+    """
+    model = apps.get_model('ned_app', spec['model'])
+    (config,) = [c for c in EXPORT_CONFIG if c['model'] is model]
+    attname = model._meta.get_field(spec['field']).attname
+    queryset = model.objects.filter(**{f'{attname}__in': spec['values']})
+    return write_records(
+        spec['path'],
+        queryset.order_by('pk').iterator(chunk_size=_CHUNK_SIZE),
+        config['record'],
+    )
+
+
+def clear_shards(file_path):
+    """
+    Delete the shards of a data file, e.g. before it is exported again.
+
+    Args:
+        file_path (str): The data file whose shard directory to clear.
+    """
+    shard_dir = get_shard_dir(file_path)
+    if not os.path.isdir(shard_dir):
+        return
+    for name in os.listdir(shard_dir):
+        if name.endswith(('.json', NDJSON_SUFFIX)):
+            os.remove(os.path.join(shard_dir, name))
+    if not os.listdir(shard_dir):
+        os.rmdir(shard_dir)
 
 
 class Command(BaseCommand):
@@ -60,6 +396,46 @@ class Command(BaseCommand):
             help='Directory where exported JSON files will be saved',
             required=True,
         )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=None,
+            help=(
+                'Split each table into N primary-key ranges exported in '
+                'parallel to <file>.parts/part-NNNNN.json with a manifest'
+            ),
+        )
+        parser.add_argument(
+            '--concat',
+            action='store_true',
+            help='With --partitions, join the parts into the usual single files',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['json', 'ndjson'],
+            default='json',
+            help=(
+                'json (default): indented JSON arrays. ndjson: one record per '
+                'line, in <name>.ndjson files'
+            ),
+        )
+        parser.add_argument(
+            '--sharded',
+            action='store_true',
+            help=(
+                'Write experiment.json as one file per reference in '
+                'experiment/, in parallel worker processes'
+            ),
+        )
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=None,
+            help=(
+                'Export only the records changed after this dataset version, '
+                f'plus tombstones for deleted records in {DELTA_FILENAME}'
+            ),
+        )
 
     def handle(self, *args, **options):
         """
@@ -67,227 +443,233 @@ class Command(BaseCommand):
 
         Args:
             *args: Positional arguments (unused).
-            **options: Command options including 'output_dir'.
+            **options: Command options including 'output_dir', 'partitions',
+                'concat', 'format', 'sharded' and 'since'.
         """
         output_dir = options['output_dir']
+        partitions = options['partitions']
+        since = options['since']
+        if partitions is not None and partitions < 1:
+            raise CommandError('--partitions must be at least 1.')
+        if options['concat'] and partitions is None:
+            raise CommandError('--concat requires --partitions.')
+        if options['sharded'] and (partitions is not None or since is not None):
+            raise CommandError(
+                '--sharded cannot be combined with --partitions or --since.'
+            )
+        data_format = options.get('format') or 'json'
+        if data_format == 'ndjson' and partitions is not None:
+            raise CommandError('--partitions only writes the json format.')
+        if since is not None:
+            if partitions is not None:
+                raise CommandError('--since cannot be combined with --partitions.')
+            latest = latest_version()
+            if not 0 <= since <= latest:
+                raise CommandError(
+                    '--since must be between 0 and the latest dataset version '
+                    f'({latest}).'
+                )
 
         os.makedirs(output_dir, exist_ok=True)
 
-        self.export_reference_data(output_dir)
-        self.export_component_data(output_dir)
-        self.export_experiment_data(output_dir)
-        self.export_fragility_model_data(output_dir)
-        self.export_component_fragility_bridge_data(output_dir)
-        self.export_experiment_fragility_bridge_data(output_dir)
-        self.export_fragility_curve_data(output_dir)
+        if since is not None:
+            self.export_delta(output_dir, since, data_format)
+        elif partitions is not None:
+            self.export_partitioned(output_dir, partitions, options['concat'])
+        else:
+            for config in EXPORT_CONFIG:
+                self.stdout.write(f'Exporting {config["model"].__name__} data...')
+                file_path = output_path(output_dir, config['file'], data_format)
+                if config['file'] in SHARD_FIELDS:
+                    # Shards left from an earlier export would be read too.
+                    clear_shards(file_path)
+                    if options['sharded']:
+                        self.export_sharded(file_path, config)
+                        continue
+                write_records(
+                    file_path,
+                    config['model']
+                    .objects.order_by('pk')
+                    .iterator(chunk_size=_CHUNK_SIZE),
+                    config['record'],
+                )
 
         self.stdout.write(self.style.SUCCESS('Data export completed successfully!'))
 
-    def export_reference_data(self, output_dir):
+    def export_sharded(self, file_path, config):
         """
-        Export Reference model data to JSON file.
+        Export a model as one file per value of its shard field, in parallel.
 
-        Excludes auto-populated denormalized fields (title, author, year) and
-        includes only the source-of-truth fields.
+        Experiments go to experiment/<reference>.json (or .ndjson, in the
+        single file's format), in primary-key order within each file. Records
+        whose value cannot name a file go to the single file, which is
+        otherwise removed.
 
         Args:
-            output_dir (str): Directory where the JSON file will be saved.
+            file_path (str): The model's single data file.
+            config (dict): The model's EXPORT_CONFIG entry.
         """
-        self.stdout.write('Exporting Reference data...')
-        references = Reference.objects.all()
-
-        data = []
-        for ref in references:
-            # reference_id is derived at ingest, not stored in the source JSON.
-            ref_data = {
-                'study_type': ref.study_type,
-                'comp_type': ref.comp_type,
-                'pdf_saved': ref.pdf_saved,
-                'csl_data': ref.csl_data,
+        model = config['model']
+        field = SHARD_FIELDS[config['file']]
+        attname = model._meta.get_field(field).attname
+        values = model.objects.values_list(attname, flat=True).distinct()
+
+        shards, unsharded = {}, []
+        for value in values.order_by(attname):
+            shard_filename = build_shard_filename(
+                config['file'], value, os.path.splitext(file_path)[1]
+            )
+            if shard_filename is None:
+                unsharded.append(value)
+            else:
+                shards[os.path.basename(shard_filename)] = [value]
+
+        shard_dir = get_shard_dir(file_path)
+        os.makedirs(shard_dir, exist_ok=True)
+        specs = [
+            {
+                'model': model.__name__,
+                'field': field,
+                'values': shard_values,
+                'path': os.path.join(shard_dir, name),
             }
-            # Only emit reference_label when set, to keep unlabeled records clean.
-            if ref.reference_label:
-                ref_data['reference_label'] = ref.reference_label
-            data.append(ref_data)
-
-        file_path = os.path.join(output_dir, 'reference.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
-
-    def export_component_data(self, output_dir):
-        """
-        Export Component model data to JSON file.
-
-        Excludes auto-populated fields (major_group, group, element, subelement)
-        and uses the natural key (component_id) instead of database primary key.
-
-        Args:
-            output_dir (str): Directory where the JSON file will be saved.
+            for name, shard_values in shards.items()
+        ]
+        if unsharded:
+            specs.append({
+                'model': model.__name__,
+                'field': field,
+                'values': unsharded,
+                'path': file_path,
+            })
+        elif os.path.exists(file_path):
+            os.remove(file_path)
+        rows = sum(run_partitions(export_shard, specs))
+        self.stdout.write(f'Wrote {rows} record(s) to {len(shards)} shard(s).')
+
+    def export_partitioned(self, output_dir, partitions, concat):
         """
-        self.stdout.write('Exporting Component data...')
-        components = Component.objects.all()
-
-        data = []
-        for comp in components:
-            comp_data = {
-                'component_id': comp.component_id,
-                'name': comp.name,
-            }
-            data.append(comp_data)
+        Export every model as primary-key ranges of its rows, in parallel
+        workers.
 
-        file_path = os.path.join(output_dir, 'component.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
-
-    def export_experiment_data(self, output_dir):
-        """
-        Export Experiment model data to JSON file.
+        All parts of all models share one pool of workers. Each model's parts
+        are written to '<file>.parts/' with a manifest of row counts and
+        checksums. With concat, the parts are joined into the model's file,
+        byte for byte what a plain export writes, and the parts directory is
+        removed. As in a plain export, the file's .ndjson variant and any
+        shards left from an earlier export are removed.
 
         Args:
-            output_dir (str): Directory where the JSON file will be saved.
+            output_dir (str): Directory where exported JSON files will be saved.
+            partitions (int): The number of ranges per model.
+            concat (bool): Whether to join the parts into single files.
         """
-        self.stdout.write('Exporting Experiment data...')
-        experiments = Experiment.objects.all()
-
-        data = []
-        for exp in experiments:
-            exp_data = {
-                'id': exp.id,
-                'reference': exp.reference_id,
-                'specimen': exp.specimen,
-                'specimen_inspection_sequence': exp.specimen_inspection_sequence,
-                'reviewer': exp.reviewer,
-                'component': exp.component.component_id,
-                'comp_detail': exp.comp_detail,
-                'material': exp.material,
-                'size_class': exp.size_class,
-                'test_type': exp.test_type,
-                'loading_protocol': exp.loading_protocol,
-                'peak_test_amplitude': exp.peak_test_amplitude,
-                'location': exp.location,
-                'governing_design_standard': exp.governing_design_standard,
-                'design_objective': exp.design_objective,
-                'comp_description': exp.comp_description,
-                'ds_description': exp.ds_description,
-                'prior_damage': exp.prior_damage,
-                'prior_damage_repaired': exp.prior_damage_repaired,
-                'edp_metric': exp.edp_metric,
-                'edp_unit': exp.edp_unit,
-                'edp_value': exp.edp_value,
-                'alt_edp_metric': exp.alt_edp_metric,
-                'alt_edp_unit': exp.alt_edp_unit,
-                'alt_edp_value': exp.alt_edp_value,
-                'ds_rank': exp.ds_rank,
-                'ds_class': exp.ds_class,
-                'notes': exp.notes,
-            }
-            data.append(exp_data)
-
-        file_path = os.path.join(output_dir, 'experiment.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
-
-    def export_fragility_model_data(self, output_dir):
-        """
-        Export FragilityModel model data to JSON file.
-
-        Args:
-            output_dir (str): Directory where the JSON file will be saved.
+        specs = []
+        for config in EXPORT_CONFIG:
+            model = config['model']
+            file_path = output_path(output_dir, config['file'], 'json')
+            if config['file'] in SHARD_FIELDS:
+                clear_shards(file_path)
+            directory = parts_dir(file_path)
+            os.makedirs(directory, exist_ok=True)
+            ranges = partition_ranges(model.objects.all(), partitions)
+            for index, (low, high) in enumerate(ranges or [(None, None)]):
+                specs.append({
+                    'model': model.__name__,
+                    'low': low,
+                    'high': high,
+                    'file': part_filename(index, file_path),
+                    'directory': directory,
+                })
+        self.stdout.write(f'Exporting {len(specs)} parts...')
+        results = run_partitions(export_partition, specs)
+
+        for config in EXPORT_CONFIG:
+            model_name = config['model'].__name__
+            file_path = os.path.join(output_dir, config['file'])
+            directory = parts_dir(file_path)
+            parts = [
+                part
+                for spec, part in zip(specs, results)
+                if spec['model'] == model_name
+            ]
+            write_manifest(directory, parts, model=model_name, format='json')
+            if concat:
+                concatenate_json_arrays(
+                    [os.path.join(directory, part['file']) for part in parts],
+                    file_path,
+                )
+                remove_parts(directory)
+
+    def export_delta(self, output_dir, since, data_format='json'):
         """
-        self.stdout.write('Exporting FragilityModel data...')
-        fragility_models = FragilityModel.objects.all()
-
-        data = []
-        for fm in fragility_models:
-            fm_data = {
-                'reference': fm.reference.reference_id,
-                'model_id': fm.model_id,
-                'p58_fragility': fm.p58_fragility,
-                'comp_detail': fm.comp_detail,
-                'material': fm.material,
-                'size_class': fm.size_class,
-                'comp_description': fm.comp_description,
-                'reviewer': fm.reviewer,
-                'source': fm.source,
-                'edp_metric': fm.edp_metric,
-                'edp_unit': fm.edp_unit,
-            }
-            data.append(fm_data)
-
-        file_path = os.path.join(output_dir, 'fragility_model.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
+        Export only what changed after a dataset version.
 
-    def export_component_fragility_bridge_data(self, output_dir):
-        """
-        Export ComponentFragilityModelBridge model data to JSON file.
+        Each model's usual file holds the current records of everything
+        created or updated since the version, in primary-key order, so a
+        consumer can upsert them with its normal loader. DELTA_FILENAME
+        records the version range and the natural keys of deleted records
+        (tombstones), per model in export order; apply deletions in reverse
+        of that order, children before parents.
 
         Args:
-            output_dir (str): Directory where the JSON file will be saved.
+            output_dir (str): Directory where exported JSON files will be saved.
+            since (int): The dataset version the consumer already has.
+            data_format (str): 'json' or 'ndjson', for the model files.
         """
-        self.stdout.write('Exporting ComponentFragilityModelBridge data...')
-        bridges = ComponentFragilityModelBridge.objects.all()
-
-        data = []
-        for bridge in bridges:
-            bridge_data = {
-                'component': bridge.component.component_id,
-                'fragility_model': bridge.fragility_model_id,
+        version = latest_version()
+        changes = changes_since(since)
+        deleted = {}
+        changed_count = 0
+        for config in EXPORT_CONFIG:
+            model = config['model']
+            self.stdout.write(f'Exporting {model.__name__} changes...')
+            model_changes = changes.get(
+                model.__name__, {'changed': [], 'deleted': []}
+            )
+
+            instances = sorted(
+                (
+                    obj
+                    for queryset in filter_by_keys(
+                        model.objects.all(), model_changes['changed']
+                    )
+                    for obj in queryset
+                ),
+                key=lambda obj: obj.pk,
+            )
+            changed_count += write_records(
+                output_path(output_dir, config['file'], data_format),
+                instances,
+                config['record'],
+            )
+
+            # A changed record that is gone now was deleted outside ingest.
+            lookup_fields = {
+                field for key in model_changes['changed'] for field in key
             }
-            data.append(bridge_data)
-
-        file_path = os.path.join(output_dir, 'component_fragility_model_bridge.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
-
-    def export_experiment_fragility_bridge_data(self, output_dir):
-        """
-        Export ExperimentFragilityModelBridge model data to JSON file.
-
-        Args:
-            output_dir (str): Directory where the JSON file will be saved.
-        """
-        self.stdout.write('Exporting ExperimentFragilityModelBridge data...')
-        bridges = ExperimentFragilityModelBridge.objects.all()
-
-        data = []
-        for bridge in bridges:
-            bridge_data = {
-                'experiment': bridge.experiment_id,
-                'fragility_model': bridge.fragility_model_id,
+            present = {
+                json.dumps(natural_key(obj, sorted(lookup_fields)), sort_keys=True)
+                for obj in instances
             }
-            data.append(bridge_data)
-
-        file_path = os.path.join(
-            output_dir, 'experiment_fragility_model_bridge.json'
+            tombstones = model_changes['deleted'] + [
+                key
+                for key in model_changes['changed']
+                if json.dumps(key, sort_keys=True) not in present
+            ]
+            if tombstones:
+                deleted[model.__name__] = tombstones
+
+        with open(os.path.join(output_dir, DELTA_FILENAME), 'w') as f:
+            json.dump(
+                {'since': since, 'version': version, 'deleted': deleted},
+                f,
+                indent=4,
+                sort_keys=True,
+                cls=DecimalEncoder,
+            )
+        self.stdout.write(
+            f'Exported {changed_count} changed record(s) and '
+            f'{sum(len(keys) for keys in deleted.values())} deletion(s) from '
+            f'version {since} to {version}.'
         )
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
-
-    def export_fragility_curve_data(self, output_dir):
-        """
-        Export FragilityCurve model data to JSON file.
-
-        Args:
-            output_dir (str): Directory where the JSON file will be saved.
-        """
-        self.stdout.write('Exporting FragilityCurve data...')
-        fragility_curves = FragilityCurve.objects.all()
-
-        data = []
-        for curve in fragility_curves:
-            curve_data = {
-                'fragility_model': curve.fragility_model_id,
-                'basis': curve.basis,
-                'num_observations': curve.num_observations,
-                'ds_rank': curve.ds_rank,
-                'ds_description': curve.ds_description,
-                'median': curve.median,
-                'beta': curve.beta,
-                'probability': curve.probability,
-            }
-            data.append(curve_data)
-
-        file_path = os.path.join(output_dir, 'fragility_curve.json')
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=4, sort_keys=True, cls=DecimalEncoder)
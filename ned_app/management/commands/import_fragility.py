@@ -1,18 +1,32 @@
-from collections import defaultdict
+import itertools
+from contextlib import ExitStack
 
 from django.core.management.base import BaseCommand, CommandError
 
+from ned_app.management.data_diff import describe_changes
 from ned_app.management.import_utils import (
-    build_pk_set,
+    IMPORT_MODES,
+    DataConflictError,
+    RecordSpool,
+    append_json_files,
     coerce_value,
+    external_sort,
     find_unknown_columns,
     fragility_model_id,
+    load_index,
     load_json,
+    load_positions,
     looks_semicolon_delimited,
-    read_csv,
-    write_json_files,
+    read_csv_chunks,
+    read_csv_header,
+    snapshot_data_files,
+    update_record,
 )
+from ned_app.management.canonical_store import NATURAL_KEYS
+from ned_app.management.import_validation import CanonicalKeyIndex, RecordValidator
+from ned_app.models import FragilityModel
 from ned_app.serialization.serializer import (
+    ComponentFragilityModelBridgeSerializer,
     FragilityModelSerializer,
     FragilityCurveSerializer,
 )
@@ -34,6 +48,13 @@ _MODEL_FIELDS = [
 # All model-scoped columns — must be identical across every row sharing (reference, model_id)
 _CONSISTENCY_FIELDS = _MODEL_FIELDS + ['component_ids']
 
+# The canonical files an import writes.
+_WRITTEN_FILES = (
+    'fragility_model.json',
+    'fragility_curve.json',
+    'component_fragility_model_bridge.json',
+)
+
 
 def _expected_columns():
     """
@@ -57,9 +78,10 @@ class Command(BaseCommand):
     help = (
         'Import fragility models, curves, and component links from a flat '
         'join CSV and append them to the canonical JSON source data in '
-        'resources/data/. The data is not validated here; run '
-        '`python manage.py ingest` and the test suite afterwards to validate '
-        'the new records.'
+        'resources/data/. New records are validated against the serializers '
+        'and the keys already in the canonical JSON first; run '
+        '`python manage.py ingest` and the test suite afterwards to load and '
+        'check them in full.'
     )
 
     def add_arguments(self, parser):
@@ -74,13 +96,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Report what would be appended without writing any changes.',
         )
+        parser.add_argument(
+            '--no_validate',
+            action='store_true',
+            help='Append the records without validating them first.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=IMPORT_MODES,
+            default='append',
+            help=(
+                'append (default): add new records and skip existing ones. '
+                'upsert: replace existing fragility models and curves with the '
+                'same key. merge: overwrite only their non-empty columns. New '
+                'keys are appended in every mode.'
+            ),
+        )
 
     def handle(self, *args, **options):
         input_file = options['input_file']
-        dry_run = options['dry_run']
 
         try:
-            columns, rows = read_csv(input_file)
+            columns = read_csv_header(input_file)
         except FileNotFoundError:
             raise CommandError(f"CSV file not found: '{input_file}'")
 
@@ -91,7 +128,11 @@ class Command(BaseCommand):
                 'and try again.'
             )
 
-        if not rows:
+        # The CSV is streamed in chunks, so only one chunk of rows is held in
+        # memory; the records to append are spooled to temporary files.
+        chunks = read_csv_chunks(input_file)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
             self.stdout.write('No data rows found in CSV file.')
             return
 
@@ -105,69 +146,128 @@ class Command(BaseCommand):
                 )
             )
 
-        # ------------------------------------------------------------------
-        # Group rows by (reference, model_id)
-        # ------------------------------------------------------------------
-        groups = defaultdict(list)
-        for row_num, row in enumerate(rows, start=2):
-            key = (row.get('reference', '').strip(), row.get('model_id', '').strip())
-            groups[key].append((row_num, row))
-
-        self.stdout.write(f'Found {len(groups)} unique fragility model(s) in CSV.')
+        with ExitStack() as stack:
+            new_models, new_curves, new_bridges = (
+                stack.enter_context(RecordSpool()) for _ in range(3)
+            )
+            self._import(
+                itertools.chain([first_chunk], chunks),
+                new_models,
+                new_curves,
+                new_bridges,
+                options,
+            )
 
-        # ------------------------------------------------------------------
-        # Consistency check — model-scoped fields must be identical across
-        # every row that shares the same (reference, model_id). This is a
-        # CSV-shape invariant that ingest cannot detect: a mismatch would
-        # otherwise be silently resolved by taking the first row's values.
-        # ------------------------------------------------------------------
-        all_errors = []
-        for (ref, model_id), group_rows in groups.items():
+    def _grouped_rows(self, chunks):
+        """
+        Group the CSV rows by (reference, model_id) with an external sort.
+
+        Each row is tagged with the order in which its model first appears,
+        so the groups come out in that order (as in the CSV) and each group's
+        rows keep their CSV order, while only one chunk of rows is sorted in
+        memory at a time.
+
+        Args:
+            chunks (Iterable[list[tuple[int, dict]]]): The CSV rows, in chunks
+                from read_csv_chunks.
+
+        Yields:
+            tuple[tuple[str, str], list[tuple[int, dict]]]: Each model's
+            (reference, model_id) and its (row number, row) pairs.
+        """
+        first_seen = {}
+
+        def tagged_rows():
+            for chunk in chunks:
+                for row_num, row in chunk:
+                    key = (
+                        row.get('reference', '').strip(),
+                        row.get('model_id', '').strip(),
+                    )
+                    order = first_seen.setdefault(key, len(first_seen))
+                    yield order, row_num, row
+
+        sorted_rows = external_sort(tagged_rows(), key=lambda item: item[:2])
+        for _, items in itertools.groupby(sorted_rows, key=lambda item: item[0]):
+            group_rows = [(row_num, row) for _, row_num, row in items]
             _, first_row = group_rows[0]
-            for row_num, row in group_rows[1:]:
-                for field in _CONSISTENCY_FIELDS:
-                    expected = first_row.get(field, '').strip()
-                    actual = row.get(field, '').strip()
-                    if actual != expected:
-                        all_errors.append(
-                            f"Row {row_num}: inconsistent '{field}' for model "
-                            f"'{model_id}' — expected '{expected}', got '{actual}'"
-                        )
-
-        if all_errors:
-            self._report_errors(all_errors)
-            raise CommandError(
-                'No records were imported. Fix the errors above and retry.'
+            yield (
+                (
+                    first_row.get('reference', '').strip(),
+                    first_row.get('model_id', '').strip(),
+                ),
+                group_rows,
             )
 
-        # ------------------------------------------------------------------
-        # Duplicate detection and record building
-        # ------------------------------------------------------------------
-        existing_fm_pks = build_pk_set(
-            load_json('fragility_model.json'), ['reference', 'model_id']
-        )
-        existing_curve_pks = build_pk_set(
-            load_json('fragility_curve.json'), ['fragility_model', 'ds_rank']
+    def _import(self, chunks, new_models, new_curves, new_bridges, options):
+        """
+        Group, check, dedupe, validate and append the CSV rows.
+
+        Args:
+            chunks (Iterable[list[tuple[int, dict]]]): The CSV rows, in chunks
+                from read_csv_chunks.
+            new_models (RecordSpool): Receives (row number, record) pairs of
+                new fragility models.
+            new_curves (RecordSpool): The same, for new fragility curves.
+            new_bridges (RecordSpool): The same, for new component bridges.
+            options (dict): The command options.
+        """
+        mode = options.get('mode') or 'append'
+        updating = mode != 'append'
+        # The files are not locked while they are read; the batch is checked
+        # against this snapshot instead (see append_json_files).
+        snapshot = snapshot_data_files(_WRITTEN_FILES)
+        # The existing keys, by (reference, model_id), (fragility_model,
+        # ds_rank) and (component, fragility_model). When updating, existing
+        # models and curves are looked up by position instead of skipped.
+        fm_positions = load_positions('fragility_model.json') if updating else {}
+        curve_positions = load_positions('fragility_curve.json') if updating else {}
+        seen_fm_pks = set() if updating else set(load_index('fragility_model.json'))
+        seen_curve_pks = (
+            set() if updating else set(load_index('fragility_curve.json'))
         )
-        existing_bridge_pks = build_pk_set(
-            load_json('component_fragility_model_bridge.json'),
-            ['component', 'fragility_model'],
-        )
-
-        seen_fm_pks = set(existing_fm_pks)
-        seen_curve_pks = set(existing_curve_pks)
-        seen_bridge_pks = set(existing_bridge_pks)
+        seen_bridge_pks = set(load_index('component_fragility_model_bridge.json'))
+        existing_models = load_json('fragility_model.json') if updating else []
+        existing_curves = load_json('fragility_curve.json') if updating else []
+        # Records to replace: position -> (row number, record).
+        model_updates = {}
+        curve_updates = {}
+        unchanged = 0
 
-        new_models = []
-        new_curves = []
-        new_bridges = []
+        all_errors = []
+        group_count = 0
         skipped_models = []
         skipped_curves = []
         skipped_bridges = []
 
-        for (ref, model_id), group_rows in groups.items():
+        for (ref, model_id), group_rows in self._grouped_rows(chunks):
+            group_count += 1
+
+            # ------------------------------------------------------------------
+            # Consistency check — model-scoped fields must be identical across
+            # every row that shares the same (reference, model_id). This is a
+            # CSV-shape invariant that ingest cannot detect: a mismatch would
+            # otherwise be silently resolved by taking the first row's values.
+            # ------------------------------------------------------------------
+            first_row_num, first_row = group_rows[0]
+            for row_num, row in group_rows[1:]:
+                for field in _CONSISTENCY_FIELDS:
+                    expected = first_row.get(field, '').strip()
+                    actual = row.get(field, '').strip()
+                    if actual != expected:
+                        all_errors.append((
+                            row_num,
+                            f"inconsistent '{field}' for model '{model_id}' "
+                            f"— expected '{expected}', got '{actual}'",
+                        ))
+            if all_errors:
+                # Nothing will be imported; keep checking the other models.
+                continue
+
+            # ------------------------------------------------------------------
+            # Duplicate detection and record building
+            # ------------------------------------------------------------------
             fm_id = fragility_model_id(ref, model_id)
-            _, first_row = group_rows[0]
 
             # Duplicate fragility model
             fm_pk = (ref, model_id)
@@ -179,7 +279,18 @@ class Command(BaseCommand):
                     field: first_row.get(field, '').strip()
                     for field in _MODEL_FIELDS
                 }
-                new_models.append(model_record)
+                position = fm_positions.get(fm_pk)
+                if position is None:
+                    new_models.append((first_row_num, model_record))
+                elif not self._update(
+                    mode,
+                    existing_models,
+                    position,
+                    model_record,
+                    (first_row_num, first_row),
+                    model_updates,
+                ):
+                    unchanged += 1
 
             # Bridge records (derived from component_ids on the first row)
             component_ids_raw = first_row.get('component_ids', '').strip()
@@ -192,37 +303,55 @@ class Command(BaseCommand):
                     skipped_bridges.append(bridge_pk)
                 else:
                     seen_bridge_pks.add(bridge_pk)
-                    new_bridges.append({
-                        'component': comp_id,
-                        'fragility_model': fm_id,
-                    })
+                    new_bridges.append((
+                        first_row_num,
+                        {'component': comp_id, 'fragility_model': fm_id},
+                    ))
 
             # Curve records (one per row in the group)
-            for _, row in group_rows:
+            for row_num, row in group_rows:
                 ds_rank_raw = row.get('ds_rank', '').strip()
                 ds_rank = coerce_value('ds_rank', ds_rank_raw)
                 curve_pk = (fm_id, str(ds_rank) if ds_rank is not None else '')
                 if curve_pk in seen_curve_pks:
                     skipped_curves.append(curve_pk)
-                else:
-                    seen_curve_pks.add(curve_pk)
-                    new_curves.append({
-                        'fragility_model': fm_id,
-                        'ds_rank': ds_rank,
-                        'ds_description': row.get('ds_description', '').strip(),
-                        'median': coerce_value(
-                            'median', row.get('median', '').strip()
-                        ),
-                        'beta': coerce_value('beta', row.get('beta', '').strip()),
-                        'probability': coerce_value(
-                            'probability', row.get('probability', '').strip()
-                        ),
-                        'basis': row.get('basis', '').strip(),
-                        'num_observations': coerce_value(
-                            'num_observations',
-                            row.get('num_observations', '').strip(),
-                        ),
-                    })
+                    continue
+                seen_curve_pks.add(curve_pk)
+                curve_record = {
+                    'fragility_model': fm_id,
+                    'ds_rank': ds_rank,
+                    'ds_description': row.get('ds_description', '').strip(),
+                    'median': coerce_value('median', row.get('median', '').strip()),
+                    'beta': coerce_value('beta', row.get('beta', '').strip()),
+                    'probability': coerce_value(
+                        'probability', row.get('probability', '').strip()
+                    ),
+                    'basis': row.get('basis', '').strip(),
+                    'num_observations': coerce_value(
+                        'num_observations',
+                        row.get('num_observations', '').strip(),
+                    ),
+                }
+                position = curve_positions.get(curve_pk)
+                if position is None:
+                    new_curves.append((row_num, curve_record))
+                elif not self._update(
+                    mode,
+                    existing_curves,
+                    position,
+                    curve_record,
+                    (row_num, row),
+                    curve_updates,
+                ):
+                    unchanged += 1
+
+        self.stdout.write(f'Found {group_count} unique fragility model(s) in CSV.')
+
+        if all_errors:
+            self._report_errors(all_errors)
+            raise CommandError(
+                'No records were imported. Fix the errors above and retry.'
+            )
 
         # ------------------------------------------------------------------
         # Report skipped duplicates
@@ -250,54 +379,203 @@ class Command(BaseCommand):
                 )
             )
 
-        if not new_models and not new_curves and not new_bridges:
-            self.stdout.write('No new records to add (all rows were duplicates).')
+        if not (
+            new_models or new_curves or new_bridges or model_updates or curve_updates
+        ):
+            if unchanged:
+                self.stdout.write(
+                    f'No changes to make: {unchanged} matching record(s) are '
+                    'already up to date.'
+                )
+            else:
+                self.stdout.write(
+                    'No new records to add (all rows were duplicates).'
+                )
             return
 
-        if dry_run:
+        if not options['no_validate']:
+            errors = self._validate(
+                new_models,
+                new_curves,
+                new_bridges,
+                updated_models=model_updates.values(),
+                updated_curves=curve_updates.values(),
+            )
+            if errors:
+                self._report_errors(errors)
+                raise CommandError(
+                    'No records were imported. Fix the errors above and retry.'
+                )
+
+        self._report_updates(
+            'fragility model', 'fragility_model.json', existing_models, model_updates
+        )
+        self._report_updates(
+            'fragility curve', 'fragility_curve.json', existing_curves, curve_updates
+        )
+        updated = ''
+        if updating:
+            updated = (
+                f'  {len(model_updates)} fragility model(s) -> fragility_model.json\n'
+                f'  {len(curve_updates)} fragility curve(s)  -> fragility_curve.json\n'
+            )
+
+        if options['dry_run']:
+            would_update = f'Would update:\n{updated}' if updated else ''
             self.stdout.write(
                 self.style.SUCCESS(
                     f'\n[DRY RUN] Would append:\n'
                     f'  {len(new_models)} fragility model(s) -> fragility_model.json\n'
                     f'  {len(new_curves)} fragility curve(s)  -> fragility_curve.json\n'
                     f'  {len(new_bridges)} component bridge(s)  -> component_fragility_model_bridge.json\n'
+                    f'{would_update}'
                     'No changes written.'
                 )
             )
             return
 
         # ------------------------------------------------------------------
-        # Write to all three JSON files as an all-or-nothing batch, so a
+        # Append to all three JSON files as an all-or-nothing batch, so a
         # failure partway through cannot leave the canonical files in a
         # mutually inconsistent state (e.g. models without their curves).
         # ------------------------------------------------------------------
-        fm_data = load_json('fragility_model.json')
-        fm_data.extend(new_models)
-
-        curve_data = load_json('fragility_curve.json')
-        curve_data.extend(new_curves)
-
-        bridge_data = load_json('component_fragility_model_bridge.json')
-        bridge_data.extend(new_bridges)
-
-        write_json_files({
-            'fragility_model.json': fm_data,
-            'fragility_curve.json': curve_data,
-            'component_fragility_model_bridge.json': bridge_data,
-        })
+        try:
+            append_json_files(
+                {
+                    'fragility_model.json': (record for _, record in new_models),
+                    'fragility_curve.json': (record for _, record in new_curves),
+                    'component_fragility_model_bridge.json': (
+                        record for _, record in new_bridges
+                    ),
+                },
+                replacements={
+                    'fragility_model.json': {
+                        position: record
+                        for position, (_, record) in model_updates.items()
+                    },
+                    'fragility_curve.json': {
+                        position: record
+                        for position, (_, record) in curve_updates.items()
+                    },
+                },
+                expected=snapshot,
+            )
+        except DataConflictError as ex:
+            raise CommandError(str(ex))
 
+        if updated:
+            updated = f'Updated:\n{updated}'
         self.stdout.write(
             self.style.SUCCESS(
                 f'\nAppended:\n'
                 f'  {len(new_models)} fragility model(s) -> fragility_model.json\n'
                 f'  {len(new_curves)} fragility curve(s)  -> fragility_curve.json\n'
                 f'  {len(new_bridges)} component bridge(s)  -> component_fragility_model_bridge.json\n'
+                f'{updated}'
                 'Run `python manage.py ingest` and the test suite to validate '
-                'the new records.'
+                'the changed records.'
             )
         )
 
+    def _update(self, mode, existing, position, record, row, updates):
+        """
+        Apply a CSV row to the existing record with the same key.
+
+        Args:
+            mode (str): 'upsert' or 'merge'.
+            existing (list[dict]): The canonical file's records.
+            position (int): The existing record's position in the file.
+            record (dict): The record built from the row.
+            row (tuple[int, dict]): The CSV row number and row; for 'merge',
+                only fields whose cells are filled in are applied.
+            updates (dict[int, tuple[int, dict]]): Receives the updated
+                record, by position, with its row number.
+
+        Returns:
+            bool: Whether the record changed.
+        """
+        row_num, cells = row
+        if mode == 'merge':
+            record = {
+                field: value
+                for field, value in record.items()
+                if str(cells.get(field) or '').strip()
+            }
+        updated = update_record(existing[position], record, mode)
+        if updated == existing[position]:
+            return False
+        updates[position] = (row_num, updated)
+        return True
+
+    def _report_updates(self, label, json_file, existing, updates):
+        """
+        Print each updated record's changes, field by field.
+
+        Args:
+            label (str): What the records are, e.g. 'fragility curve'.
+            json_file (str): The canonical file being updated.
+            existing (list[dict]): The file's current records.
+            updates (dict[int, tuple[int, dict]]): Position to (row number,
+                updated record).
+        """
+        if not updates:
+            return
+        key = NATURAL_KEYS[json_file]
+        self.stdout.write(f'\nUpdated {len(updates)} {label}(s) in {json_file}:')
+        for position, (row_num, record) in sorted(
+            updates.items(), key=lambda item: item[1][0]
+        ):
+            self.stdout.write(f'  Row {row_num}: {" | ".join(key(record))}')
+            for line in describe_changes(existing[position], record):
+                self.stdout.write(f'    {line}')
+
+    def _validate(
+        self, models, curves, bridges, updated_models=(), updated_curves=()
+    ):
+        """
+        Validate new and updated records before they are written.
+
+        Runs each serializer's field and object-level validation and checks
+        foreign keys (references, components and fragility models) against
+        the keys in the canonical JSON plus the models in this CSV, with no
+        database access.
+
+        Args:
+            models (RecordSpool): (CSV row number, record) pairs of new
+                fragility models.
+            curves (RecordSpool): The same, for new fragility curves.
+            bridges (RecordSpool): The same, for new component bridges.
+            updated_models (Iterable[tuple[int, dict]]): The same, for
+                updated fragility models.
+            updated_curves (Iterable[tuple[int, dict]]): The same, for
+                updated fragility curves.
+
+        Returns:
+            list[tuple[int, str]]: (CSV row number, 'field: message') pairs,
+            in row order; empty if all are valid.
+        """
+        index = CanonicalKeyIndex()
+        for _, record in models:
+            index.add(
+                FragilityModel,
+                fragility_model_id(record['reference'], record['model_id']),
+            )
+
+        errors = []
+        for serializer_class, records in (
+            (FragilityModelSerializer, itertools.chain(models, updated_models)),
+            (FragilityCurveSerializer, itertools.chain(curves, updated_curves)),
+            (ComponentFragilityModelBridgeSerializer, bridges),
+        ):
+            validator = RecordValidator(serializer_class, index)
+            for row_num, record in records:
+                errors.extend(
+                    (row_num, error) for error in validator.validate(record)
+                )
+        # Report each problem once, in CSV row order.
+        return sorted(dict.fromkeys(errors), key=lambda error: error[0])
+
     def _report_errors(self, errors):
         self.stderr.write(f'\nFound {len(errors)} error(s):')
-        for err in errors:
-            self.stderr.write(f'  - {err}')
+        for row_num, message in errors:
+            self.stderr.write(f'  - Row {row_num}: {message}')
@@ -1,14 +1,28 @@
+import itertools
+import os
+from contextlib import ExitStack
+
 from django.core.management.base import BaseCommand, CommandError
 
+from ned_app.management.data_diff import describe_changes
 from ned_app.management.import_utils import (
+    IMPORT_MODES,
+    DataConflictError,
+    RecordSpool,
     coerce_value,
     find_unknown_columns,
+    append_json_files,
     load_json,
+    load_positions,
     looks_semicolon_delimited,
-    read_csv,
-    write_json,
-    build_pk_set,
+    read_csv_chunks,
+    read_csv_header,
+    snapshot_data_files,
+    update_record,
 )
+from ned_app.management.canonical_store import NATURAL_KEYS
+from ned_app.management.import_validation import CanonicalKeyIndex, RecordValidator
+from ned_app.models import Experiment, Reference, derive_reference_id
 from ned_app.serialization.serializer import (
     ReferenceSerializer,
     ExperimentSerializer,
@@ -59,6 +73,15 @@ _CSL_OPTIONAL_MAP = {
     'csl_publisher': 'publisher',
 }
 
+# Every csl_* column and the csl_data key it fills.
+_CSL_MERGE_MAP = {
+    'csl_type': 'type',
+    'csl_title': 'title',
+    'csl_year': 'issued',
+    'csl_authors': 'author',
+    **_CSL_OPTIONAL_MAP,
+}
+
 
 def _parse_authors(authors_str):
     """
@@ -148,6 +171,37 @@ def _row_to_record(row, model_name):
     return record
 
 
+def _filled_fields(row, record, model_name):
+    """
+    Keep only the fields of a converted row whose CSV cells are filled in.
+
+    Used by --mode merge, where an empty cell leaves the existing value
+    alone. For Reference, the filled csl_* columns become a partial csl_data.
+
+    Args:
+        row (dict): The CSV row.
+        record (dict): The row converted by _row_to_record.
+        model_name (str): The model being imported.
+
+    Returns:
+        dict: The fields to overwrite.
+    """
+    changes = {
+        field: value
+        for field, value in record.items()
+        if field != 'csl_data' and str(row.get(field) or '').strip()
+    }
+    if model_name == 'Reference':
+        csl_data = {
+            csl_key: record['csl_data'][csl_key]
+            for column, csl_key in _CSL_MERGE_MAP.items()
+            if str(row.get(column) or '').strip()
+        }
+        if csl_data:
+            changes['csl_data'] = csl_data
+    return changes
+
+
 def _expected_columns(model_name, serializer_class):
     """
     Build the set of CSV columns accepted for a model.
@@ -170,12 +224,39 @@ def _expected_columns(model_name, serializer_class):
     return fields
 
 
+def _infer_model(columns):
+    """
+    Tell which importable model a CSV holds from its header.
+
+    The model whose accepted columns match the most header columns wins; the
+    templates' headers each match exactly one model best.
+
+    Args:
+        columns (list[str]): The CSV header column names.
+
+    Returns:
+        str | None: The model name, or None if no model, or more than one,
+        matches best.
+    """
+    columns = set(columns) - {'', None}
+    scores = {
+        name: len(columns & _expected_columns(name, config['serializer']))
+        for name, config in _MODEL_CONFIG.items()
+    }
+    best = max(scores.values())
+    matches = [name for name, score in scores.items() if score == best]
+    if best == 0 or len(matches) > 1:
+        return None
+    return matches[0]
+
+
 class Command(BaseCommand):
     help = (
-        'Import new records from a CSV file and append them to the '
-        'canonical JSON source data in resources/data/. The data is not '
-        'validated here; run `python manage.py ingest` and the test suite '
-        'afterwards to validate the new records.'
+        'Import new records from one or more CSV files and append them to the '
+        'canonical JSON source data in resources/data/. New records are '
+        'validated against the serializers and the keys already in the '
+        'canonical JSON first; run `python manage.py ingest` and the test '
+        'suite afterwards to load and check them in full.'
     )
 
     def add_arguments(self, parser):
@@ -189,15 +270,23 @@ class Command(BaseCommand):
             type=str,
             required=False,
             help=(
-                'Model name to import (e.g., Experiment, Reference). '
+                'Model name to import (e.g., Experiment, Reference). When '
+                "omitted, each CSV's model is inferred from its header. "
                 'Use --list-models to see all importable models.'
             ),
         )
         parser.add_argument(
             '--input_file',
             type=str,
+            nargs='+',
+            required=False,
+            help='Path(s) to the CSV file(s) to import.',
+        )
+        parser.add_argument(
+            '--input_dir',
+            type=str,
             required=False,
-            help='Path to the CSV file to import.',
+            help='Import every .csv file in this directory.',
         )
         parser.add_argument(
             '--dry_run',
@@ -207,6 +296,22 @@ class Command(BaseCommand):
                 'to the JSON files.'
             ),
         )
+        parser.add_argument(
+            '--no_validate',
+            action='store_true',
+            help='Append the records without validating them first.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=IMPORT_MODES,
+            default='append',
+            help=(
+                'append (default): add new records and skip rows whose key '
+                'already exists. upsert: replace existing records with the '
+                'same key. merge: overwrite only the non-empty columns of '
+                'existing records. New keys are appended in every mode.'
+            ),
+        )
 
     def handle(self, *args, **options):
         if options['list_models']:
@@ -216,125 +321,409 @@ class Command(BaseCommand):
             return
 
         model_name = options['model']
-        input_file = options['input_file']
-        dry_run = options['dry_run']
-
-        if not model_name or not input_file:
-            raise CommandError(
-                '--model and --input_file are required. '
-                'Use --list-models to see available models.'
-            )
-
-        if model_name not in _MODEL_CONFIG:
+        if model_name and model_name not in _MODEL_CONFIG:
             raise CommandError(
                 f"Model '{model_name}' does not support CSV import. "
                 'Use --list-models to see all importable models.'
             )
 
-        config = _MODEL_CONFIG[model_name]
-
-        pk_fields = config.get('pk_fields')
-
-        existing_records = load_json(config['json_file'])
-        existing_pk_set = (
-            build_pk_set(existing_records, pk_fields) if pk_fields else set()
-        )
-
-        try:
-            columns, rows = read_csv(input_file)
-        except FileNotFoundError:
-            raise CommandError(f"CSV file not found: '{input_file}'")
-
-        if looks_semicolon_delimited(columns):
+        paths = self._input_paths(options['input_file'], options['input_dir'])
+        if not paths:
             raise CommandError(
-                'This CSV appears to be semicolon-delimited. Re-save it as a '
-                'comma-delimited CSV (in Excel: "CSV UTF-8 (Comma delimited)") '
-                'and try again.'
+                '--input_file or --input_dir is required. '
+                'Use --list-models to see available models.'
             )
+        self._multiple = len(paths) > 1
+
+        batches = []
+        for path in paths:
+            try:
+                columns = read_csv_header(path)
+            except FileNotFoundError:
+                raise CommandError(f"CSV file not found: '{path}'")
+
+            if looks_semicolon_delimited(columns):
+                raise CommandError(
+                    f'{self._prefix(path)}This CSV appears to be '
+                    'semicolon-delimited. Re-save it as a comma-delimited CSV '
+                    '(in Excel: "CSV UTF-8 (Comma delimited)") and try again.'
+                )
 
-        if not rows:
-            self.stdout.write('No data rows found in CSV file.')
-            return
-
-        unknown = find_unknown_columns(
-            columns, _expected_columns(model_name, config['serializer'])
-        )
-        if unknown:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'Warning: unrecognized column(s) in CSV header: {unknown}.\n'
-                    'These columns will be ignored. Check for typos against the '
-                    'template.'
+            file_model = model_name or _infer_model(columns)
+            if file_model is None:
+                raise CommandError(
+                    f"Cannot tell which model '{path}' holds from its header. "
+                    'Pass --model, or import it on its own with --model.'
                 )
+            batches.append((file_model, path, columns))
+
+        # Apply referenced models first (Reference, then Experiment, then the
+        # bridge), so later files can refer to records from earlier ones; the
+        # files of one model keep their command-line order.
+        dependency_order = list(_MODEL_CONFIG)
+        batches.sort(key=lambda batch: dependency_order.index(batch[0]))
+
+        with ExitStack() as stack:
+            # The records to append, per model, spooled to temporary files as
+            # [path index, row number, record].
+            spools = {
+                name: stack.enter_context(RecordSpool())
+                for name in dict.fromkeys(batch[0] for batch in batches)
+            }
+            self._paths = [path for _, path, _ in batches]
+            self._import(batches, spools, options)
+
+    def _input_paths(self, input_files, input_dir):
+        """
+        Collect the CSV files named by --input_file and --input_dir.
+
+        Args:
+            input_files (list[str] | str | None): --input_file value(s).
+            input_dir (str | None): --input_dir value.
+
+        Returns:
+            list[str]: The CSV paths, --input_file values first.
+
+        Raises:
+            CommandError: If input_dir is not a directory or has no CSVs.
+        """
+        if isinstance(input_files, str):
+            input_files = [input_files]
+        paths = list(input_files or [])
+        if input_dir:
+            if not os.path.isdir(input_dir):
+                raise CommandError(f"Input directory not found: '{input_dir}'")
+            found = sorted(
+                os.path.join(input_dir, name)
+                for name in os.listdir(input_dir)
+                if name.lower().endswith('.csv')
             )
-
-        new_records = []
-        skipped_existing = []  # key already present in the JSON file
-        skipped_within = []  # key repeated within this CSV
-        seen_in_csv = set()
-
-        for row_num, row in enumerate(rows, start=2):
-            record = _row_to_record(row, model_name)
-            if not pk_fields:
-                # No dedupe key: the importer just converts and appends.
-                new_records.append(record)
+            if not found:
+                raise CommandError(f"No .csv files found in '{input_dir}'.")
+            paths.extend(found)
+        return list(dict.fromkeys(paths))
+
+    def _prefix(self, path):
+        """Return the 'file: ' prefix used in messages for multi-file runs."""
+        return f'{path}: ' if self._multiple else ''
+
+    def _where(self, path_index, row_num):
+        """Describe a CSV row in messages: 'Row N', plus its file if needed."""
+        if self._multiple:
+            return f'{self._paths[path_index]} row {row_num}'
+        return f'Row {row_num}'
+
+    def _import(self, batches, spools, options):
+        """
+        Convert, dedupe, validate and write the rows of every CSV.
+
+        Each canonical file is read once for key lookups, and all the new and
+        updated records are written in one all-or-nothing batch. The files
+        are not locked meanwhile: the batch is checked against a snapshot
+        taken before reading them, so another import may run at the same time.
+
+        Args:
+            batches (list[tuple[str, str, list[str]]]): (model name, path,
+                header columns) per CSV, in dependency order.
+            spools (dict[str, RecordSpool]): Receives each model's new
+                records.
+            options (dict): The command options.
+        """
+        mode = options.get('mode') or 'append'
+        snapshot = snapshot_data_files(
+            _MODEL_CONFIG[name]['json_file'] for name in spools
+        )
+        existing_positions = {}
+        data_rows = False
+        seen_in_csv = {name: set() for name in spools}
+        expected_columns = {}
+        # Records to replace, per model: position -> [path index, row, record].
+        updates = {name: {} for name in spools}
+        unchanged = 0
+
+        for path_index, (model_name, path, columns) in enumerate(batches):
+            config = _MODEL_CONFIG[model_name]
+            json_file = config['json_file']
+            # References have no stored dedupe key and are always appended,
+            # unless the rows are meant to update existing records.
+            keyed = bool(config.get('pk_fields')) or mode != 'append'
+            key_function = NATURAL_KEYS[json_file]
+            if self._multiple:
+                self.stdout.write(f'{path}: importing {model_name} records.')
+
+            # The CSV is streamed in chunks, so only one chunk of rows is held
+            # in memory; the records to append are spooled to a temporary file.
+            chunks = read_csv_chunks(path)
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                self.stdout.write(
+                    f'{self._prefix(path)}No data rows found in CSV file.'
+                )
                 continue
+            data_rows = True
 
-            pk_tuple = tuple(str(record.get(f, '') or '') for f in pk_fields)
-
-            if pk_tuple in existing_pk_set:
-                skipped_existing.append((row_num, pk_tuple))
-                continue
-            if pk_tuple in seen_in_csv:
-                skipped_within.append((row_num, pk_tuple))
-                continue
+            if model_name not in expected_columns:
+                expected_columns[model_name] = _expected_columns(
+                    model_name, config['serializer']
+                )
+            unknown = find_unknown_columns(columns, expected_columns[model_name])
+            if unknown:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'{self._prefix(path)}Warning: unrecognized column(s) in '
+                        f'CSV header: {unknown}.\n'
+                        'These columns will be ignored. Check for typos against '
+                        'the template.'
+                    )
+                )
 
-            seen_in_csv.add(pk_tuple)
-            new_records.append(record)
-
-        # Report skipped rows so a dropped record is never silently discarded.
-        # (Only models with a stored dedupe key reach here — Experiment and the
-        # bridge; References have no dedupe key and are always appended.)
-        if skipped_existing:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'\nSkipped {len(skipped_existing)} duplicate(s) already '
-                    f'present in {config["json_file"]}:'
+            # The existing file is only parsed for key lookups, once per
+            # model; unkeyed models never read it, since appends splice new
+            # records onto the end of the file.
+            if keyed and model_name not in existing_positions:
+                existing_positions[model_name] = load_positions(json_file)
+            positions = existing_positions.get(model_name, {})
+            existing = load_json(json_file) if mode != 'append' else []
+            seen = seen_in_csv[model_name]
+            new_records = spools[model_name]
+
+            skipped_existing = []  # key already present in the JSON file
+            skipped_within = []  # key repeated within the CSV(s)
+
+            for chunk in itertools.chain([first_chunk], chunks):
+                for row_num, row in chunk:
+                    record = _row_to_record(row, model_name)
+                    if not keyed:
+                        # No dedupe key: the importer just converts and appends.
+                        new_records.append((path_index, row_num, record))
+                        continue
+
+                    try:
+                        key = key_function(record)
+                    except (KeyError, IndexError, TypeError):
+                        # No usable key (e.g. a reference without a year):
+                        # treated as new, so validation reports it.
+                        new_records.append((path_index, row_num, record))
+                        continue
+
+                    if mode == 'append' and key in positions:
+                        skipped_existing.append((row_num, key))
+                        continue
+                    if key in seen:
+                        skipped_within.append((row_num, key))
+                        continue
+                    seen.add(key)
+
+                    position = positions.get(key)
+                    if position is None:
+                        new_records.append((path_index, row_num, record))
+                        continue
+                    if mode == 'merge':
+                        record = _filled_fields(row, record, model_name)
+                    updated = update_record(existing[position], record, mode)
+                    if updated == existing[position]:
+                        unchanged += 1
+                    else:
+                        updates[model_name][position] = [
+                            path_index,
+                            row_num,
+                            updated,
+                        ]
+
+            # Report skipped rows so a dropped record is never silently
+            # discarded. (Only models with a stored dedupe key reach here —
+            # Experiment and the bridge; References have no dedupe key and
+            # are always appended.)
+            if skipped_existing:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'\n{self._prefix(path)}Skipped {len(skipped_existing)} '
+                        f'duplicate(s) already present in {json_file}:'
+                    )
                 )
-            )
-            for row_num, pk in skipped_existing:
-                self.stdout.write(f'  Row {row_num}: {" | ".join(pk)}')
-
-        if skipped_within:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'\nSkipped {len(skipped_within)} duplicate(s) within this '
-                    'CSV (matches an earlier row):'
+                for row_num, pk in skipped_existing:
+                    self.stdout.write(f'  Row {row_num}: {" | ".join(pk)}')
+
+            if skipped_within:
+                within = 'these CSVs' if self._multiple else 'this CSV'
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'\n{self._prefix(path)}Skipped {len(skipped_within)} '
+                        f'duplicate(s) within {within} (matches an earlier row):'
+                    )
                 )
-            )
-            for row_num, pk in skipped_within:
-                self.stdout.write(f'  Row {row_num}: {" | ".join(pk)}')
+                for row_num, pk in skipped_within:
+                    self.stdout.write(f'  Row {row_num}: {" | ".join(pk)}')
 
-        if not new_records:
-            self.stdout.write('No new records to add (all rows were duplicates).')
+        if not data_rows:
+            return
+        if not any(spools.values()) and not any(updates.values()):
+            if unchanged:
+                self.stdout.write(
+                    f'No changes to make: {unchanged} matching record(s) are '
+                    'already up to date.'
+                )
+            else:
+                self.stdout.write(
+                    'No new records to add (all rows were duplicates).'
+                )
             return
 
-        if dry_run:
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'\n[DRY RUN] {len(new_records)} record(s) would be '
-                    f'appended to {config["json_file"]}. No changes written.'
+        if not options['no_validate']:
+            errors = self._validate(spools, updates)
+            if errors:
+                self.stderr.write(f'\nFound {len(errors)} error(s):')
+                for err in errors:
+                    self.stderr.write(f'  - {err}')
+                raise CommandError(
+                    'No records were imported. Fix the errors above and retry.'
+                )
+
+        self._report_updates(updates, existing_positions)
+        counts = [
+            (_MODEL_CONFIG[name]['json_file'], len(spool))
+            for name, spool in spools.items()
+            if spool
+        ]
+        update_counts = [
+            (_MODEL_CONFIG[name]['json_file'], len(changed))
+            for name, changed in updates.items()
+            if changed
+        ]
+        if options['dry_run']:
+            for json_file, count in counts:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'\n[DRY RUN] {count} record(s) would be '
+                        f'appended to {json_file}. No changes written.'
+                    )
+                )
+            for json_file, count in update_counts:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'\n[DRY RUN] {count} record(s) would be '
+                        f'updated in {json_file}. No changes written.'
+                    )
                 )
-            )
             return
 
-        existing_records.extend(new_records)
-        write_json(config['json_file'], existing_records)
+        # One all-or-nothing batch: each affected file is written exactly once,
+        # and a failure leaves every file as it was.
+        try:
+            append_json_files(
+                {
+                    _MODEL_CONFIG[name]['json_file']: (
+                        record for _, _, record in spool
+                    )
+                    for name, spool in spools.items()
+                },
+                replacements={
+                    _MODEL_CONFIG[name]['json_file']: {
+                        position: record
+                        for position, (_, _, record) in changed.items()
+                    }
+                    for name, changed in updates.items()
+                    if changed
+                },
+                expected=snapshot,
+            )
+        except DataConflictError as ex:
+            raise CommandError(str(ex))
+        written = '\n'.join(
+            [
+                f'Appended {count} record(s) to {json_file}.'
+                for json_file, count in counts
+            ]
+            + [
+                f'Updated {count} record(s) in {json_file}.'
+                for json_file, count in update_counts
+            ]
+        )
+        if unchanged:
+            written += f'\n{unchanged} matching record(s) were already up to date.'
         self.stdout.write(
             self.style.SUCCESS(
-                f'\nAppended {len(new_records)} record(s) '
-                f'to {config["json_file"]}.\n'
+                f'\n{written}\n'
                 'Run `python manage.py ingest` and the test suite to validate '
-                'the new records.'
+                'the changed records.'
             )
         )
+
+    def _report_updates(self, updates, existing_positions):
+        """
+        Print each updated record's changes, field by field.
+
+        Args:
+            updates (dict[str, dict[int, list]]): Per model, position to
+                [path index, row number, updated record].
+            existing_positions (dict[str, dict[tuple, int]]): Per model, the
+                natural key to position views the updates were found in.
+        """
+        for model_name, changed in updates.items():
+            if not changed:
+                continue
+            json_file = _MODEL_CONFIG[model_name]['json_file']
+            existing = load_json(json_file)
+            keys = {
+                position: key
+                for key, position in existing_positions[model_name].items()
+            }
+            self.stdout.write(f'\nUpdated {len(changed)} record(s) in {json_file}:')
+            for position, (path_index, row_num, record) in sorted(
+                changed.items(), key=lambda item: item[1][:2]
+            ):
+                where = self._where(path_index, row_num)
+                self.stdout.write(f'  {where}: {" | ".join(keys[position])}')
+                for line in describe_changes(existing[position], record):
+                    self.stdout.write(f'    {line}')
+
+    def _validate(self, spools, updates=None):
+        """
+        Validate new and updated records before they are written.
+
+        Runs each model serializer's field and object-level validation and
+        checks foreign keys against the keys in the canonical JSON, with no
+        database access. The models are validated in dependency order against
+        one index, so a record may refer to one imported earlier in the same
+        run. New references must also not derive a reference_id that already
+        exists.
+
+        Args:
+            spools (dict[str, RecordSpool]): Each model's new records, as
+                [path index, row number, record], in dependency order.
+            updates (dict[str, dict[int, list]] | None): Each model's updated
+                records, by position, in the same form.
+
+        Returns:
+            list[str]: 'Row N: field: message' lines; empty if all are valid.
+        """
+        index = CanonicalKeyIndex()
+        errors = []
+        for model_name, records in spools.items():
+            validator = RecordValidator(
+                _MODEL_CONFIG[model_name]['serializer'], index
+            )
+            # An updated record keeps its key, so it cannot collide.
+            changed = (updates or {}).get(model_name, {})
+            for path_index, row_num, record in changed.values():
+                record_errors = validator.validate(record)
+                where = self._where(path_index, row_num)
+                errors.extend(f'{where}: {error}' for error in record_errors)
+            for path_index, row_num, record in records:
+                record_errors = validator.validate(record)
+                if not record_errors and model_name == 'Reference':
+                    reference_id = derive_reference_id(
+                        record.get('reference_label', ''), record['csl_data']
+                    )
+                    if reference_id in index.keys(Reference):
+                        record_errors.append(
+                            f"reference_id: derives '{reference_id}', which "
+                            'already exists; set a distinguishing reference_label.'
+                        )
+                    else:
+                        index.add(Reference, reference_id)
+                elif not record_errors and model_name == 'Experiment':
+                    index.add(Experiment, record.get('id'))
+                where = self._where(path_index, row_num)
+                errors.extend(f'{where}: {error}' for error in record_errors)
+        return errors
@@ -1,8 +1,22 @@
+import copy
 import os
 import json
+import time
+from datetime import timedelta
 from django.core.management.base import BaseCommand, CommandError
 from django.core.exceptions import ValidationError
+from django.db.models import ProtectedError
+from ned_app.management.data_sources import DirectorySource, open_data_source
+from ned_app.management.dataset_versions import (
+    data_file_digests,
+    data_fingerprint,
+    latest_dataset_version,
+    natural_key,
+)
 from ned_app.models import (
+    ChangeTypeChoices,
+    DatasetChange,
+    DatasetVersion,
     Reference,
     Component,
     FragilityModel,
@@ -22,6 +36,7 @@ from ned_app.serialization.serializer import (
     ComponentFragilityModelBridgeSerializer,
     FragilityCurveSerializer,
 )
+from ned_app.signals import cache_invalidation_suspended
 
 
 def _flatten_detail(detail, field=None):
@@ -81,6 +96,45 @@ def _format_errors(exc):
     return [str(exc)]
 
 
+def _stored_values(instance):
+    """
+    Return a model instance's stored field values, for change detection.
+
+    Args:
+        instance: The model instance.
+
+    Returns:
+        dict: Column attribute name to value.
+    """
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    }
+
+
+def _unchanged_files(digests):
+    """
+    Return the data files whose bytes are the same as the latest version's.
+
+    Only a version loaded without failures records its files' digests, so
+    after a failed run every file counts as changed.
+
+    Args:
+        digests (dict[str, str]): This run's data_file_digests().
+
+    Returns:
+        set[str]: The names of the unchanged files.
+    """
+    latest = DatasetVersion.objects.only('file_digests').order_by('-pk').first()
+    if latest is None:
+        return set()
+    return {
+        name
+        for name, digest in digests.items()
+        if latest.file_digests.get(name) == digest
+    }
+
+
 class Command(BaseCommand):
     """
     Django management command to ingest data from canonical JSON files.
@@ -91,17 +145,76 @@ class Command(BaseCommand):
 
     help = 'Ingests data from JSON files using a generic, configurable processor.'
 
+    def add_arguments(self, parser):
+        """
+        Add command-line arguments for the ingest command.
+
+        Args:
+            parser: The argument parser to configure.
+        """
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help=(
+                'Delete database records that are no longer in their JSON file '
+                '(recorded as deletions in the dataset version change log)'
+            ),
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=(
+                'Skip the data files (or experiment shards) whose bytes are the '
+                'same as when the latest dataset version was loaded without '
+                'failures; edits made to the database since then are kept'
+            ),
+        )
+        parser.add_argument(
+            '--source',
+            help=(
+                'Where to read the data files: a directory, a .zip archive or '
+                'git:<revision> (default: the NED_DATA_SOURCE setting, or '
+                'resources/data/)'
+            ),
+        )
+
     def handle(self, *args, **options):
         """
         Execute the ingestion command.
 
         Processes all configured JSON data files in sequence, creating or updating
-        database records as needed.
+        database records as needed. With --prune, records missing from their
+        data file are then deleted. A run that changes the database, or loads
+        different data files, records a new DatasetVersion: the fingerprint
+        and git commit of the files, the row counts and the run's duration,
+        with a change log of the natural keys it created, updated and
+        deleted, which export_data --since turns into a delta. With
+        --incremental, files unchanged since that version are not loaded.
 
         Args:
             *args: Positional arguments (unused).
-            **options: Command options (unused).
+            **options: Command options including 'prune', 'incremental' and
+                'source'.
+        """
+        try:
+            source = open_data_source(options.get('source'))
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        with (
+            source or DirectorySource(build_json_data_file_path('')) as source,
+            cache_invalidation_suspended(),
+        ):
+            self._ingest(source, options)
+
+    def _ingest(self, source, options):
         """
+        Ingest every data file from a source (see handle()).
+
+        Args:
+            source (DataSource): Where to read the data files.
+            options (dict): The command options.
+        """
+        started = time.monotonic()
         processing_config = [
             {
                 'model': Reference,
@@ -154,16 +267,56 @@ class Command(BaseCommand):
             },
         ]
 
+        digests = data_file_digests(
+            source,
+            [
+                name
+                for config in processing_config
+                for name in source.data_files(config['file'])
+            ],
+        )
+        unchanged = set()
+        if options.get('incremental'):
+            unchanged = _unchanged_files(digests)
+
+        self._changes = []
+        self._seen_keys = {}
         total_failed = 0
         for config in processing_config:
             total_failed += self._process_data_file(
+                source=source,
                 model_class=config['model'],
                 serializer_class=config['serializer'],
                 data_file=config['file'],
                 lookup_field=config['lookup_field'],
                 lookup_deriver=config.get('lookup_deriver'),
+                unchanged=unchanged,
+                need_keys=options['prune'],
             )
 
+        if options['prune']:
+            if total_failed:
+                self.stdout.write(
+                    self.style.WARNING('Skipping --prune because of the failures.')
+                )
+            else:
+                # Children first, since foreign keys protect their parents.
+                for config in reversed(processing_config):
+                    total_failed += self._prune(
+                        config['model'], config['lookup_field']
+                    )
+
+        if total_failed:
+            digests = {}
+
+        # Changes were made even if some records failed, so record them.
+        self._record_dataset_version(
+            source,
+            digests,
+            [config['model'] for config in processing_config],
+            time.monotonic() - started,
+        )
+
         if total_failed:
             raise CommandError(
                 f'\nIngestion finished with {total_failed} failure(s). See the '
@@ -176,23 +329,33 @@ class Command(BaseCommand):
 
     def _process_data_file(
         self,
+        source,
         model_class,
         serializer_class,
         data_file,
         lookup_field,
         lookup_deriver=None,
+        unchanged=frozenset(),
+        need_keys=False,
     ):
         """
         Process a JSON data file for a given model.
 
         Handles file reading, data validation, idempotent create/update operations,
-        and result reporting.
+        and result reporting. Files listed in unchanged are not loaded; with
+        need_keys they are still read for their records' natural keys, so
+        --prune keeps those records.
 
         Args:
+            source (DataSource): Where to read the data file.
             model_class: The Django model class to process.
             serializer_class: The serializer class for validation and saving.
             data_file (str): The name of the JSON file to process.
             lookup_field (list): List of field names used to identify existing records.
+            lookup_deriver (callable): Computes the lookup parameters of a
+                record whose key is not stored in the JSON.
+            unchanged (set[str]): Files to skip (see _unchanged_files()).
+            need_keys (bool): Whether to read skipped files for their keys.
 
         Returns:
             int: The number of failures (unreadable file or invalid records).
@@ -201,23 +364,46 @@ class Command(BaseCommand):
         model_name = model_class.__name__
         self.stdout.write(f'--- Processing {model_name} from {data_file} ---')
 
-        data_filepath = build_json_data_file_path(data_file)
         created_count, updated_count, failed_count = 0, 0, 0
 
-        if not os.path.exists(data_filepath):
+        # The file itself and/or its shards (e.g. experiment/<reference>.json).
+        names = source.data_files(data_file)
+        if not names:
             self.stdout.write(
-                self.style.WARNING(f'File not found, skipping: {data_filepath}')
+                self.style.WARNING(
+                    f'File not found, skipping: {source.describe(data_file)}'
+                )
             )
             return 0
 
-        try:
-            with open(data_filepath, 'r') as file:
-                data = json.load(file)
-        except json.JSONDecodeError as ex:
-            self.stderr.write(f'Error: Invalid JSON in {data_filepath}: {ex}')
-            return 1
-
+        data, kept = [], []
+        skipped = [name for name in names if name in unchanged]
+        for name in names:
+            if name in unchanged and not need_keys:
+                continue
+            try:
+                records = source.records(name)
+            except json.JSONDecodeError as ex:
+                self.stderr.write(
+                    f'Error: Invalid JSON in {source.describe(name)}: {ex}'
+                )
+                return 1
+            (kept if name in unchanged else data).extend(records)
+        if skipped:
+            self.stdout.write(f'Skipping {len(skipped)} unchanged file(s).')
+
+        seen_keys = self._seen_keys[model_class] = set()
+        for item in kept:
+            # Loaded without failures last time, so the key can be derived.
+            if lookup_deriver is not None:
+                key = lookup_deriver(item)
+            else:
+                key = {field: item[field] for field in lookup_field}
+            seen_keys.add(tuple(key.values()))
         for item in data:
+            # The parsed records are shared through the canonical store, and
+            # validation may normalize values in place (e.g. csl_data 'id').
+            item = copy.deepcopy(item)
             lookup_params = None
             try:
                 if lookup_deriver is not None:
@@ -246,17 +432,25 @@ class Command(BaseCommand):
                         instance = None
 
                 if instance:
+                    before = _stored_values(instance)
                     serializer = serializer_class(instance, data=item)
                 else:
                     serializer = serializer_class(data=item)
 
                 serializer.is_valid(raise_exception=True)
-                serializer.save()
+                saved = serializer.save()
 
+                key = natural_key(saved, lookup_field)
+                seen_keys.add(tuple(key.values()))
                 if instance:
                     updated_count += 1
+                    if _stored_values(saved) != before:
+                        self._record_change(
+                            model_class, key, ChangeTypeChoices.UPDATED
+                        )
                 else:
                     created_count += 1
+                    self._record_change(model_class, key, ChangeTypeChoices.CREATED)
 
             except (ValidationError, Exception) as ex:
                 failed_count += 1
@@ -277,3 +471,103 @@ class Command(BaseCommand):
             )
         )
         return failed_count
+
+    def _prune(self, model_class, lookup_field):
+        """
+        Delete the records of a model that are not in its data file.
+
+        Models whose data file was missing or unreadable are left alone.
+
+        Args:
+            model_class: The Django model class to prune.
+            lookup_field (list): Field names used to identify records.
+
+        Returns:
+            int: The number of records that could not be deleted.
+        """
+        seen_keys = self._seen_keys.get(model_class)
+        if seen_keys is None:
+            return 0
+
+        meta = model_class._meta
+        attnames = [meta.get_field(field).attname for field in lookup_field]
+        stale = [
+            (pk, dict(zip(lookup_field, values)))
+            for pk, *values in model_class.objects.values_list('pk', *attnames)
+            if tuple(values) not in seen_keys
+        ]
+
+        deleted_count, failed_count = 0, 0
+        for pk, key in stale:
+            try:
+                model_class.objects.filter(pk=pk).delete()
+            except ProtectedError:
+                failed_count += 1
+                label = ', '.join(f'{f}={v}' for f, v in key.items())
+                self.stderr.write(
+                    f'Error deleting {model_class.__name__} [{label}]: it is '
+                    'still referenced by other records.'
+                )
+                continue
+            deleted_count += 1
+            self._record_change(model_class, key, ChangeTypeChoices.DELETED)
+
+        if stale:
+            self.stdout.write(
+                f'{model_class.__name__}: {deleted_count} pruned, '
+                f'{failed_count} failed.'
+            )
+        return failed_count
+
+    def _record_change(self, model_class, key, change_type):
+        """
+        Queue a change for this run's dataset version.
+
+        Args:
+            model_class: The changed record's model class.
+            key (dict): The record's natural key.
+            change_type (str): A ChangeTypeChoices value.
+        """
+        self._changes.append(
+            DatasetChange(
+                model=model_class.__name__, natural_key=key, change_type=change_type
+            )
+        )
+
+    def _record_dataset_version(self, source, digests, models, duration):
+        """
+        Record a new dataset version holding this run's changes, if any.
+
+        A run that changed nothing leaves the latest version as it is, unless
+        it loaded data files with a different fingerprint (e.g. the first
+        run after files were reformatted).
+
+        Args:
+            source (DataSource): Where the data files were read from.
+            digests (dict[str, str]): The data_file_digests() of the data
+                files, or {} if the run had failures.
+            models (list): The ingested model classes, to count.
+            duration (float): Seconds the run has taken.
+        """
+        fingerprint = data_fingerprint(digests) if digests else ''
+        if not self._changes:
+            latest = latest_dataset_version()
+            if not fingerprint or (
+                latest is not None and latest.fingerprint == fingerprint
+            ):
+                return
+        version = DatasetVersion.objects.create(
+            fingerprint=fingerprint,
+            git_commit=source.commit or '',
+            source=source.label[:255],
+            row_counts={model.__name__: model.objects.count() for model in models},
+            duration=timedelta(seconds=duration),
+            file_digests=digests,
+        )
+        for change in self._changes:
+            change.dataset_version = version
+        DatasetChange.objects.bulk_create(self._changes, batch_size=500)
+        self.stdout.write(
+            f'Recorded dataset version {version.pk} with '
+            f'{len(self._changes)} change(s).'
+        )
@@ -1,14 +1,104 @@
-import csv
-import json
+import itertools
 import os
 from django.core.management.base import BaseCommand, CommandError
-from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
 from django.apps import apps
-from django.db.models import JSONField, ManyToOneRel, ManyToManyField
+from django.db.models import ManyToOneRel, ManyToManyField
+
+from ned_app.management.partition_utils import (
+    filter_range,
+    part_filename,
+    partition_ranges,
+    parts_dir,
+    remove_parts,
+    run_partitions,
+    sha256_file,
+    write_manifest,
+)
+from ned_app.management.dataset_versions import dataset_cache_key
+from ned_app.management.saved_queries import (
+    QUERY_KEYS,
+    cache_paths,
+    deliver_cached_result,
+    load_saved_queries,
+    read_cached_row_count,
+    store_cached_result,
+)
+from ned_app.management.query_utils import (
+    OUTPUT_FORMATS,
+    STDOUT_PATH,
+    aggregate_column_name,
+    aggregate_needs_number,
+    aggregate_rows,
+    aggregate_type,
+    check_output,
+    column_is_numeric,
+    column_lookups,
+    column_types,
+    concatenate_parts,
+    encode_row,
+    open_output,
+    parse_aggregates,
+    parse_filter,
+    resolve_column,
+    resolve_columns,
+    write_rows,
+)
+
+
+# Rows fetched per database round trip while streaming an export.
+_CHUNK_SIZE = 2000
+
+
+def export_partition(spec):
+    """
+    Export one primary-key range of a query to a part file.
+
+    Runs in a worker process, so it takes and returns only picklable values
+    and rebuilds the queryset from the model name and filter text.
+
+    Args:
+        spec (dict): 'model', 'filter', 'columns' (from resolve_columns),
+            'format', 'low'/'high' (range bounds), 'file' and 'directory'.
+
+    Returns:
+        dict: The manifest entry for the part (file, range, rows, sha256).
+    """
+    model = apps.get_model('ned_app', spec['model'])
+    queryset = model.objects.all()
+    if spec['filter']:
+        queryset = queryset.filter(parse_filter(spec['filter']))
+    queryset = filter_range(queryset, spec['low'], spec['high'])
+
+    columns = spec['columns']
+    output_format = spec['format']
+    rows = queryset.values_list(*column_lookups(columns)).iterator(
+        chunk_size=_CHUNK_SIZE
+    )
+    encoded = (
+        encode_row(columns, values, encode_json=output_format != 'ndjson')
+        for values in rows
+    )
+    path = os.path.join(spec['directory'], spec['file'])
+    with open_output(path, output_format, None) as stream:
+        row_count = write_rows(
+            stream,
+            output_format,
+            [name for name, _, _ in columns],
+            encoded,
+            column_types(model, columns),
+        )
+    return {
+        'file': spec['file'],
+        'low': spec['low'],
+        'high': spec['high'],
+        'rows': row_count,
+        'sha256': sha256_file(path),
+    }
 
 
 class Command(BaseCommand):
-    help = 'Query any database table and export results to CSV'
+    help = 'Query any database table and export results to CSV, NDJSON or Parquet'
 
     def add_arguments(self, parser):
         """
@@ -32,19 +122,88 @@ class Command(BaseCommand):
             '--output_file',
             type=str,
             required=False,
-            help='Output CSV file path',
+            help=(
+                'Output file path; a .gz suffix compresses the output, and "-" '
+                'streams to stdout'
+            ),
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=OUTPUT_FORMATS,
+            default=None,
+            help='Output format (default: csv). parquet requires pyarrow',
         )
         parser.add_argument(
             '--fields',
             type=str,
             default=None,
-            help='Comma-separated fields to export (default: all fields)',
+            help=(
+                'Comma-separated fields to export (default: all fields). '
+                'Related fields may be given as paths, e.g. component__name'
+            ),
         )
         parser.add_argument(
             '--filter',
             type=str,
             default=None,
-            help='Filter query as key=value pairs, comma-separated (e.g., reviewer=John,material=Steel)',
+            help=(
+                'Filter expression of key=value conditions using Django lookups '
+                '(e.g., reviewer=John,edp_value__gte=0.01). "," is AND, "|" is '
+                'OR, "!" negates, and parentheses group'
+            ),
+        )
+        parser.add_argument(
+            '--group-by',
+            type=str,
+            default=None,
+            help=(
+                'Comma-separated fields to group by; switches to summary mode '
+                '(e.g., component,edp_metric,ds_class)'
+            ),
+        )
+        parser.add_argument(
+            '--agg',
+            type=str,
+            default=None,
+            help=(
+                'Comma-separated aggregates for summary mode: count, sum, min, '
+                'max, avg, stddev, median or pNN, as func or func:field '
+                '(e.g., count,min,max,avg:edp_value). Default: count'
+            ),
+        )
+        parser.add_argument(
+            '--saved',
+            type=str,
+            default=None,
+            help=(
+                'Run a named query from resources/saved_queries.json; results '
+                'are cached until ingest changes the data'
+            ),
+        )
+        parser.add_argument(
+            '--list-saved',
+            action='store_true',
+            help='List the named queries available to --saved',
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='With --saved, rerun the query instead of using a cached result',
+        )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=None,
+            help=(
+                'Split the rows into N primary-key ranges exported in parallel '
+                'to <output_file>.parts/part-NNNNN files with a manifest'
+            ),
+        )
+        parser.add_argument(
+            '--concat',
+            action='store_true',
+            help='With --partitions, join the parts into --output_file',
         )
 
     def get_available_models(self):
@@ -61,16 +220,24 @@ class Command(BaseCommand):
         """
         Export a model's rows to CSV, optionally filtered and field-limited.
 
+        With --group-by or --agg, export one summary row per group instead,
+        aggregated in the database. With --saved, the query options come from
+        the saved query registry and the result is cached per dataset
+        version (dataset_versions.dataset_cache_key), so rerunning it against
+        unchanged data copies the cached file instead of querying.
+
         Foreign key columns are emitted as their natural key (the value stored
         on the row via the FK's to_field), matching the identifiers used by
         export_data and the import commands. The output file is only opened
         once matching rows are confirmed, so a no-match query never truncates
-        an existing file.
+        an existing file. Output may be CSV, NDJSON or Parquet, gzipped for a
+        .gz path, or streamed to stdout for '-'.
 
         Args:
             *args: Positional arguments (unused).
             **options: Command options (model, output_file, fields, filter,
-                list_models).
+                group_by, agg, format, saved, no_cache, partitions, concat,
+                list_models, list_saved).
         """
         if options['list_models']:
             models = self.get_available_models()
@@ -79,6 +246,12 @@ class Command(BaseCommand):
                 self.stdout.write(f'  - {model}')
             return
 
+        if options['list_saved']:
+            self._list_saved_queries()
+            return
+        if options['saved']:
+            self._apply_saved_query(options)
+
         model_name = options['model']
         output_file = options['output_file']
 
@@ -96,76 +269,342 @@ class Command(BaseCommand):
                 'Use --list-models to see available models.'
             )
 
+        partitions = options['partitions']
+        if partitions is not None:
+            if partitions < 1:
+                raise CommandError('--partitions must be at least 1.')
+            if output_file == STDOUT_PATH:
+                raise CommandError('--partitions cannot stream to stdout.')
+            if options['group_by'] or options['agg']:
+                raise CommandError(
+                    '--partitions cannot be combined with --group-by/--agg.'
+                )
+        elif options['concat']:
+            raise CommandError('--concat requires --partitions.')
+
+        output_format = options['format'] = options['format'] or 'csv'
+        try:
+            check_output(output_file, output_format)
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        except ImportError:
+            raise CommandError(
+                'Parquet output requires pyarrow (pip install pyarrow).'
+            )
+
+        # Status messages must not mix with exported data streamed to stdout.
+        status = self.stderr if output_file == STDOUT_PATH else self.stdout
+
         # Validate requested field names up front so a typo fails loudly
-        # rather than producing a silently-empty column.
-        fields = None
+        # rather than producing a silently-empty column. Related paths such as
+        # component__name are resolved here too; values_list() turns them into
+        # joins, so a joined export is still a single SQL query.
+        columns = None
         if options['fields']:
-            fields = [f.strip() for f in options['fields'].split(',')]
-            for field_name in fields:
-                try:
-                    model._meta.get_field(field_name)
-                except FieldDoesNotExist:
-                    raise CommandError(
-                        f"Field '{field_name}' does not exist on model "
-                        f"'{model_name}'."
-                    )
+            columns = self._resolve_field_list(model, options['fields'])
+
+        group_columns = aggregates = None
+        if options['group_by'] or options['agg']:
+            if columns is not None:
+                raise CommandError(
+                    '--fields cannot be combined with --group-by/--agg; the '
+                    'output columns are the groups and the aggregates.'
+                )
+            group_columns, aggregates = self._resolve_aggregation(
+                model, options['group_by'], options['agg'] or 'count'
+            )
 
-        # Build queryset with filters
+        # Build queryset with filters, compiled into a single WHERE clause.
         queryset = model.objects.all()
         if options['filter']:
-            filters = {}
-            for pair in options['filter'].split(','):
-                if '=' not in pair:
-                    raise CommandError(
-                        f"Invalid filter '{pair.strip()}'. "
-                        'Expected key=value format.'
-                    )
-                key, value = pair.split('=', 1)
-                filters[key.strip()] = value.strip()
             try:
-                queryset = model.objects.filter(**filters)
-            except FieldError as ex:
+                queryset = queryset.filter(parse_filter(options['filter']))
+            except (ValueError, FieldError) as ex:
                 raise CommandError(f'Invalid filter: {ex}')
+            except ValidationError as ex:
+                raise CommandError(f'Invalid filter: {" ".join(ex.messages)}')
 
-        # Check for results BEFORE opening the file, so a no-match query does
-        # not truncate a pre-existing file at the output path.
-        if not queryset.exists():
-            self.stdout.write('No data found matching criteria')
-            return
+        # A saved query against unchanged data is served from the cache
+        # with one query, for the dataset version.
+        cache = None
+        if options['saved'] and not options['no_cache'] and partitions is None:
+            cache = cache_paths(options, dataset_cache_key())
+            row_count = read_cached_row_count(cache[1])
+            if row_count is not None:
+                self._deliver_cached(cache[0], output_file, output_format)
+                destination = 'stdout' if output_file == STDOUT_PATH else output_file
+                status.write(
+                    self.style.SUCCESS(
+                        f'Exported {row_count} rows to {destination} (cached)'
+                    )
+                )
+                return
 
-        # Get field names dynamically
-        if fields:
-            field_names = fields
-        else:
-            field_names = [
-                f.name
-                for f in model._meta.get_fields()
-                if not isinstance(f, ManyToOneRel)
-                and not isinstance(f, ManyToManyField)
+        if aggregates is not None:
+            # Summary mode: one GROUP BY query (plus a streaming pass for any
+            # quantiles) instead of exporting every row.
+            types = column_types(model, group_columns) + [
+                aggregate_type(
+                    func,
+                    field and column_types(model, [resolve_column(model, field)])[0],
+                )
+                for func, field, _ in aggregates
             ]
+            columns = group_columns + [
+                (aggregate_column_name(func, field), lookup or func, False)
+                for func, field, lookup in aggregates
+            ]
+            rows = aggregate_rows(
+                queryset,
+                group_columns,
+                [(func, lookup) for func, _, lookup in aggregates],
+            )
+        else:
+            # Get field names dynamically
+            if columns is None:
+                columns = resolve_columns(
+                    model,
+                    [
+                        f.name
+                        for f in model._meta.get_fields()
+                        if not isinstance(f, ManyToOneRel)
+                        and not isinstance(f, ManyToManyField)
+                    ],
+                )
+            if partitions is not None:
+                self._export_partitioned(
+                    model, queryset, columns, partitions, options
+                )
+                return
+            types = column_types(model, columns)
+            rows = queryset.values_list(*column_lookups(columns)).iterator(
+                chunk_size=_CHUNK_SIZE
+            )
+        field_names = [name for name, _, _ in columns]
 
-        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
-
-        with open(output_file, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=field_names)
-            writer.writeheader()
-
-            for obj in queryset:
-                row = {}
-                for field_name in field_names:
-                    # attname yields the value stored on the row: for a normal
-                    # field that is the field value; for a ForeignKey it is the
-                    # to_field natural key (e.g. reference_id, component_id).
-                    try:
-                        field_obj = model._meta.get_field(field_name)
-                        value = getattr(obj, field_obj.attname)
-                        if isinstance(field_obj, JSONField) and value is not None:
-                            value = json.dumps(value)
-                        row[field_name] = value
-                    except (FieldDoesNotExist, AttributeError):
-                        row[field_name] = ''
-                writer.writerow(row)
+        # Pull the first row BEFORE opening the file, so a no-match query does
+        # not truncate a pre-existing file at the output path. This replaces a
+        # separate exists() query: the export stays one streaming query.
+        first = next(rows, None)
+        if first is None:
+            status.write('No data found matching criteria')
+            return
 
+        encoded = (
+            encode_row(columns, values, encode_json=output_format != 'ndjson')
+            for values in itertools.chain([first], rows)
+        )
+        # On a cache miss the result is written to the cache first, then
+        # copied to the requested destination.
+        target = output_file if cache is None else f'{cache[0]}.partial'
+        try:
+            with open_output(target, output_format, self.stdout) as stream:
+                row_count = write_rows(
+                    stream, output_format, field_names, encoded, types
+                )
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        if cache is not None:
+            os.replace(target, cache[0])
+            store_cached_result(cache[0], cache[1], row_count)
+            self._deliver_cached(cache[0], output_file, output_format)
+
+        destination = 'stdout' if output_file == STDOUT_PATH else output_file
+        status.write(
+            self.style.SUCCESS(f'Exported {row_count} rows to {destination}')
+        )
+
+    def _export_partitioned(self, model, queryset, columns, partitions, options):
+        """
+        Export the rows as primary-key range parts, in parallel workers.
+
+        Parts are written to '<output_file>.parts/' with a manifest of row
+        counts and checksums, each a complete file in the output format. With
+        --concat they are joined into output_file and the parts directory is
+        removed. Rows come out in primary-key order.
+
+        Args:
+            model: The Django model being queried.
+            queryset (QuerySet): The filtered rows.
+            columns (list[tuple]): Column specs from resolve_columns.
+            partitions (int): The number of primary-key ranges.
+            options (dict): The command options.
+        """
+        ranges = partition_ranges(queryset, partitions)
+        if not ranges:
+            self.stdout.write('No data found matching criteria')
+            return
+
+        output_file = options['output_file']
+        output_format = options['format']
+        directory = parts_dir(output_file)
+        os.makedirs(directory, exist_ok=True)
+        specs = [
+            {
+                'model': model.__name__,
+                'filter': options['filter'],
+                'columns': columns,
+                'format': output_format,
+                'low': low,
+                'high': high,
+                'file': part_filename(index, output_file),
+                'directory': directory,
+            }
+            for index, (low, high) in enumerate(ranges)
+        ]
+        parts = run_partitions(export_partition, specs)
+        write_manifest(directory, parts, model=model.__name__, format=output_format)
+        row_count = sum(part['rows'] for part in parts)
+
+        if options['concat']:
+            concatenate_parts(
+                [
+                    os.path.join(directory, part['file'])
+                    for part in parts
+                    if part['rows']
+                ],
+                output_file,
+                output_format,
+            )
+            remove_parts(directory)
+            destination = output_file
+        else:
+            destination = f'{len(parts)} parts in {directory}'
         self.stdout.write(
-            self.style.SUCCESS(f'Exported {queryset.count()} rows to {output_file}')
+            self.style.SUCCESS(f'Exported {row_count} rows to {destination}')
         )
+
+    def _list_saved_queries(self):
+        """Print the names and descriptions of the saved queries."""
+        try:
+            registry = load_saved_queries()
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        self.stdout.write(self.style.SUCCESS('Saved queries:'))
+        for name in sorted(registry):
+            description = registry[name].get('description')
+            self.stdout.write(
+                f'  - {name}' + (f': {description}' if description else '')
+            )
+
+    def _apply_saved_query(self, options):
+        """
+        Fill the query options from a saved query definition.
+
+        Args:
+            options (dict): The command options, updated in place.
+
+        Raises:
+            CommandError: If the query is unknown, or query options were also
+                given on the command line.
+        """
+        name = options['saved']
+        try:
+            registry = load_saved_queries()
+        except ValueError as ex:
+            raise CommandError(str(ex))
+        if name not in registry:
+            raise CommandError(
+                f"No saved query named '{name}'. Use --list-saved to see the "
+                'available queries.'
+            )
+
+        given = [key for key in QUERY_KEYS if key != 'format' and options[key]]
+        if given:
+            raise CommandError(
+                '--saved cannot be combined with '
+                + ', '.join(f'--{key.replace("_", "-")}' for key in given)
+                + '; edit the saved query instead.'
+            )
+        definition = registry[name]
+        for key in QUERY_KEYS:
+            # An explicit --format overrides the saved query's format.
+            if key != 'format' or not options['format']:
+                options[key] = definition.get(key)
+
+    def _deliver_cached(self, result_path, output_file, output_format):
+        """
+        Copy a cached result to the output, reporting unsupported targets.
+
+        Args:
+            result_path (str): The cached result file.
+            output_file (str): The destination path, '-' for stdout.
+            output_format (str): The result's format.
+        """
+        try:
+            deliver_cached_result(
+                result_path, output_file, output_format, self.stdout
+            )
+        except AttributeError:
+            raise CommandError('Parquet output needs a binary stdout.')
+
+    def _resolve_field_list(self, model, text):
+        """
+        Resolve a comma-separated list of field names or related paths.
+
+        Args:
+            model: The Django model being queried.
+            text (str): Comma-separated field names.
+
+        Returns:
+            list[tuple]: Column specs from resolve_column.
+
+        Raises:
+            CommandError: If a field does not exist or cannot be exported.
+        """
+        columns = []
+        for field_name in text.split(','):
+            field_name = field_name.strip()
+            try:
+                columns.append(resolve_column(model, field_name))
+            except FieldDoesNotExist:
+                raise CommandError(
+                    f"Field '{field_name}' does not exist on model "
+                    f"'{model.__name__}'."
+                )
+            except FieldError as ex:
+                raise CommandError(f"Invalid field '{field_name}': {ex}")
+        return columns
+
+    def _resolve_aggregation(self, model, group_by, agg):
+        """
+        Resolve the --group-by columns and --agg aggregates.
+
+        Args:
+            model: The Django model being queried.
+            group_by (str | None): Comma-separated grouping fields.
+            agg (str): Comma-separated aggregate items (see parse_aggregates).
+
+        Returns:
+            tuple[list[tuple], list[tuple[str, str | None, str | None]]]: The
+            grouping column specs, and (function, field, lookup) per aggregate.
+
+        Raises:
+            CommandError: If a field or aggregate is invalid.
+        """
+        group_columns = self._resolve_field_list(model, group_by) if group_by else []
+        for name, lookup, is_json in group_columns:
+            if not lookup or is_json:
+                raise CommandError(f"Cannot group by '{name}'.")
+
+        try:
+            parsed = parse_aggregates(agg)
+        except ValueError as ex:
+            raise CommandError(f'Invalid --agg: {ex}')
+
+        aggregates = []
+        for func, field in parsed:
+            lookup = None
+            if field:
+                ((_, lookup, is_json),) = self._resolve_field_list(model, field)
+                if not lookup or is_json:
+                    raise CommandError(f"Cannot aggregate '{field}'.")
+                if aggregate_needs_number(func) and not column_is_numeric(
+                    model, field
+                ):
+                    raise CommandError(
+                        f"Cannot compute '{func}' of '{field}': it is not a "
+                        'numeric field.'
+                    )
+            aggregates.append((func, field, lookup))
+        return group_columns, aggregates
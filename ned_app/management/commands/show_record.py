@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ned_app.management.canonical_store import NATURAL_KEYS
+from ned_app.management.record_index import lookup_record
+
+
+class Command(BaseCommand):
+    help = (
+        'Print one canonical record from resources/data/ by its natural key, '
+        'reading only that record through a byte-offset index (kept in '
+        'NED_CACHE_DIR and refreshed when the data files change).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help="The data file, e.g. 'experiment' or 'fragility_curve.json'.",
+        )
+        parser.add_argument(
+            'key',
+            nargs='+',
+            help=(
+                "The natural key's values, e.g. an experiment id, or a "
+                "fragility model id and a ds_rank ('R-2020|fra1' 1)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        filename = options['file']
+        if not filename.endswith('.json'):
+            filename += '.json'
+        if filename not in NATURAL_KEYS:
+            raise CommandError(
+                f"Unknown data file '{options['file']}'. Choose from: "
+                f'{", ".join(sorted(NATURAL_KEYS))}'
+            )
+        key = tuple(options['key'])
+        try:
+            record = lookup_record(filename, key)
+        except json.JSONDecodeError as ex:
+            raise CommandError(f'Invalid JSON in {filename}: {ex}')
+        if record is None:
+            raise CommandError(f'No record in {filename} has the key {key}.')
+        self.stdout.write(json.dumps(record, indent=4, sort_keys=True))
@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from ned_app.management.canonical_store import NATURAL_KEYS, parse_records
+from ned_app.management.data_manifest import record_hash, record_labels
+
+
+# Stands for a field that one version of a record does not have.
+MISSING = object()
+
+
+def field_changes(old, new, prefix=''):
+    """
+    List the field-level differences between two versions of a record.
+
+    Args:
+        old (dict): The record before.
+        new (dict): The record after.
+        prefix (str): Prefix for nested field names.
+
+    Returns:
+        dict[str, tuple]: Each differing field, nested objects as
+        'field.key', in name order, to its (old, new) values; a side without
+        the field is MISSING.
+    """
+    changes = {}
+    for field in sorted(set(old) | set(new)):
+        before, after = old.get(field, MISSING), new.get(field, MISSING)
+        if before == after:
+            continue
+        if isinstance(before, dict) and isinstance(after, dict):
+            changes.update(field_changes(before, after, f'{prefix}{field}.'))
+        else:
+            changes[f'{prefix}{field}'] = (before, after)
+    return changes
+
+
+def describe_change(field, before, after):
+    """
+    Render one entry of field_changes() as a 'field: old -> new' line.
+
+    Values are shown as JSON; a side without the field shows as '(unset)'.
+    """
+    shown = [
+        '(unset)' if value is MISSING else json.dumps(value, ensure_ascii=False)
+        for value in (before, after)
+    ]
+    return f'{field}: {shown[0]} -> {shown[1]}'
+
+
+def describe_changes(old, new):
+    """
+    List the field-level differences between two versions of a record.
+
+    Args:
+        old (dict): The record before.
+        new (dict): The record after.
+
+    Returns:
+        list[str]: A describe_change() line per field_changes() entry.
+    """
+    return [
+        describe_change(field, *values)
+        for field, values in field_changes(old, new).items()
+    ]
+
+
+def _read_data_file(source, filename):
+    """
+    Read the files holding a data file's records from a source.
+
+    Returns:
+        tuple[str, list[tuple[str, bytes]]]: A digest of the files' names and
+        bytes, and the (name, bytes) pairs in reading order.
+    """
+    digest = hashlib.sha256()
+    files = []
+    for name in source.data_files(filename):
+        data = source.read(name)
+        digest.update(f'{name}\0{len(data)}\0'.encode('utf-8') + data)
+        files.append((name, data))
+    return digest.hexdigest(), files
+
+
+def _labelled_records(filename, files):
+    records = [
+        record for name, data in files for record in parse_records(name, data)
+    ]
+    return dict(record_labels(filename, records))
+
+
+def diff_data_sources(old, new):
+    """
+    Compare the canonical records of two data sources by natural key.
+
+    Records are matched by their natural key (labelled as in the dataset
+    manifest), not by position, so records that only moved are equal. Each
+    data file is read once from each source; files whose bytes are the same
+    in both are not parsed, and the rest are compared by record hash with
+    dictionary lookups, so the cost is linear in the size of the data.
+
+    Args:
+        old (DataSource): The data before.
+        new (DataSource): The data after.
+
+    Returns:
+        dict[str, dict]: Per differing data file, in NATURAL_KEYS order, the
+        sorted labels of its 'added' and 'removed' records and, under
+        'changed', each changed record's label (sorted) to its
+        field_changes().
+
+    Raises:
+        json.JSONDecodeError: If a data file is not valid JSON.
+    """
+    differences = {}
+    for filename in NATURAL_KEYS:
+        old_digest, old_files = _read_data_file(old, filename)
+        new_digest, new_files = _read_data_file(new, filename)
+        if old_digest == new_digest:
+            continue
+        before = _labelled_records(filename, old_files)
+        after = _labelled_records(filename, new_files)
+        changed = {}
+        for label in sorted(before.keys() & after.keys()):
+            old_record, new_record = before[label], after[label]
+            if record_hash(old_record) != record_hash(new_record):
+                changed[label] = field_changes(old_record, new_record)
+        added = sorted(after.keys() - before.keys())
+        removed = sorted(before.keys() - after.keys())
+        if added or removed or changed:
+            differences[filename] = {
+                'added': added,
+                'removed': removed,
+                'changed': changed,
+            }
+    return differences
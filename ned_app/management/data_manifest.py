@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+
+from ned_app.management.canonical_store import NATURAL_KEYS
+from ned_app.management.data_sources import DirectorySource
+from ned_app.serialization.file_and_path_utiles import (
+    PARENT_RESOURCES_DIR,
+    build_path_from_base_dir,
+    get_data_dir,
+)
+
+
+# The manifest of resources/data/, stored next to it.
+MANIFEST_FILE = os.path.join(PARENT_RESOURCES_DIR, 'data_manifest.json')
+
+# Bumped when the hashing scheme changes; older manifests are rebuilt.
+MANIFEST_FORMAT = 2
+
+
+def record_hash(record):
+    """
+    Hash one canonical record.
+
+    The hash covers the record's content only (keys sorted, no whitespace),
+    so it is the same in a .json or .ndjson file, at any position.
+
+    Args:
+        record (dict): The record.
+
+    Returns:
+        str: A hex digest.
+    """
+    text = json.dumps(
+        record, sort_keys=True, ensure_ascii=True, separators=(',', ':')
+    )
+    return hashlib.sha256(text.encode('ascii')).hexdigest()[:32]
+
+
+def _roll_up(hashes):
+    # A node's hash from its children's labels and hashes, in label order.
+    digest = hashlib.sha256()
+    for label in sorted(hashes):
+        digest.update(f'{label}\0{hashes[label]}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def record_labels(filename, records):
+    """
+    Label each record of a data file by its natural key.
+
+    Keys are joined with '|' (as fragility model ids are). A record without
+    a computable key ('_comment' records, or one missing a key field), or a
+    repeat of an earlier key, is labelled by its key (if any) and content
+    hash, e.g. 'exp001#3f2a9c0d41b7', so that moving it is not a change.
+    Identical copies of such a record are numbered, e.g. '#3f2a9c0d41b7#2'.
+
+    Args:
+        filename (str): The data file's name in NATURAL_KEYS.
+        records (list[dict]): Its records, in reading order.
+
+    Yields:
+        tuple[str, dict]: The label and the record.
+    """
+    key = NATURAL_KEYS[filename]
+    seen = set()
+    for record in records:
+        try:
+            label = None if '_comment' in record else '|'.join(key(record))
+        except (KeyError, IndexError, TypeError):
+            label = None
+        if label is None or label in seen:
+            base = label = f'{label or ""}#{record_hash(record)[:12]}'
+            copy = 1
+            while label in seen:
+                copy += 1
+                label = f'{base}#{copy}'
+        seen.add(label)
+        yield label, record
+
+
+def build_manifest(previous=None, source=None):
+    """
+    Build the Merkle manifest of the canonical data.
+
+    Each record is hashed under its natural key; each data file's root
+    hashes its records' labels and hashes, and the dataset root hashes the
+    files' roots. A data file read from several files (a .json/.ndjson
+    variant, shards) is one node, so the manifest does not depend on the
+    storage layout.
+
+    Args:
+        previous (dict | None): An earlier manifest. The subtree of a data
+            file whose source files are byte-identical is reused without
+            parsing them.
+        source (DataSource | None): Where to read the data files (default:
+            resources/data/).
+
+    Returns:
+        dict: The manifest: 'format', 'root' and, per data file, its 'root',
+        'count', 'sources' (relative path to SHA-256 of the file's bytes)
+        and 'records' (label to record hash).
+
+    Raises:
+        json.JSONDecodeError: If a data file is not valid JSON.
+    """
+    source = source or DirectorySource(get_data_dir())
+    reusable = {}
+    if previous and previous.get('format') == MANIFEST_FORMAT:
+        reusable = previous.get('files', {})
+
+    files = {}
+    for filename in NATURAL_KEYS:
+        names = source.data_files(filename)
+        if not names:
+            continue
+        sources = {
+            name: hashlib.sha256(source.read(name)).hexdigest() for name in names
+        }
+        earlier = reusable.get(filename)
+        if earlier is not None and earlier.get('sources') == sources:
+            files[filename] = earlier
+            continue
+        records = [record for name in names for record in source.records(name)]
+        hashes = {
+            label: record_hash(record)
+            for label, record in record_labels(filename, records)
+        }
+        files[filename] = {
+            'root': _roll_up(hashes),
+            'count': len(hashes),
+            'sources': sources,
+            'records': hashes,
+        }
+    return {
+        'format': MANIFEST_FORMAT,
+        'root': _roll_up({name: entry['root'] for name, entry in files.items()}),
+        'files': files,
+    }
+
+
+def load_manifest(path=None):
+    """
+    Load a stored manifest.
+
+    Args:
+        path (str | None): The manifest file (default: MANIFEST_FILE under
+            settings.BASE_DIR).
+
+    Returns:
+        dict | None: The manifest, or None if there is none or it cannot be
+        read.
+    """
+    path = path or build_path_from_base_dir(MANIFEST_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def write_manifest(manifest, path=None):
+    """
+    Store a manifest, replacing the file atomically.
+
+    Args:
+        manifest (dict): The manifest from build_manifest().
+        path (str | None): As for load_manifest().
+    """
+    path = path or build_path_from_base_dir(MANIFEST_FILE)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True, ensure_ascii=True)
+        f.write('\n')
+    os.replace(temp, path)
+
+
+def diff_manifests(old, new):
+    """
+    List the records that differ between two manifests.
+
+    Only data files whose roots differ are compared record by record.
+
+    Args:
+        old (dict): The earlier manifest.
+        new (dict): The later manifest.
+
+    Returns:
+        dict[str, dict[str, list[str]]]: Per differing data file, the sorted
+        labels of its 'added', 'removed' and 'changed' records. Empty if the
+        roots match.
+    """
+    if old.get('root') == new.get('root'):
+        return {}
+    old_files, new_files = old.get('files', {}), new.get('files', {})
+    differences = {}
+    for filename in sorted(set(old_files) | set(new_files)):
+        before = old_files.get(filename, {})
+        after = new_files.get(filename, {})
+        if before.get('root') == after.get('root'):
+            continue
+        old_records = before.get('records', {})
+        new_records = after.get('records', {})
+        differences[filename] = {
+            'added': sorted(set(new_records) - set(old_records)),
+            'removed': sorted(set(old_records) - set(new_records)),
+            'changed': sorted(
+                label
+                for label in set(old_records) & set(new_records)
+                if old_records[label] != new_records[label]
+            ),
+        }
+    return differences
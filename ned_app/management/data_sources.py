@@ -0,0 +1,343 @@
+import abc
+import os
+import re
+import subprocess
+import zipfile
+
+from django.conf import settings
+
+from ned_app.management.canonical_store import (
+    NATURAL_KEYS,
+    canonical_store,
+    parse_records,
+)
+from ned_app.serialization.file_and_path_utiles import (
+    DATA_DIR,
+    NDJSON_SUFFIX,
+    get_data_dir,
+    list_data_file_paths,
+)
+
+
+# Prefixes of the --source / NED_DATA_SOURCE forms that are not a path.
+_GIT_PREFIX = 'git:'
+_ZIP_PREFIX = 'zip:'
+_DIR_PREFIX = 'dir:'
+
+_COMMIT_ID = re.compile(r'[0-9a-f]{40}')
+
+
+def _run_git(directory, *args):
+    return subprocess.run(
+        ['git', *args], cwd=directory, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _order_data_files(filename, names):
+    """
+    Pick a data file's files out of a listing, in reading order.
+
+    The order is that of list_data_file_paths: the file itself (.json, then
+    .ndjson), then the shards in its directory by name.
+
+    Args:
+        filename (str): The data file's name, e.g. 'experiment.json'.
+        names (Iterable[str]): Every file in the source, relative to the
+            data directory, with '/' separators.
+
+    Returns:
+        list[str]: The names holding the data file's records.
+    """
+    names = set(names)
+    stem = os.path.splitext(filename)[0]
+    ordered = [
+        name for name in (f'{stem}.json', stem + NDJSON_SUFFIX) if name in names
+    ]
+    shard_prefix = f'{stem}/'
+    ordered.extend(
+        sorted(
+            name
+            for name in names
+            if name.startswith(shard_prefix)
+            and '/' not in name[len(shard_prefix) :]
+            and name.endswith(('.json', NDJSON_SUFFIX))
+            and not name[len(shard_prefix) :].startswith('.')
+        )
+    )
+    return ordered
+
+
+class DataSource(abc.ABC):
+    """
+    Read-only access to a set of canonical data files.
+
+    Files are named relative to the data directory with '/' separators,
+    e.g. 'experiment/Smith-2020.json'. Sources are context managers;
+    closing one releases any file or process it holds.
+    """
+
+    # Shown in messages, e.g. 'resources/data' or 'git:v1.2'.
+    label = ''
+    # The git commit the files are exactly as of, if known.
+    commit = None
+
+    @abc.abstractmethod
+    def data_files(self, filename):
+        """
+        Return the files holding a data file's records, in reading order.
+
+        Args:
+            filename (str): The data file's name, e.g. 'experiment.json'.
+
+        Returns:
+            list[str]: File names (empty if the data file is absent).
+        """
+
+    @abc.abstractmethod
+    def read(self, name):
+        """
+        Return a file's bytes.
+
+        Args:
+            name (str): A name from data_files().
+
+        Returns:
+            bytes: The file's contents.
+        """
+
+    def records(self, name):
+        """
+        Return a file's parsed records.
+
+        Args:
+            name (str): A name from data_files().
+
+        Returns:
+            list[dict]: The records (shared by DirectorySource; do not
+            modify).
+
+        Raises:
+            json.JSONDecodeError: If the file is not valid JSON.
+        """
+        return parse_records(name, self.read(name))
+
+    def describe(self, name):
+        """Return a file's name for messages."""
+        return f'{self.label}:{name}'
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DirectorySource(DataSource):
+    """Data files in a directory, read through the CanonicalStore."""
+
+    def __init__(self, root=None):
+        """
+        Args:
+            root (str | None): The data directory (default: resources/data/
+                under settings.BASE_DIR).
+        """
+        self.root = os.path.normpath(root or get_data_dir())
+        self.label = self.root
+
+    @property
+    def commit(self):
+        """The checkout's HEAD, if the directory has no uncommitted changes."""
+        try:
+            head = _run_git(self.root, 'rev-parse', '--verify', '--quiet', 'HEAD')
+            changes = _run_git(self.root, 'status', '--porcelain', '--', '.')
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        head = head.strip()
+        return head if _COMMIT_ID.fullmatch(head) and not changes else None
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def data_files(self, filename):
+        return [
+            os.path.relpath(path, self.root).replace(os.sep, '/')
+            for path in list_data_file_paths(os.path.join(self.root, filename))
+        ]
+
+    def read(self, name):
+        with open(self._path(name), 'rb') as f:
+            return f.read()
+
+    def records(self, name):
+        return canonical_store.records(self._path(name))
+
+    def describe(self, name):
+        return self._path(name)
+
+
+class ZipSource(DataSource):
+    """
+    Data files in a zip archive, read member by member without extracting.
+
+    The data directory inside the archive is the one holding the data files
+    (e.g. 'resources/data/' in an archive of the repository, or the root of
+    an archive of just the data).
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The archive.
+
+        Raises:
+            ValueError: If the file is not a readable zip archive.
+        """
+        try:
+            self._zip = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile) as ex:
+            raise ValueError(f"Cannot open zip archive '{path}': {ex}")
+        self.label = path
+        data_names = {
+            os.path.splitext(filename)[0] + suffix
+            for filename in NATURAL_KEYS
+            for suffix in ('.json', NDJSON_SUFFIX)
+        }
+        # The shallowest directory holding a top-level data file.
+        prefixes = sorted(
+            (
+                member[: -len(os.path.basename(member))]
+                for member in self._zip.namelist()
+                if os.path.basename(member) in data_names
+            ),
+            key=lambda prefix: (prefix.count('/'), prefix),
+        )
+        self._prefix = prefixes[0] if prefixes else ''
+        self._names = [
+            member[len(self._prefix) :]
+            for member in self._zip.namelist()
+            if member.startswith(self._prefix) and not member.endswith('/')
+        ]
+        # 'git archive' (and so a GitHub release download) stores the commit
+        # as the archive comment.
+        comment = self._zip.comment.decode('ascii', 'replace').strip()
+        self.commit = comment if _COMMIT_ID.fullmatch(comment) else None
+
+    def data_files(self, filename):
+        return _order_data_files(filename, self._names)
+
+    def read(self, name):
+        return self._zip.read(self._prefix + name)
+
+    def close(self):
+        self._zip.close()
+
+
+class GitSource(DataSource):
+    """
+    Data files at a git revision, read from the object store.
+
+    Files are listed with 'git ls-tree' and read through one long-running
+    'git cat-file --batch', so nothing is checked out.
+    """
+
+    def __init__(self, revision, repository=None):
+        """
+        Args:
+            revision (str): Any revision git understands, e.g. 'v1.2',
+                'main~3' or a commit hash.
+            repository (str | None): The repository, with resources/data/ at
+                its top level (default: settings.BASE_DIR).
+
+        Raises:
+            ValueError: If git is not available or does not know the
+                revision.
+        """
+        self.repository = str(repository or settings.BASE_DIR)
+        self.label = f'{_GIT_PREFIX}{revision}'
+        try:
+            self.commit = _run_git(
+                self.repository,
+                'rev-parse',
+                '--verify',
+                '--quiet',
+                f'{revision}^{{commit}}',
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            raise ValueError(f"Unknown git revision '{revision}'.")
+        self._prefix = DATA_DIR.replace(os.sep, '/') + '/'
+        listing = _run_git(
+            self.repository,
+            'ls-tree',
+            '-r',
+            '-z',
+            '--name-only',
+            self.commit,
+            '--',
+            self._prefix,
+        )
+        self._names = [
+            path[len(self._prefix) :] for path in listing.split('\0') if path
+        ]
+        self._batch = None
+
+    def data_files(self, filename):
+        return _order_data_files(filename, self._names)
+
+    def read(self, name):
+        if self._batch is None:
+            self._batch = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=self.repository,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        self._batch.stdin.write(f'{self.commit}:{self._prefix}{name}\n'.encode())
+        self._batch.stdin.flush()
+        header = self._batch.stdout.readline().split()
+        if len(header) != 3:
+            raise FileNotFoundError(f'{name} is not in {self.label}')
+        data = self._batch.stdout.read(int(header[2]))
+        self._batch.stdout.read(1)  # The newline after the contents.
+        return data
+
+    def close(self):
+        if self._batch is not None:
+            self._batch.stdin.close()
+            self._batch.wait()
+            self._batch = None
+
+
+def open_data_source(spec=None):
+    """
+    Open the data source a --source option or setting names.
+
+    Args:
+        spec (str | None): 'git:<revision>', a path to a '.zip' archive (or
+            'zip:<path>'), or a directory (or 'dir:<path>'). None uses the
+            NED_DATA_SOURCE setting.
+
+    Returns:
+        DataSource | None: The source, to be closed when done; None if
+        neither names one (the caller then reads resources/data/).
+
+    Raises:
+        ValueError: If the source does not exist or cannot be read.
+    """
+    spec = spec or getattr(settings, 'NED_DATA_SOURCE', None)
+    if not spec:
+        return None
+    spec = str(spec)
+    if spec.startswith(_GIT_PREFIX):
+        return GitSource(spec[len(_GIT_PREFIX) :])
+    if spec.startswith(_ZIP_PREFIX):
+        return ZipSource(spec[len(_ZIP_PREFIX) :])
+    if spec.startswith(_DIR_PREFIX):
+        spec = spec[len(_DIR_PREFIX) :]
+    elif spec.endswith('.zip'):
+        return ZipSource(spec)
+    if not os.path.isdir(spec):
+        raise ValueError(f"Data source '{spec}' is not a directory.")
+    return DirectorySource(spec)
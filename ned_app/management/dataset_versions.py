@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+
+from django.db.models import Max, Q
+
+from ned_app.models import ChangeTypeChoices, DatasetChange, DatasetVersion
+
+
+# Natural keys matched per query when selecting changed records.
+_KEY_BATCH_SIZE = 200
+
+
+def natural_key(instance, lookup_fields):
+    """
+    Return a record's natural key from its stored field values.
+
+    ForeignKey fields give their stored to_field value (e.g. the reference's
+    reference_id), the same identifiers the canonical JSON uses.
+
+    Args:
+        instance: The model instance.
+        lookup_fields (list[str]): The fields ingest identifies records by.
+
+    Returns:
+        dict: Field name to stored value.
+    """
+    meta = instance._meta
+    return {
+        field: getattr(instance, meta.get_field(field).attname)
+        for field in lookup_fields
+    }
+
+
+def data_file_digests(source, names):
+    """
+    Return the SHA-256 of each data file's bytes.
+
+    Args:
+        source (DataSource): Where the files are read from.
+        names (list[str]): The files, as source.data_files() lists them.
+
+    Returns:
+        dict[str, str]: Each name to its hex digest, in the order given.
+    """
+    return {name: hashlib.sha256(source.read(name)).hexdigest() for name in names}
+
+
+def data_fingerprint(digests):
+    """
+    Return the fingerprint of data files: a hash of their names and bytes.
+
+    Unchanged data gives the same fingerprint wherever it is read from, so
+    re-ingesting it keeps the dataset version and whatever is cached on it.
+
+    Args:
+        digests (dict[str, str]): The files' data_file_digests().
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for name, file_digest in digests.items():
+        digest.update(f'{os.path.basename(name)}\0{file_digest}\0'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def latest_version():
+    """
+    Return the number of the latest dataset version.
+
+    Returns:
+        int: The latest version, or 0 if no ingest has recorded one.
+    """
+    return DatasetVersion.objects.aggregate(latest=Max('pk'))['latest'] or 0
+
+
+def latest_dataset_version():
+    """
+    Return the latest dataset version: what the database was built from.
+
+    One primary-key lookup, without its change log, so it is cheap enough
+    to call per request.
+
+    Returns:
+        DatasetVersion | None: The version, or None if no ingest has
+        recorded one.
+    """
+    return (
+        DatasetVersion.objects.defer('row_counts', 'file_digests')
+        .order_by('-pk')
+        .first()
+    )
+
+
+def dataset_cache_key():
+    """
+    Return a key for caching data derived from the database.
+
+    The key changes whenever an ingest records a new dataset version, so a
+    cache entry stored under it is stale once it no longer matches. Views,
+    exporters and notebooks can compare it instead of checking the tables.
+
+    Returns:
+        str: e.g. 'v12-3f2a...' (the version and its fingerprint, or
+        'partial' if that ingest had failures), or 'v0' before any ingest.
+    """
+    version = latest_dataset_version()
+    if version is None:
+        return 'v0'
+    return f'v{version.pk}-{version.fingerprint[:16] or "partial"}'
+
+
+def changes_since(since):
+    """
+    Collapse the change log after a version into each record's net change.
+
+    Only the last change to each record counts: a record updated twice is
+    changed once, and a record created then deleted is deleted.
+
+    Args:
+        since (int): The version the consumer already has.
+
+    Returns:
+        dict[str, dict[str, list[dict]]]: Per model name, the natural keys of
+        'changed' (created or updated) and 'deleted' records, each in the
+        order of their last change.
+    """
+    last = {}
+    changes = (
+        DatasetChange.objects.filter(dataset_version__gt=since)
+        .order_by('pk')
+        .values_list('model', 'natural_key', 'change_type')
+        .iterator()
+    )
+    for model, key, change_type in changes:
+        identity = (model, json.dumps(key, sort_keys=True))
+        # Re-insert so that dict order follows each record's last change.
+        last.pop(identity, None)
+        last[identity] = (key, change_type)
+
+    collapsed = defaultdict(lambda: {'changed': [], 'deleted': []})
+    for (model, _), (key, change_type) in last.items():
+        kind = 'deleted' if change_type == ChangeTypeChoices.DELETED else 'changed'
+        collapsed[model][kind].append(key)
+    return dict(collapsed)
+
+
+def filter_by_keys(queryset, keys):
+    """
+    Yield querysets that together select the records with the given keys.
+
+    Keys are matched in batches, so that a large delta never builds one
+    oversized SQL statement; single-field keys use an IN list.
+
+    Args:
+        queryset (QuerySet): The model's rows.
+        keys (list[dict]): Natural keys from natural_key().
+
+    Yields:
+        QuerySet: One batch of matching rows.
+    """
+    for start in range(0, len(keys), _KEY_BATCH_SIZE):
+        batch = keys[start : start + _KEY_BATCH_SIZE]
+        fields = {field for key in batch for field in key}
+        if len(fields) == 1:
+            (field,) = fields
+            yield queryset.filter(**{f'{field}__in': [key[field] for key in batch]})
+        else:
+            condition = Q(pk__in=[])
+            for key in batch:
+                condition |= Q(**key)
+            yield queryset.filter(condition)
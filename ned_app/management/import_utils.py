@@ -1,45 +1,341 @@
 import csv
+import hashlib
+import heapq
+import itertools
 import json
 import os
 import shutil
 import tempfile
+import time
+from contextlib import contextmanager
 
-from ned_app.serialization.file_and_path_utiles import build_json_data_file_path
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from ned_app.management.canonical_store import (
+    NATURAL_KEYS,
+    RACY_WINDOW_NS,
+    canonical_store,
+    file_stamp,
+)
+from ned_app.serialization.file_and_path_utiles import (
+    NDJSON_SUFFIX,
+    SHARD_FIELDS,
+    build_json_data_file_path,
+    build_shard_filename,
+    get_shard_dir,
+    is_ndjson_path,
+    list_data_file_paths,
+    resolve_data_file_path,
+)
+from ned_app.serialization.json_backend import dumps_canonical, dumps_line
 
 
 _INT_FIELDS = {'ds_rank', 'num_observations'}
 _FLOAT_FIELDS = {'edp_value', 'alt_edp_value', 'median', 'beta', 'probability'}
 _BOOL_FIELDS = {'pdf_saved'}
 
+# CSV rows converted, and items sorted in memory, at a time.
+CSV_CHUNK_SIZE = 5000
+
+# The advisory lock file serializing writes to resources/data/ (see data_lock).
+LOCK_FILENAME = '.import.lock'
+# Seconds between attempts to take a lock held by another process.
+_LOCK_POLL_INTERVAL = 0.05
+
+# Locks this process holds, by lock file path: [open file, depth].
+_held_locks = {}
+
+
+class DataConflictError(Exception):
+    """
+    A data file was changed by another import in a way that conflicts with
+    this one (see append_json_files). Nothing was written.
+    """
+
+
+def _data_paths(filename):
+    """
+    Return the files holding a canonical data file's records.
+
+    Args:
+        filename (str): JSON filename within resources/data/.
+
+    Returns:
+        list[str]: The file itself, if it exists, then its shards (e.g.
+        experiment/*.json), in reading order.
+    """
+    return list_data_file_paths(build_json_data_file_path(filename))
+
 
 def load_json(filename):
     """
     Load the contents of a canonical JSON data file.
 
+    The records of a sharded file are those of the single file, if any,
+    followed by those of each shard in name order. Files are parsed through
+    the shared CanonicalStore, so each is only parsed again once it has
+    changed.
+
     Args:
         filename (str): JSON filename within resources/data/.
 
     Returns:
-        list[dict]: Parsed records, or an empty list if the file does not exist.
+        list[dict]: Parsed records (shared with other callers; do not modify
+        them), or an empty list if the file does not exist.
     """
-    filepath = build_json_data_file_path(filename)
-    if not os.path.exists(filepath):
-        return []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return [
+        record
+        for path in _data_paths(filename)
+        for record in canonical_store.records(path)
+    ]
+
+
+def _merged_view(filename, view):
+    """Combine a store view of every file holding a data file's records."""
+    key = NATURAL_KEYS[filename]
+    paths = _data_paths(filename)
+    if len(paths) == 1:
+        return view(paths[0], key)
+    merged = {}
+    for path in paths:
+        for natural_key, value in view(path, key).items():
+            merged.setdefault(natural_key, value)
+    return merged
+
+
+def load_index(filename):
+    """
+    Load a canonical JSON data file's records by natural key.
 
+    Args:
+        filename (str): JSON filename within resources/data/, one of
+            canonical_store.NATURAL_KEYS.
+
+    Returns:
+        dict[tuple, dict]: The records (shared; do not modify) by natural
+        key, e.g. ('Smith-2020', 'fra001') for a fragility model.
+    """
+    return _merged_view(filename, canonical_store.index)
 
-def _dump_json(filepath, data):
+
+def _dump_json(filepath, data, trailing_newline=True):
     """
     Serialize records to a single JSON file in canonical format.
 
+    A '.ndjson' file gets one sorted-key record per line instead of an
+    indented array. The file is flushed and fsynced before returning, so
+    once it is renamed into place its contents are on disk.
+
     Args:
         filepath (str): Absolute path to write.
         data (list[dict]): Records to serialize.
+        trailing_newline (bool): End the file with a newline (export_data
+            files have none). NDJSON lines always end with one.
     """
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, sort_keys=True, ensure_ascii=True)
-        f.write('\n')
+        if is_ndjson_path(filepath):
+            f.writelines(dumps_line(record) for record in data)
+        else:
+            f.write(dumps_canonical(data, trailing_newline))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _sibling_path(path, tag):
+    """
+    Return a hidden scratch path next to a file, ending with its name.
+
+    Keeping the scratch file in the same directory makes os.replace an
+    atomic rename on the same filesystem.
+
+    Args:
+        path (str): The target file.
+        tag (str): What the scratch file is for, e.g. 'tmp' or 'bak'.
+
+    Returns:
+        str: e.g. '<dir>/.tmp-1234-experiment.json'.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{tag}-{os.getpid()}-{name}')
+
+
+def _fsync_directory(directory):
+    """Persist renames in a directory, where the platform supports it."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _try_lock(f):
+    """Take an exclusive lock on an open file without waiting."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+@contextmanager
+def data_lock(timeout=None):
+    """
+    Hold the advisory lock on resources/data/.
+
+    Every write in this module takes the lock for its read-modify-write of
+    the canonical files, so concurrent imports (e.g. parallel CI jobs) write
+    one at a time instead of overwriting each other. A script that must keep
+    the files unchanged between reading and writing them can hold the lock
+    for the whole job. The lock is reentrant within a process, and is
+    released by the operating system if the process dies.
+
+    Args:
+        timeout (float | None): Seconds to wait for another process to
+            release the lock (default: wait as long as it takes).
+
+    Raises:
+        TimeoutError: If the lock was not free within the timeout.
+    """
+    path = os.path.abspath(build_json_data_file_path(LOCK_FILENAME))
+    held = _held_locks.get(path)
+    if held is not None:
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, 'a+b')
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not _try_lock(f):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f'Another import is still writing the data files ({path}).'
+                )
+            time.sleep(_LOCK_POLL_INTERVAL)
+        _held_locks[path] = [f, 1]
+        try:
+            yield
+        finally:
+            del _held_locks[path]
+    finally:
+        # Closing the file releases the lock.
+        f.close()
+
+
+def _sha1_file(path):
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def snapshot_data_files(filenames):
+    """
+    Fingerprint the files holding canonical data files' records.
+
+    Taken before an import reads the data files and passed to
+    append_json_files, it shows which of them another import has changed
+    in the meantime. Each file is fingerprinted by its (mtime_ns, size,
+    inode) stamp, as in the CanonicalStore; only a file modified within
+    RACY_WINDOW_NS, whose stamp a quick later write could share, is read
+    and hashed too.
+
+    Args:
+        filenames (Iterable[str]): JSON filenames within resources/data/.
+
+    Returns:
+        dict[str, list[tuple]]: Each filename's files (the .json/.ndjson file
+        and shards) as (path, stamp, SHA-1 digest or None) triples.
+    """
+    racy_since = time.time_ns() - RACY_WINDOW_NS
+    snapshot = {}
+    for filename in filenames:
+        files = []
+        for path in _data_paths(filename):
+            stamp = file_stamp(path)
+            racy = stamp is not None and stamp[0] >= racy_since
+            files.append((path, stamp, _sha1_file(path) if racy else None))
+        snapshot[filename] = files
+    return snapshot
+
+
+def _changed_since(filename, files):
+    """
+    Tell whether a data file's files differ from a snapshot of them.
+
+    Args:
+        filename (str): JSON filename within resources/data/.
+        files (list[tuple]): The filename's entry in snapshot_data_files().
+
+    Returns:
+        bool: True if a file was added, removed or changed.
+    """
+    paths = _data_paths(filename)
+    if paths != [path for path, _, _ in files]:
+        return True
+    return any(
+        file_stamp(path) != stamp
+        or (digest is not None and _sha1_file(path) != digest)
+        for path, stamp, digest in files
+    )
+
+
+def _check_new_keys(filename, records):
+    """
+    Pass new records through, unless their key is already in a data file.
+
+    Args:
+        filename (str): JSON filename within resources/data/.
+        records (Iterable[dict]): The new records.
+
+    Yields:
+        dict: Each record.
+
+    Raises:
+        DataConflictError: If a record's natural key is already in the file.
+    """
+    key = NATURAL_KEYS[filename]
+    existing = load_index(filename)
+    for record in records:
+        try:
+            natural_key = key(record)
+        except (KeyError, IndexError, TypeError):
+            natural_key = None
+        if natural_key is not None and natural_key in existing:
+            raise DataConflictError(
+                f'{filename} was changed by another import while this one ran, '
+                f'and now has a record with the key {" | ".join(natural_key)}. '
+                'Nothing was written; re-run the import.'
+            )
+        yield record
 
 
 def write_json(filename, data):
@@ -53,42 +349,572 @@ def write_json(filename, data):
     write_json_files({filename: data})
 
 
-def write_json_files(file_data_map):
+def write_json_files(file_data_map, trailing_newlines=None):
     """
     Write several canonical JSON files as an all-or-nothing batch.
 
-    Each target file that already exists is backed up first. If any write —
-    or an interruption such as Ctrl+C — fails partway through, every target
-    is rolled back to its original state (existing files restored, newly
-    created files removed) before the error propagates. This prevents a crash
-    mid-import from leaving the canonical files in a mutually inconsistent
-    state (e.g. fragility models written but their curves missing). Backups
-    are discarded once all writes succeed.
+    Every file is first written and fsynced to a temp file beside its target;
+    the targets are only touched once all of them have been written, and each
+    is then published with an atomic os.replace, so a reader never sees a
+    truncated or half-written file. If anything fails, or is interrupted
+    (e.g. Ctrl+C), before publishing, the temp files are discarded and the
+    targets are untouched. While publishing, each existing target is kept
+    as a hard link (no copy), so a failure partway through the renames puts
+    every target back to its original state, removing newly created files.
+    This prevents a crash mid-import from leaving the canonical files in a
+    mutually inconsistent state (e.g. fragility models written but their
+    curves missing). The files are written under data_lock().
 
     Args:
         file_data_map (dict[str, list]): Maps each JSON filename (within
             resources/data/) to the full record list to write.
+        trailing_newlines (dict[str, bool] | None): Files that should not
+            end with a newline map to False (default: every file does).
+    """
+    with data_lock():
+        _write_json_files(file_data_map, trailing_newlines)
+
+
+def _write_json_files(file_data_map, trailing_newlines):
+    _publish(_write_temp_files(file_data_map, trailing_newlines))
+
+
+def _write_temp_files(file_data_map, trailing_newlines):
     """
-    paths = {name: build_json_data_file_path(name) for name in file_data_map}
+    Write records to temp files beside their data files, for _publish.
+
+    Args:
+        file_data_map (dict[str, list]): Maps each JSON filename to the full
+            record list to write.
+        trailing_newlines (dict[str, bool] | None): Files that should not
+            end with a newline map to False.
 
-    with tempfile.TemporaryDirectory() as backup_dir:
-        backups = {}
-        for name, path in paths.items():
+    Returns:
+        dict[str, str]: Each data file's path to its written temp file. On
+        failure the temp files are removed.
+    """
+    trailing_newlines = trailing_newlines or {}
+    temps = {}
+    try:
+        for name, data in file_data_map.items():
+            path = resolve_data_file_path(build_json_data_file_path(name))
+            # A new shard may need its directory.
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temps[path] = _sibling_path(path, 'tmp')
+            if trailing_newlines.get(name, True):
+                _dump_json(temps[path], data)
+            else:
+                _dump_json(temps[path], data, trailing_newline=False)
+    except BaseException:
+        for temp in temps.values():
+            _remove_if_exists(temp)
+        raise
+    return temps
+
+
+def _publish(temps):
+    """
+    Move written temp files onto their data files as one batch.
+
+    Each existing data file is kept as a hard link (no copy) until every
+    rename is done, so a failure partway through puts every file back to
+    its original state, removing newly created files.
+
+    Args:
+        temps (dict[str, str]): Each data file's path to its temp file.
+    """
+    backups, published = {}, []
+    try:
+        for path, temp in temps.items():
+            canonical_store.invalidate(path)
             if os.path.exists(path):
-                backup_path = os.path.join(backup_dir, name)
-                shutil.copy2(path, backup_path)
-                backups[name] = backup_path
+                backups[path] = _sibling_path(path, 'bak')
+                _remove_if_exists(backups[path])
+                try:
+                    os.link(path, backups[path])
+                except OSError:
+                    # No hard links here (e.g. some network drives): copy.
+                    shutil.copy2(path, backups[path])
+            os.replace(temp, path)
+            published.append(path)
+    except BaseException:
+        for path in published:
+            if path in backups:
+                os.replace(backups.pop(path), path)
+            else:
+                _remove_if_exists(path)
+        for temp in temps.values():
+            _remove_if_exists(temp)
+        raise
+    finally:
+        for backup in backups.values():
+            _remove_if_exists(backup)
+
+    for directory in {os.path.dirname(path) for path in temps}:
+        _fsync_directory(directory)
+
+
+def convert_data_file(path, target):
+    """
+    Rewrite a canonical data file in the other storage format.
+
+    The records are written to target ('.json' for an indented array, as
+    export_data writes it, or '.ndjson' for one record per line) atomically,
+    and only then is the original removed, so the records are always in at
+    least one of the two files.
+
+    Args:
+        path (str): The existing file.
+        target (str): The file to write.
 
+    Returns:
+        int: The number of records converted.
+
+    Raises:
+        json.JSONDecodeError: If the existing file is not valid JSON.
+    """
+    with data_lock():
+        records = canonical_store.records(path)
+        temp = _sibling_path(target, 'tmp')
         try:
-            for name, data in file_data_map.items():
-                _dump_json(paths[name], data)
+            _dump_json(temp, records, trailing_newline=False)
+            canonical_store.invalidate(target)
+            os.replace(temp, target)
         except BaseException:
-            for name, path in paths.items():
-                if name in backups:
-                    shutil.copy2(backups[name], path)
-                elif os.path.exists(path):
-                    os.remove(path)
+            _remove_if_exists(temp)
             raise
+        canonical_store.invalidate(path)
+        os.remove(path)
+        _fsync_directory(os.path.dirname(target))
+    return len(records)
+
+
+# The last record and closing bracket of a canonical (indent=4) JSON array.
+_CANONICAL_TAIL = b'\n    }\n]'
+_CANONICAL_HEAD = b'[\n    {'
+# Bytes read from the end of a file to find its closing bracket.
+_TAIL_READ_SIZE = 64
+
+
+def _find_append_offset(filepath):
+    """
+    Locate where new records can be spliced into a canonical JSON file.
+
+    Only a file in the exact canonical layout qualifies: a non-empty array of
+    objects dumped with indent=4. Anything else (a compact file, an empty
+    array) must be rewritten in full instead.
+
+    Args:
+        filepath (str): Absolute path of the JSON file.
+
+    Returns:
+        tuple[int, bytes] | None: The offset of the closing '\n]' and the
+        original bytes from there to the end of the file (the bracket plus
+        any trailing newline), or None if the file cannot be appended to.
+    """
+    if not os.path.exists(filepath):
+        return None
+    if is_ndjson_path(filepath):
+        # Lines are appended at the end; only a missing final newline needs
+        # restoring on rollback.
+        size = os.path.getsize(filepath)
+        return size, b''
+    with open(filepath, 'rb') as f:
+        if f.read(len(_CANONICAL_HEAD)) != _CANONICAL_HEAD:
+            return None
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - _TAIL_READ_SIZE))
+        tail = f.read()
+    stripped = tail.rstrip()
+    if not stripped.endswith(_CANONICAL_TAIL):
+        return None
+    closing = len(stripped) - 2
+    return size - len(tail) + closing, tail[closing:]
+
+
+def _append_ndjson_lines(f, offset, records):
+    """
+    Write records as lines at the end of an NDJSON file.
+
+    Args:
+        f: The file, opened 'r+b'.
+        offset (int): The file's size, where the lines go.
+        records (Iterable[dict]): The records to write.
+    """
+    if offset:
+        f.seek(offset - 1)
+        if f.read(1) != b'\n':
+            # An unterminated last line (e.g. from an editor) is kept whole.
+            f.write(b'\n')
+    for record in records:
+        f.write(dumps_line(record).encode('ascii'))
+
+
+def _splice_in_place(path, offset, tail, records):
+    """
+    Splice new records into a data file, in place.
+
+    Only the bytes from offset on are written: the new records, then the
+    original tail. Nothing before offset is read or copied, so the cost is
+    proportional to the records. Called under data_lock(); _unsplice()
+    undoes it.
+
+    Args:
+        path (str): The data file.
+        offset (int): Where the records go, from _find_append_offset.
+        tail (bytes): The original bytes from offset to the end.
+        records (Iterable[dict]): The records to splice in.
+    """
+    canonical_store.invalidate(path)
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        if is_ndjson_path(path):
+            _append_ndjson_lines(f, offset, records)
+        else:
+            for record in records:
+                body = dumps_canonical([record])
+                # body is '[\n' + the record + '\n]'; keep the record.
+                f.write(b',\n' + body[2:-2].encode('ascii'))
+        f.write(tail)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _unsplice(path, offset, tail):
+    """
+    Roll back a splice: truncate the file to its offset and restore its tail.
+
+    Args:
+        path (str): The data file.
+        offset (int): The offset the records were spliced in at.
+        tail (bytes): The original bytes from offset to the end.
+    """
+    canonical_store.invalidate(path)
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(tail)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_json_files(file_records_map, replacements=None, expected=None):
+    """
+    Append new records to several canonical JSON files as an all-or-nothing batch.
+
+    Instead of re-serializing whole files, each file's tail is verified and
+    only the new records are serialized, in the identical canonical format,
+    and spliced in before the closing bracket. The result is byte-for-byte
+    what rewriting the file with the extra records would produce, but the
+    cost is proportional to the records appended: only the bytes from the
+    splice point on are written, in place. Files that are missing, empty or
+    not in the canonical layout are rewritten in full.
+
+    If any write fails, or is interrupted, every file is rolled back: spliced
+    files are truncated back to their original offset and get their tail
+    back, and rewritten files are restored by write_json_files. A reader
+    that does not take data_lock() may see a spliced file mid-write; its
+    stamp changes, so the CanonicalStore parses it again afterwards.
+
+    Records are serialized one at a time as they are written, so they may
+    come from any iterable, e.g. a RecordSpool, without being held in memory.
+
+    Existing records can be replaced in the same batch; a file with
+    replacements is rewritten in full, keeping its trailing newline (or lack
+    of one).
+
+    For a sharded file (see SHARD_FIELDS), only the shards holding new or
+    replaced records are written, and new shards are created as needed. A
+    file stored as NDJSON is appended to line by line, with no need to look
+    at its existing contents.
+
+    The files are written under data_lock(), so concurrent imports do not
+    overwrite each other's records. An import that read the files without
+    holding the lock passes the snapshot it took beforehand as expected: a
+    file another import has changed since then still takes the new records,
+    spliced onto its current contents, unless one of their natural keys is
+    now in it, but cannot take replacements, whose positions refer to the
+    contents that were read.
+
+    Args:
+        file_records_map (dict[str, Iterable[dict]]): Maps each JSON filename
+            (within resources/data/) to the new records to append.
+        replacements (dict[str, dict[int, dict]] | None): Maps JSON filenames
+            to {position in load_json(filename): replacement record}.
+        expected (dict[str, list] | None): snapshot_data_files() of the
+            data files, taken before they were read.
+
+    Raises:
+        DataConflictError: If a file in expected has changed in a way that
+            conflicts with this batch. Nothing is written.
+    """
+    with data_lock():
+        _append_json_files(file_records_map, replacements, expected)
+
+
+def _append_json_files(file_records_map, replacements, expected):
+    replacements = {name: r for name, r in (replacements or {}).items() if r}
+    if expected:
+        file_records_map = dict(file_records_map)
+        for name, files in expected.items():
+            if not _changed_since(name, files):
+                continue
+            if name in replacements:
+                raise DataConflictError(
+                    f'{name} was changed by another import while this one ran, '
+                    'so the records to update may have moved. Nothing was '
+                    'written; re-run the import.'
+                )
+            if name in file_records_map and name in NATURAL_KEYS:
+                file_records_map[name] = _check_new_keys(
+                    name, file_records_map[name]
+                )
+    file_records_map, replacements = _route_to_files(file_records_map, replacements)
+    splices, rewrites, trailing_newlines = {}, {}, {}
+    for name in dict.fromkeys([*file_records_map, *replacements]):
+        records = iter(file_records_map.get(name, ()))
+        first = next(records, None)
+        if first is None and name not in replacements:
+            continue
+        records = itertools.chain([first] if first is not None else [], records)
+        path = resolve_data_file_path(build_json_data_file_path(name))
+        located = _find_append_offset(path)
+        if located is None or name in replacements:
+            # This file's own records: for a sharded file, not its shards.
+            existing = list(canonical_store.records(path))
+            for position, record in replacements.get(name, {}).items():
+                existing[position] = record
+            rewrites[name] = existing + list(records)
+            if located is not None:
+                trailing_newlines[name] = located[1].endswith(b'\n')
+        else:
+            splices[path] = (located, records)
+
+    done = []
+    try:
+        for path, ((offset, original_tail), records) in splices.items():
+            done.append((path, offset, original_tail))
+            _splice_in_place(path, offset, original_tail, records)
+        if rewrites:
+            write_json_files(rewrites, trailing_newlines)
+    except BaseException:
+        for path, offset, original_tail in done:
+            _unsplice(path, offset, original_tail)
+        raise
+
+
+def load_positions(filename):
+    """
+    Map a canonical JSON data file's natural keys to record positions.
+
+    Args:
+        filename (str): JSON filename within resources/data/, one of
+            canonical_store.NATURAL_KEYS.
+
+    Returns:
+        dict[tuple, int]: Each natural key's position in load_json(filename)
+        (shared; do not modify).
+    """
+    offsets = {}
+    offset = 0
+    for path in _data_paths(filename):
+        offsets[path] = offset
+        offset += len(canonical_store.records(path))
+
+    def positions(path, key):
+        view = canonical_store.positions(path, key)
+        if not offsets.get(path):
+            return view
+        return {k: offsets[path] + position for k, position in view.items()}
+
+    return _merged_view(filename, positions)
+
+
+def _route_to_files(file_records_map, replacements):
+    """
+    Redirect writes to a data file to the files that hold its records.
+
+    A data file may be stored as several files: its .json and/or .ndjson
+    variant, and shards (see SHARD_FIELDS). New records go to the shard for
+    their SHARD_FIELDS value (or the single file, if the value cannot name
+    one), and replaced records stay in the file they were read from. Files
+    without a shard directory take new records as they are, so an unsharded
+    dataset keeps its single files.
+
+    Args:
+        file_records_map (dict[str, Iterable[dict]]): As for
+            append_json_files.
+        replacements (dict[str, dict[int, dict]]): As for append_json_files.
+
+    Returns:
+        tuple[dict, dict]: The same two maps, by the file to write.
+    """
+    routed_records, routed_replacements = {}, {}
+    for name in dict.fromkeys([*file_records_map, *replacements]):
+        records = file_records_map.get(name, ())
+        changed = replacements.get(name, {})
+        path = build_json_data_file_path(name)
+        shard_dir = get_shard_dir(path)
+        data_paths = _data_paths(name)
+
+        if name in SHARD_FIELDS and os.path.isdir(shard_dir):
+            # New shards take the format the data is already stored in.
+            suffix = (
+                NDJSON_SUFFIX if any(map(is_ndjson_path, data_paths)) else '.json'
+            )
+            field = SHARD_FIELDS[name]
+            for record in records:
+                target = (
+                    build_shard_filename(name, record.get(field), suffix) or name
+                )
+                routed_records.setdefault(target, []).append(record)
+        else:
+            routed_records[name] = records
+
+        if len(data_paths) <= 1:
+            if changed:
+                routed_replacements[name] = changed
+            continue
+        # Positions count through the files in load_json's reading order.
+        offset = 0
+        for file_path in data_paths:
+            count = len(canonical_store.records(file_path))
+            if os.path.dirname(file_path) == shard_dir:
+                target = os.path.join(
+                    get_shard_dir(name), os.path.basename(file_path)
+                )
+            elif file_path == path:
+                target = name
+            else:
+                # The single file's NDJSON variant.
+                target = get_shard_dir(name) + NDJSON_SUFFIX
+            for position, record in changed.items():
+                if offset <= position < offset + count:
+                    routed_replacements.setdefault(target, {})[position - offset] = (
+                        record
+                    )
+            offset += count
+    return routed_records, routed_replacements
+
+
+# How import commands treat a row whose natural key already exists: skip it,
+# replace the existing record, or overwrite only the row's non-empty columns.
+IMPORT_MODES = ('append', 'upsert', 'merge')
+
+
+def update_record(existing, changes, mode):
+    """
+    Apply an imported row to the existing record with the same key.
+
+    Args:
+        existing (dict): The canonical record.
+        changes (dict): The converted row; for 'merge', only its non-empty
+            columns.
+        mode (str): 'upsert' replaces the record; 'merge' overwrites the
+            given fields, and the given keys of nested objects (csl_data).
+
+    Returns:
+        dict: The updated record (a new dict; existing is not modified).
+    """
+    if mode == 'upsert':
+        return dict(changes)
+    merged = dict(existing)
+    for field, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(field), dict):
+            value = {**merged[field], **value}
+        merged[field] = value
+    return merged
+
+
+def append_json(filename, records):
+    """
+    Append new records to a canonical JSON data file, crash-safely.
+
+    Args:
+        filename (str): JSON filename within resources/data/.
+        records (Iterable[dict]): Records to append.
+    """
+    append_json_files({filename: records})
+
+
+class RecordSpool:
+    """
+    A sequence of JSON values buffered in a temporary file, not in memory.
+
+    Values are written as one JSON document per line and read back in order,
+    so an import can collect any number of records in a fixed memory budget.
+    Tuples come back as lists. Use as a context manager, or call close().
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+
+    def append(self, value):
+        """
+        Add a value to the end of the spool.
+
+        Args:
+            value: A JSON-serializable value.
+        """
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(json.dumps(value) + '\n')
+        self._count += 1
+
+    def close(self):
+        """Discard the spool and its temporary file."""
+        self._file.close()
+
+
+def external_sort(items, key, chunk_size=None):
+    """
+    Sort a stream of JSON values that may not fit in memory.
+
+    The stream is cut into chunks, each chunk is sorted and spooled to a
+    temporary file, and the sorted runs are merged lazily. The sort is
+    stable, and at most one chunk is held in memory at a time.
+
+    Args:
+        items (Iterable): JSON-serializable values; tuples come back as lists.
+        key (Callable): The sort key, which must give the same result for a
+            value and its JSON round trip.
+        chunk_size (int | None): Values sorted in memory at a time
+            (default: CSV_CHUNK_SIZE).
+
+    Yields:
+        The values in sorted order.
+    """
+    chunk_size = chunk_size or CSV_CHUNK_SIZE
+    runs = []
+    try:
+        items = iter(items)
+        while chunk := list(itertools.islice(items, chunk_size)):
+            chunk.sort(key=key)
+            run = RecordSpool()
+            runs.append(run)
+            for item in chunk:
+                run.append(item)
+        # heapq.merge takes equal keys from earlier runs first: stable.
+        yield from heapq.merge(*runs, key=key)
+    finally:
+        for run in runs:
+            run.close()
 
 
 def build_pk_set(records, pk_fields):
@@ -111,6 +937,48 @@ def build_pk_set(records, pk_fields):
     return pk_set
 
 
+def read_csv_header(filepath):
+    """
+    Read the header column names of a CSV file.
+
+    Args:
+        filepath (str): Path to the CSV file.
+
+    Returns:
+        list[str]: The header column names.
+
+    Raises:
+        FileNotFoundError: If the CSV file does not exist.
+    """
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+        return csv.DictReader(f).fieldnames or []
+
+
+def read_csv_chunks(filepath, chunk_size=None):
+    """
+    Read the rows of a CSV file as a stream of chunks.
+
+    Only one chunk is held in memory at a time, so a CSV of any size can be
+    processed in a fixed memory budget.
+
+    Args:
+        filepath (str): Path to the CSV file.
+        chunk_size (int | None): Rows per chunk (default: CSV_CHUNK_SIZE).
+
+    Yields:
+        list[tuple[int, dict]]: Up to chunk_size rows, each with its row
+        number as a spreadsheet shows it (the header is row 1).
+
+    Raises:
+        FileNotFoundError: If the CSV file does not exist.
+    """
+    chunk_size = chunk_size or CSV_CHUNK_SIZE
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = enumerate(csv.DictReader(f), start=2)
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            yield chunk
+
+
 def read_csv(filepath):
     """
     Read all rows from a CSV file.
@@ -0,0 +1,221 @@
+import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.validators import (
+    BaseUniqueForValidator,
+    UniqueTogetherValidator,
+    UniqueValidator,
+)
+
+from ned_app.management.import_utils import fragility_model_id, load_index
+from ned_app.models import Component, Experiment, FragilityModel, Reference
+
+
+def _reference_ids():
+    # Malformed records have no derived id; ingest reports them, not this.
+    return {key for (key,) in load_index('reference.json')}
+
+
+def _component_ids():
+    return {key for (key,) in load_index('component.json')}
+
+
+def _fragility_model_ids():
+    return {
+        fragility_model_id(reference, model_id)
+        for reference, model_id in load_index('fragility_model.json')
+    }
+
+
+def _experiment_ids():
+    return {key for (key,) in load_index('experiment.json')}
+
+
+# How the natural keys of each model are read from the canonical JSON.
+_KEY_LOADERS = {
+    Reference: _reference_ids,
+    Component: _component_ids,
+    FragilityModel: _fragility_model_ids,
+    Experiment: _experiment_ids,
+}
+
+
+class CanonicalKeyIndex:
+    """
+    Hash indexes of the natural keys present in the canonical JSON files.
+
+    Each model's keys are read from the shared CanonicalStore the first time
+    they are needed and then kept, so foreign keys can be checked without a
+    database. Records accepted
+    during an import are added, so later rows may refer to earlier ones.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def keys(self, model):
+        """
+        Return the set of natural keys of a model.
+
+        Args:
+            model: Reference, Component, FragilityModel or Experiment.
+
+        Returns:
+            set[str]: The model's natural keys.
+        """
+        if model not in self._keys:
+            self._keys[model] = _KEY_LOADERS[model]()
+        return self._keys[model]
+
+    def add(self, model, key):
+        """
+        Record a key accepted during this import.
+
+        Args:
+            model: The key's model.
+            key (str): The natural key.
+        """
+        self.keys(model).add(key)
+
+
+def _messages(exc):
+    """
+    Flatten a DRF ValidationError into its messages.
+
+    Args:
+        exc (serializers.ValidationError): The error.
+
+    Returns:
+        list[str]: The messages.
+    """
+    detail = exc.detail
+    if isinstance(detail, dict):
+        return [str(m) for messages in detail.values() for m in messages]
+    if isinstance(detail, list):
+        return [str(m) for m in detail]
+    return [str(detail)]
+
+
+class RecordValidator:
+    """
+    Validate canonical JSON records with a serializer, without a database.
+
+    Every writable field runs the serializer's own field validation (types,
+    choices, lengths, validators and validate_<field> methods); a record with
+    valid fields then runs the serializer-level validators and validate(), as
+    is_valid() would. Foreign keys are checked against a CanonicalKeyIndex
+    instead of a queryset and reach validate() as unsaved instances holding
+    the key, and uniqueness is left to the importers' duplicate detection,
+    since both would otherwise query the database.
+    """
+
+    def __init__(self, serializer_class, index):
+        """
+        Prepare the serializer's fields once for many records.
+
+        Args:
+            serializer_class: The DRF serializer used by ingest for the model.
+            index (CanonicalKeyIndex): Known natural keys.
+        """
+        self._serializer = serializer_class()
+        self._index = index
+        self._fields = {}
+        for name, field in self._serializer.fields.items():
+            if field.read_only:
+                continue
+            if not isinstance(field, serializers.RelatedField):
+                field.validators = [
+                    v for v in field.validators if not isinstance(v, UniqueValidator)
+                ]
+            self._fields[name] = field
+        self._serializer.validators = [
+            v
+            for v in self._serializer.validators
+            if not isinstance(v, (UniqueTogetherValidator, BaseUniqueForValidator))
+        ]
+
+    def validate(self, record):
+        """
+        Validate one record.
+
+        Args:
+            record (dict): The record to be appended.
+
+        Returns:
+            list[str]: 'field: message' lines ('non_field_errors: message'
+            for object-level errors); empty if the record is valid.
+        """
+        errors = []
+        attrs = {}
+        for name, field in self._fields.items():
+            value = record.get(name, empty)
+            try:
+                if isinstance(field, serializers.RelatedField):
+                    self._validate_related(field, value)
+                    if value is not empty:
+                        attrs[name] = value and self._stand_in(field, value)
+                    continue
+                value = field.run_validation(copy.deepcopy(value))
+                field_validator = getattr(self._serializer, f'validate_{name}', None)
+                if field_validator is not None:
+                    value = field_validator(value)
+            except SkipField:
+                continue
+            except serializers.ValidationError as exc:
+                errors.extend(f'{name}: {message}' for message in _messages(exc))
+                continue
+            attrs[name] = value
+        if errors:
+            return errors
+
+        try:
+            self._serializer.run_validators(attrs)
+            self._serializer.validate(attrs)
+        except (serializers.ValidationError, DjangoValidationError) as exc:
+            detail = serializers.as_serializer_error(exc)
+            return [
+                f'{name}: {message}'
+                for name, messages in detail.items()
+                for message in messages
+            ]
+        return []
+
+    def _stand_in(self, field, value):
+        """
+        Return an unsaved instance standing for a foreign key's target.
+
+        Args:
+            field (serializers.RelatedField): The relation's serializer field.
+            value (str): The natural key given in the record.
+
+        Returns:
+            Model: The target model, with only its key field set.
+        """
+        return field.queryset.model(**{getattr(field, 'slug_field', 'pk'): value})
+
+    def _validate_related(self, field, value):
+        """
+        Check a foreign key against the index.
+
+        Args:
+            field (serializers.RelatedField): The relation's serializer field.
+            value: The natural key given in the record, or empty.
+
+        Raises:
+            serializers.ValidationError: If the key is missing or unknown.
+        """
+        if value is empty:
+            if field.required:
+                raise serializers.ValidationError('This field is required.')
+            return
+        if value is None and field.allow_null:
+            return
+        if value in (None, ''):
+            raise serializers.ValidationError('This field may not be blank.')
+        model = field.queryset.model
+        if not isinstance(value, str) or value not in self._index.keys(model):
+            raise serializers.ValidationError(
+                f"unknown {model.__name__} '{value}' (not in the canonical JSON)."
+            )
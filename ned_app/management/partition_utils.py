@@ -0,0 +1,212 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def parts_dir(output_path):
+    """
+    Return the directory that holds the part files for an output path.
+
+    Args:
+        output_path (str): The single-file output path, e.g. 'out/exp.csv'.
+
+    Returns:
+        str: e.g. 'out/exp.csv.parts'.
+    """
+    return f'{output_path}.parts'
+
+
+def part_filename(index, output_path):
+    """
+    Return the part file name for a partition, keeping the output's suffixes.
+
+    Args:
+        index (int): The partition number.
+        output_path (str): The single-file output path, e.g. 'out/exp.csv.gz'.
+
+    Returns:
+        str: e.g. 'part-00003.csv.gz'.
+    """
+    name = os.path.basename(output_path)
+    suffix = name[name.index('.') :] if '.' in name else ''
+    return f'part-{index:05d}{suffix}'
+
+
+def partition_ranges(queryset, partitions):
+    """
+    Split a queryset into contiguous primary-key ranges of similar size.
+
+    Boundaries are read with one OFFSET query each, so no primary keys are
+    held in memory. Ranges are half-open, [low, high), with None for an open
+    end; a table with fewer rows than partitions gets fewer ranges.
+
+    Args:
+        queryset (QuerySet): The rows to split.
+        partitions (int): The desired number of ranges.
+
+    Returns:
+        list[tuple]: (low, high) primary-key bounds, in primary-key order.
+    """
+    total = queryset.count()
+    if not total:
+        return []
+    ordered = queryset.order_by('pk').values_list('pk', flat=True)
+    starts = []
+    for index in range(partitions):
+        offset = index * total // partitions
+        if offset < total:
+            start = ordered[offset]
+            if not starts or start != starts[-1]:
+                starts.append(start)
+    starts[0] = None
+    ends = starts[1:] + [None]
+    return list(zip(starts, ends))
+
+
+def filter_range(queryset, low, high):
+    """
+    Restrict a queryset to one primary-key range from partition_ranges.
+
+    Args:
+        queryset (QuerySet): The rows to restrict.
+        low: Inclusive lower bound, or None.
+        high: Exclusive upper bound, or None.
+
+    Returns:
+        QuerySet: The restricted rows, in primary-key order.
+    """
+    if low is not None:
+        queryset = queryset.filter(pk__gte=low)
+    if high is not None:
+        queryset = queryset.filter(pk__lt=high)
+    return queryset.order_by('pk')
+
+
+def _init_worker(database_name):
+    """
+    Set up Django in a freshly spawned export worker.
+
+    Args:
+        database_name: The parent's default database NAME, which is not the
+            settings file's when it was changed at run time (e.g. for tests).
+    """
+    settings.DATABASES['default']['NAME'] = database_name
+    django.setup()
+
+
+def run_partitions(task, specs):
+    """
+    Run task(spec) for every partition spec, in parallel worker processes.
+
+    Workers are spawned (not forked), set up Django themselves and open their
+    own connections to the database this process uses. An in-memory SQLite
+    database (e.g. the test database) is invisible to other processes, so in
+    that case the partitions run one after another in this process instead.
+
+    Args:
+        task (Callable[[dict], dict]): A module-level function, so that it can
+            be sent to a worker process.
+        specs (list[dict]): Picklable partition descriptions.
+
+    Returns:
+        list[dict]: The task results, in spec order.
+    """
+    in_memory = connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    if len(specs) <= 1 or in_memory:
+        return [task(spec) for spec in specs]
+
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=min(len(specs), os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(connection.settings_dict['NAME'],),
+    ) as pool:
+        return list(pool.map(task, specs))
+
+
+def sha256_file(path):
+    """
+    Return the SHA-256 hex digest of a file's bytes.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(directory, parts, **details):
+    """
+    Write the manifest describing a partitioned export.
+
+    Args:
+        directory (str): The parts directory.
+        parts (list[dict]): Per-part results with at least 'file', 'rows' and
+            'sha256'.
+        **details: Extra top-level fields (e.g. model, format).
+
+    Returns:
+        str: The manifest path.
+    """
+    manifest = {
+        **details,
+        'rows': sum(part['rows'] for part in parts),
+        'parts': parts,
+    }
+    path = os.path.join(directory, MANIFEST_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+        f.write('\n')
+    return path
+
+
+def concatenate_json_arrays(part_paths, output_path):
+    """
+    Concatenate canonical (indent=4) JSON array part files into one file.
+
+    json.dump(indent=4) writes a list as '[\\n' + the items joined by ',\\n' +
+    '\\n]', so splicing the parts' bodies gives exactly the bytes a single
+    dump of all the records would, without parsing anything.
+
+    Args:
+        part_paths (list[str]): Part files, in order.
+        output_path (str): The combined file to write.
+    """
+    with open(output_path, 'w', encoding='utf-8') as out:
+        wrote_any = False
+        for path in part_paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if text == '[]':
+                continue
+            out.write(',\n' if wrote_any else '[\n')
+            out.write(text[2:-2])
+            wrote_any = True
+        out.write('\n]' if wrote_any else '[]')
+
+
+def remove_parts(directory):
+    """
+    Delete a parts directory once its parts have been concatenated.
+
+    Args:
+        directory (str): The parts directory.
+    """
+    shutil.rmtree(directory)
@@ -0,0 +1,864 @@
+import contextlib
+import csv
+import gzip
+import itertools
+import json
+import math
+import os
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import (
+    Avg,
+    BooleanField,
+    CharField,
+    Count,
+    DateTimeField,
+    DecimalField,
+    DurationField,
+    FloatField,
+    IntegerField,
+    JSONField,
+    Max,
+    Min,
+    Q,
+    StdDev,
+    Sum,
+    TextField,
+)
+from django.db.models.constants import LOOKUP_SEP
+
+from ned_app.serialization.json_backend import DecimalEncoder
+
+
+def resolve_column(model, path):
+    """
+    Resolve one export column, which may follow relations with '__'.
+
+    A plain field name resolves to its attname, i.e. the value stored on the
+    row: for a normal field that is the field value; for a ForeignKey it is
+    the to_field natural key (e.g. reference_id, component_id). A path such as
+    'fragility_model__reference__year' walks forward (single-valued)
+    relations and resolves to a values() lookup, which the ORM turns into
+    joins within the same SQL query. A path ending on a ForeignKey yields that
+    key's stored natural key, as for a plain field.
+
+    Reverse relations have no stored value: at the top level they export as
+    an empty column, and they cannot be followed since they are many-valued.
+
+    Args:
+        model: The Django model being exported.
+        path (str): The column name, e.g. 'material' or 'component__name'.
+
+    Returns:
+        tuple[str, str | None, bool]: (column name, values() lookup or None,
+        whether the value is JSON-encoded).
+
+    Raises:
+        FieldDoesNotExist: If a segment of the path is not a field.
+        FieldError: If the path follows a many-valued or non-relational field.
+    """
+    parts = path.split(LOOKUP_SEP)
+    if len(parts) == 1:
+        field = model._meta.get_field(path)
+        attname = getattr(field, 'attname', None)
+        return path, attname, isinstance(field, JSONField)
+
+    current = model
+    for part in parts[:-1]:
+        field = current._meta.get_field(part)
+        if not (field.is_relation and field.concrete and not field.many_to_many):
+            raise FieldError(
+                f"Cannot follow '{part}' in '{path}': only forward foreign "
+                'keys can be followed.'
+            )
+        current = field.related_model
+
+    field = current._meta.get_field(parts[-1])
+    if not field.concrete or field.many_to_many:
+        raise FieldError(
+            f"'{parts[-1]}' in '{path}' is a many-valued relation and cannot "
+            'be exported as a column.'
+        )
+    return path, path, isinstance(field, JSONField)
+
+
+def _column_field(model, path):
+    """
+    Return the model field holding a column's values.
+
+    A path ending on a ForeignKey holds the key's stored natural key, so the
+    field is the key's target field.
+
+    Args:
+        model: The Django model being exported.
+        path (str): A column name accepted by resolve_column.
+
+    Returns:
+        Field: The field whose values the column holds.
+    """
+    *relations, name = path.split(LOOKUP_SEP)
+    for part in relations:
+        model = model._meta.get_field(part).related_model
+    field = model._meta.get_field(name)
+    return field.target_field if field.is_relation else field
+
+
+def column_is_numeric(model, path):
+    """
+    Report whether an export column holds numbers.
+
+    Args:
+        model: The Django model being exported.
+        path (str): A column name accepted by resolve_column.
+
+    Returns:
+        bool: True for integer, float and decimal columns.
+    """
+    field = _column_field(model, path)
+    return isinstance(field, (IntegerField, FloatField, DecimalField))
+
+
+def column_types(model, columns):
+    """
+    Return the value type of each export column, for typed output formats.
+
+    Types come from the model fields, so they do not depend on which values
+    the first rows happen to hold. JSON columns are exported as JSON text,
+    and columns without a stored value are empty text.
+
+    Args:
+        model: The Django model being exported.
+        columns (list[tuple]): Column specs from resolve_columns.
+
+    Returns:
+        list[str | None]: Per column 'integer', 'float', 'boolean', 'text',
+        'datetime' or 'duration', or None for a type left to the values.
+    """
+    types = []
+    for name, lookup, is_json in columns:
+        if not lookup or is_json:
+            types.append('text')
+            continue
+        field = _column_field(model, name)
+        if isinstance(field, BooleanField):
+            types.append('boolean')
+        elif isinstance(field, IntegerField):
+            types.append('integer')
+        elif isinstance(field, (FloatField, DecimalField)):
+            types.append('float')
+        elif isinstance(field, (CharField, TextField)):
+            types.append('text')
+        elif isinstance(field, DateTimeField):
+            types.append('datetime')
+        elif isinstance(field, DurationField):
+            types.append('duration')
+        else:
+            types.append(None)
+    return types
+
+
+def resolve_columns(model, field_names):
+    """
+    Resolve every requested export column once, up front.
+
+    Args:
+        model: The Django model being exported.
+        field_names (list[str]): Column names, in output order.
+
+    Returns:
+        list[tuple[str, str | None, bool]]: Column specs from resolve_column.
+    """
+    return [resolve_column(model, name) for name in field_names]
+
+
+def column_lookups(columns):
+    """
+    Return the values_list() lookups needed to export the given columns.
+
+    Args:
+        columns (list[tuple]): Column specs from resolve_columns.
+
+    Returns:
+        list[str]: The lookups, in column order (empty columns skipped).
+    """
+    return [lookup for _, lookup, _ in columns if lookup]
+
+
+def encode_row(columns, values, encode_json=True):
+    """
+    Convert one values_list() tuple into an output row aligned with columns.
+
+    Args:
+        columns (list[tuple]): Column specs from resolve_columns.
+        values (tuple): Values for the columns that have a lookup, in order.
+        encode_json (bool): Emit JSON fields as JSON text (for flat formats
+            such as CSV) rather than as the decoded value.
+
+    Returns:
+        list: The cell values.
+    """
+    row = []
+    values = iter(values)
+    for _, lookup, is_json in columns:
+        if not lookup:
+            row.append('')
+            continue
+        value = next(values)
+        if encode_json and is_json and value is not None:
+            value = json.dumps(value)
+        row.append(value)
+    return row
+
+
+# Characters that end an unquoted filter value.
+_VALUE_TERMINATORS = ',|)'
+
+# A plain field path with an optional lookup, as in the original
+# comma-separated key=value filters.
+_LEGACY_KEY = re.compile(r'\w+')
+
+
+class _FilterParser:
+    """
+    Recursive-descent parser for query_to_csv --filter expressions.
+
+    Grammar (',' binds tighter than '|'):
+
+        expr      := and_expr ('|' and_expr)*
+        and_expr  := unary (',' unary)*
+        unary     := '!' unary | '(' expr ')' | condition
+        condition := key ('=' | '!=') value
+
+    A value runs to the next ',', '|' or ')' (so 'notes=ratio=0.5' keeps its
+    '='); wrap it in double quotes to include those characters, doubling any
+    quote inside it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        condition = self._or()
+        self._skip_whitespace()
+        if self.pos < len(self.text):
+            raise ValueError(
+                f"unexpected '{self.text[self.pos]}' at position {self.pos + 1}."
+            )
+        return condition
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _accept(self, char):
+        self._skip_whitespace()
+        if self.pos < len(self.text) and self.text[self.pos] == char:
+            self.pos += 1
+            return True
+        return False
+
+    def _or(self):
+        condition = self._and()
+        while self._accept('|'):
+            condition |= self._and()
+        return condition
+
+    def _and(self):
+        condition = self._unary()
+        while self._accept(','):
+            condition &= self._unary()
+        return condition
+
+    def _unary(self):
+        if self._accept('!'):
+            return ~self._unary()
+        if self._accept('('):
+            condition = self._or()
+            if not self._accept(')'):
+                raise ValueError("missing ')' to close a group.")
+            return condition
+        return self._condition()
+
+    def _condition(self):
+        self._skip_whitespace()
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in '=,|()':
+            self.pos += 1
+        key = self.text[start : self.pos].strip()
+        if not key or self.pos >= len(self.text) or self.text[self.pos] != '=':
+            raise ValueError(
+                f"'{self.text[start : self.pos].strip()}' is not a key=value "
+                'condition.'
+            )
+        self.pos += 1
+
+        negate = key.endswith('!')
+        if negate:
+            key = key[:-1].rstrip()
+        condition = Q(**{key: _filter_value(key, self._value())})
+        return ~condition if negate else condition
+
+    def _value(self):
+        self._skip_whitespace()
+        if self.pos < len(self.text) and self.text[self.pos] == '"':
+            return self._quoted_value()
+        start = self.pos
+        while (
+            self.pos < len(self.text)
+            and self.text[self.pos] not in _VALUE_TERMINATORS
+        ):
+            self.pos += 1
+        return self.text[start : self.pos].strip()
+
+    def _quoted_value(self):
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            self.pos += 1
+            if char != '"':
+                chars.append(char)
+            elif self.text.startswith('"', self.pos):
+                chars.append('"')
+                self.pos += 1
+            else:
+                return ''.join(chars)
+        raise ValueError('unterminated quoted value.')
+
+
+def _filter_value(key, value):
+    """
+    Convert a raw filter value to what the key's lookup expects.
+
+    '__in' and '__range' take ';'-separated lists, and '__isnull' takes
+    true/false. Every other value is passed through as a string for the
+    field to convert (and validate) when the query is built.
+
+    Args:
+        key (str): The filter key, e.g. 'edp_value__gte'.
+        value (str): The raw value text.
+
+    Returns:
+        str | list[str] | bool: The value to pass to QuerySet.filter().
+
+    Raises:
+        ValueError: If a list or boolean value is malformed.
+    """
+    lookup = key.rsplit(LOOKUP_SEP, 1)[-1]
+    if lookup == 'in':
+        return [item.strip() for item in value.split(';') if item.strip()]
+    if lookup == 'range':
+        bounds = [item.strip() for item in value.split(';')]
+        if len(bounds) != 2:
+            raise ValueError(f"'{key}' expects two ';'-separated bounds.")
+        return bounds
+    if lookup == 'isnull':
+        if value.lower() not in ('true', 'false'):
+            raise ValueError(f"'{key}' expects true or false.")
+        return value.lower() == 'true'
+    return value
+
+
+def _legacy_filter(text):
+    """
+    Read a filter in the original form: comma-separated key=value pairs.
+
+    Each value is taken literally up to the next ',', so it may contain
+    '|', '(', ')', '!' or '"'.
+
+    Args:
+        text (str): The filter text.
+
+    Returns:
+        Q | None: The AND of the conditions, or None if text is not a list
+        of plain key=value pairs.
+
+    Raises:
+        ValueError: If a list or boolean value is malformed.
+    """
+    condition = Q()
+    for pair in text.split(','):
+        key, equals, value = pair.partition('=')
+        key = key.strip()
+        if not equals or not _LEGACY_KEY.fullmatch(key):
+            return None
+        condition &= Q(**{key: _filter_value(key, value.strip())})
+    return condition
+
+
+def parse_filter(text):
+    """
+    Compile a --filter expression into a single Q object.
+
+    Conditions use Django lookups (e.g. 'edp_value__gte=0.01',
+    'material__icontains=steel', 'component__in=C.10.1.1.A;C.30.3.2.A').
+    ',' joins conditions with AND, '|' with OR, '!' negates a condition or a
+    parenthesized group, and 'key!=value' is shorthand for '!key=value'. The
+    whole expression becomes one WHERE clause, so rows are filtered in the
+    database.
+
+    Filters written before the expression syntax existed (plain
+    comma-separated key=value pairs) still work when their values contain
+    '|', '(' or ')': text that does not parse as an expression is read that
+    way, each value taken literally. Text that does parse is read as an
+    expression, so 'notes=a|b=c' is an OR; quote the value to match it.
+
+    Args:
+        text (str): The filter expression.
+
+    Returns:
+        Q: The compiled condition.
+
+    Raises:
+        ValueError: If the expression is malformed.
+    """
+    try:
+        return _FilterParser(text).parse()
+    except ValueError:
+        condition = _legacy_filter(text)
+        if condition is None:
+            raise
+        return condition
+
+
+# Rows fetched per round trip by the streaming quantile pass.
+_QUANTILE_CHUNK_SIZE = 5000
+
+# Aggregates computed natively in the GROUP BY query.
+_SQL_AGGREGATES = {
+    'count': Count,
+    'sum': Sum,
+    'min': Min,
+    'max': Max,
+    'avg': Avg,
+    'stddev': StdDev,
+}
+
+# Quantile aggregates, which SQLite cannot compute; 'pNN' is also accepted.
+_QUANTILE_AGGREGATES = {'median': 0.5}
+
+# Native aggregates that only make sense for numbers (min/max also order text).
+_NUMERIC_AGGREGATES = {'sum', 'avg', 'stddev'}
+
+# Native aggregates computed as floats whatever the column's type, so that
+# every output format gets the same numbers (see aggregate_type).
+_FLOAT_AGGREGATES = {'avg', 'stddev'}
+
+
+def _quantile_level(func):
+    """
+    Return the quantile level for a quantile aggregate name, else None.
+
+    Args:
+        func (str): The aggregate name, e.g. 'median' or 'p90'.
+
+    Returns:
+        float | None: The level in (0, 1), or None if func is not a quantile.
+    """
+    if func in _QUANTILE_AGGREGATES:
+        return _QUANTILE_AGGREGATES[func]
+    if func.startswith('p') and func[1:].isdigit() and 0 < int(func[1:]) < 100:
+        return int(func[1:]) / 100
+    return None
+
+
+def aggregate_needs_number(func):
+    """
+    Report whether an aggregate function requires a numeric field.
+
+    Args:
+        func (str): The aggregate name, e.g. 'avg' or 'p90'.
+
+    Returns:
+        bool: True for sum, avg, stddev and the quantiles.
+    """
+    return func in _NUMERIC_AGGREGATES or _quantile_level(func) is not None
+
+
+def aggregate_type(func, field_type):
+    """
+    Return the value type of an aggregate column (see column_types).
+
+    Args:
+        func (str): The aggregate function.
+        field_type (str | None): The aggregated column's type, or None for a
+            row count.
+
+    Returns:
+        str | None: The aggregate's type.
+    """
+    if func == 'count':
+        return 'integer'
+    if func in ('min', 'max', 'sum'):
+        return field_type
+    return 'float'
+
+
+def parse_aggregates(text):
+    """
+    Parse an --agg list into (function, field) pairs.
+
+    Items are 'func' or 'func:field'. A bare 'count' counts rows; any other
+    bare function applies to the field of the next item that names one, so
+    'count,min,max,avg:edp_value' means the row count plus the min, max and
+    mean of edp_value.
+
+    Args:
+        text (str): Comma-separated aggregate items.
+
+    Returns:
+        list[tuple[str, str | None]]: (function, field path or None) pairs.
+
+    Raises:
+        ValueError: If a function is unknown or has no field to apply to.
+    """
+    items = []
+    for item in text.split(','):
+        func, _, field = item.strip().partition(':')
+        func, field = func.strip().lower(), field.strip() or None
+        if func not in _SQL_AGGREGATES and _quantile_level(func) is None:
+            raise ValueError(
+                f"unknown aggregate '{func}'. Use one of "
+                f'{", ".join(sorted(_SQL_AGGREGATES))}, median or pNN.'
+            )
+        items.append([func, field])
+
+    pending_field = None
+    for item in reversed(items):
+        if item[1]:
+            pending_field = item[1]
+        elif item[0] != 'count':
+            if pending_field is None:
+                raise ValueError(
+                    f"aggregate '{item[0]}' needs a field, e.g. "
+                    f"'{item[0]}:edp_value'."
+                )
+            item[1] = pending_field
+    return [tuple(item) for item in items]
+
+
+def aggregate_column_name(func, field):
+    """
+    Return the output column name for an aggregate.
+
+    Args:
+        func (str): The aggregate function.
+        field (str | None): The aggregated field path, or None for a row count.
+
+    Returns:
+        str: e.g. 'count' or 'avg_edp_value'.
+    """
+    return f'{func}_{field}' if field else func
+
+
+def quantile(sorted_values, level):
+    """
+    Compute a quantile of pre-sorted values by linear interpolation.
+
+    Args:
+        sorted_values (list[float]): Non-empty values in ascending order.
+        level (float): The quantile level in [0, 1].
+
+    Returns:
+        float: The interpolated quantile.
+    """
+    position = (len(sorted_values) - 1) * level
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    low_value = sorted_values[lower]
+    return low_value + (sorted_values[upper] - low_value) * (position - lower)
+
+
+def aggregate_rows(queryset, group_columns, aggregates):
+    """
+    Yield one summary row per group, aggregated in the database.
+
+    Native aggregates run as a single GROUP BY query via values().annotate().
+    Quantiles are computed in a streaming second pass per field: rows are
+    read ordered by group and value, so only one group's values are held in
+    memory at a time.
+
+    Args:
+        queryset (QuerySet): The (filtered) rows to summarize.
+        group_columns (list[tuple]): Column specs from resolve_columns for the
+            grouping columns (may be empty for a whole-table summary).
+        aggregates (list[tuple]): Resolved (function, lookup) pairs, where
+            lookup is None for a row count.
+
+    Yields:
+        tuple: The group values followed by one value per aggregate.
+    """
+    group_lookups = column_lookups(group_columns)
+    annotations = {}
+    quantiles = defaultdict(list)  # lookup -> [(aggregate index, level)]
+    for index, (func, lookup) in enumerate(aggregates):
+        alias = f'agg_{index}'
+        if func in _FLOAT_AGGREGATES:
+            annotations[alias] = _SQL_AGGREGATES[func](
+                lookup, output_field=FloatField()
+            )
+        elif func in _SQL_AGGREGATES:
+            annotations[alias] = _SQL_AGGREGATES[func](lookup or '*')
+        else:
+            quantiles[lookup].append((index, _quantile_level(func)))
+
+    # One ordered pass per field, however many quantiles it needs.
+    quantile_results = {}
+    width = len(group_lookups)
+    for lookup, levels in quantiles.items():
+        rows = (
+            queryset.filter(**{f'{lookup}__isnull': False})
+            .order_by(*group_lookups, lookup)
+            .values_list(*group_lookups, lookup)
+            .iterator(chunk_size=_QUANTILE_CHUNK_SIZE)
+        )
+        for key, group in itertools.groupby(rows, key=lambda row: row[:width]):
+            values = [float(row[width]) for row in group]
+            for index, level in levels:
+                quantile_results[key, index] = quantile(values, level)
+
+    if group_lookups:
+        summary = (
+            queryset.order_by()
+            .values(*group_lookups)
+            .annotate(**annotations)
+            .order_by(*group_lookups)
+            .values_list(*group_lookups, *annotations)
+        )
+    else:
+        totals = queryset.aggregate(**annotations) if annotations else {}
+        summary = [tuple(totals[alias] for alias in annotations)]
+
+    for row in summary:
+        key = tuple(row[: len(group_lookups)])
+        native = iter(row[len(group_lookups) :])
+        values = [
+            quantile_results.get((key, index))
+            if func not in _SQL_AGGREGATES
+            else next(native)
+            for index, (func, _) in enumerate(aggregates)
+        ]
+        yield (*key, *values)
+
+
+# Output formats for query_to_csv --format.
+OUTPUT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+# Output path meaning "stream to stdout".
+STDOUT_PATH = '-'
+
+# Rows per Parquet row group.
+_PARQUET_BATCH_SIZE = 50000
+
+
+def check_output(output_file, output_format):
+    """
+    Validate an output path and format combination before querying.
+
+    Args:
+        output_file (str): The output path, '-' for stdout.
+        output_format (str): One of OUTPUT_FORMATS.
+
+    Raises:
+        ValueError: If the combination is unsupported.
+        ImportError: If Parquet is requested but pyarrow is not installed.
+    """
+    if output_format != 'parquet':
+        return
+    if output_file.endswith('.gz'):
+        raise ValueError(
+            'Parquet output is compressed internally; drop the .gz suffix.'
+        )
+    import pyarrow
+
+
+@contextlib.contextmanager
+def open_output(output_file, output_format, stdout):
+    """
+    Open the export destination for writing.
+
+    '-' streams to stdout. A path ending in '.gz' is gzip-compressed
+    transparently. An uncompressed CSV file keeps its UTF-8 BOM so Excel
+    detects the encoding; every other text output is plain UTF-8.
+
+    Args:
+        output_file (str): The output path, '-' for stdout.
+        output_format (str): One of OUTPUT_FORMATS.
+        stdout: The command's stdout stream.
+
+    Yields:
+        A text stream, or a binary stream for Parquet.
+
+    Raises:
+        ValueError: If Parquet is streamed to a stdout without a binary buffer.
+    """
+    binary = output_format == 'parquet'
+    if output_file == STDOUT_PATH:
+        if not binary:
+            yield stdout
+            return
+        buffer = getattr(stdout, 'buffer', None)
+        if buffer is None:
+            raise ValueError('Parquet output needs a binary stdout.')
+        yield buffer
+        buffer.flush()
+        return
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    if output_file.endswith('.gz'):
+        with gzip.open(output_file, 'wt', encoding='utf-8', newline='') as f:
+            yield f
+    elif binary:
+        with open(output_file, 'wb') as f:
+            yield f
+    else:
+        encoding = 'utf-8-sig' if output_format == 'csv' else 'utf-8'
+        with open(output_file, 'w', newline='', encoding=encoding) as f:
+            yield f
+
+
+def write_rows(stream, output_format, header, rows, types=None):
+    """
+    Write a header and encoded rows in the given format.
+
+    Args:
+        stream: The stream from open_output.
+        output_format (str): One of OUTPUT_FORMATS.
+        header (list[str]): Column names.
+        rows (Iterable[list]): Rows from encode_row. For NDJSON, JSON fields
+            should be left decoded (encode_json=False).
+        types (list[str | None] | None): Column types from column_types, used
+            by Parquet. A column without one takes the type of the values in
+            the first batch of rows, or text if they are all null.
+
+    Returns:
+        int: The number of rows written.
+    """
+    return _ROW_WRITERS[output_format](stream, header, rows, types)
+
+
+def _write_csv(stream, header, rows, types):
+    writer = csv.writer(stream)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _write_ndjson(stream, header, rows, types):
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(dict(zip(header, row)), cls=DecimalEncoder) + '\n')
+        count += 1
+    return count
+
+
+def _write_parquet(stream, header, rows, types):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        'integer': pa.int64(),
+        'float': pa.float64(),
+        'boolean': pa.bool_(),
+        'text': pa.string(),
+        'datetime': pa.timestamp('us', tz='UTC' if settings.USE_TZ else None),
+        'duration': pa.duration('us'),
+    }
+    types = types or [None] * len(header)
+    writer = None
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, _PARQUET_BATCH_SIZE))
+        if not batch:
+            break
+        columns = {
+            name: [
+                float(value) if isinstance(value, Decimal) else value
+                for value in values
+            ]
+            for name, values in zip(header, zip(*batch))
+        }
+        if writer is None:
+            inferred = pa.Table.from_pydict(columns).schema
+            # A column of unknown type takes the first batch's; if that is
+            # all null there is nothing to infer, so it is stored as text.
+            fields = []
+            for field, kind in zip(inferred, types):
+                if kind:
+                    field = pa.field(field.name, arrow_types[kind])
+                elif pa.types.is_null(field.type):
+                    field = pa.field(field.name, pa.string())
+                fields.append(field)
+            schema = pa.schema(fields)
+            writer = pq.ParquetWriter(stream, schema)
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        count += len(batch)
+    if writer is not None:
+        writer.close()
+    return count
+
+
+_ROW_WRITERS = {
+    'csv': _write_csv,
+    'ndjson': _write_ndjson,
+    'parquet': _write_parquet,
+}
+
+
+def concatenate_parts(part_paths, output_file, output_format):
+    """
+    Join part files written by write_rows into one output file.
+
+    CSV parts each carry a header; only the first is kept. Parquet parts are
+    re-batched into one file, taking each column's type from whichever part
+    could infer it (a part whose column was all null stores it as text).
+
+    Args:
+        part_paths (list[str]): Part files, in order.
+        output_file (str): The combined file to write.
+        output_format (str): One of OUTPUT_FORMATS.
+    """
+    if output_format == 'parquet':
+        _concatenate_parquet(part_paths, output_file)
+        return
+
+    encoding = 'utf-8-sig' if output_format == 'csv' else 'utf-8'
+    with open_output(output_file, output_format, None) as out:
+        for index, path in enumerate(part_paths):
+            if path.endswith('.gz'):
+                part = gzip.open(path, 'rt', encoding='utf-8', newline='')
+            else:
+                part = open(path, 'r', encoding=encoding, newline='')
+            with part:
+                if output_format == 'csv' and index:
+                    part.readline()
+                for block in iter(lambda: part.read(1 << 20), ''):
+                    out.write(block)
+
+
+def _concatenate_parquet(part_paths, output_file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schemas = [pq.read_schema(path) for path in part_paths]
+    fields = []
+    for column in schemas[0].names:
+        types = [schema.field(column).type for schema in schemas]
+        typed = [t for t in types if not pa.types.is_string(t)]
+        fields.append(pa.field(column, typed[0] if typed else pa.string()))
+    schema = pa.schema(fields)
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with pq.ParquetWriter(output_file, schema) as writer:
+        for path in part_paths:
+            for batch in pq.ParquetFile(path).iter_batches():
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
@@ -0,0 +1,312 @@
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+
+from ned_app.management.canonical_store import NATURAL_KEYS, RACY_WINDOW_NS
+from ned_app.serialization.file_and_path_utiles import (
+    build_json_data_file_path,
+    is_ndjson_path,
+    list_data_file_paths,
+)
+from ned_app.serialization.json_backend import loads
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    ord INTEGER NOT NULL,
+    stamp TEXT,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (key, path)
+) WITHOUT ROWID;
+"""
+
+
+# Times a lookup re-indexes and retries when a source changes under it.
+_LOOKUP_ATTEMPTS = 5
+
+
+def _key_text(key):
+    return json.dumps(list(key), ensure_ascii=True)
+
+
+def _stamp_text(stat):
+    return f'{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}'
+
+
+def scan_record_spans(path, data):
+    """
+    Find where each record of a canonical data file sits in its bytes.
+
+    Args:
+        path (str): The file's path; a '.ndjson' file holds one record per
+            line, any other a JSON array.
+        data (bytes): The file's contents.
+
+    Yields:
+        tuple[dict, int, int]: Each record with its byte offset and length.
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON.
+    """
+    if is_ndjson_path(path):
+        offset = 0
+        for line in data.splitlines(keepends=True):
+            stripped = line.strip()
+            if stripped:
+                start = offset + line.index(stripped[:1])
+                yield loads(stripped), start, len(stripped)
+            offset += len(line)
+        return
+
+    text = data.decode('utf-8')
+    decoder = json.JSONDecoder()
+    # Offsets into the text are byte offsets only for ASCII files (as
+    # export_data writes them); otherwise they are converted as we go.
+    ascii_only = data.isascii()
+    char_pos = byte_pos = 0
+
+    def to_bytes(index):
+        nonlocal char_pos, byte_pos
+        if ascii_only:
+            return index
+        byte_pos += len(text[char_pos:index].encode('utf-8'))
+        char_pos = index
+        return byte_pos
+
+    index = _skip_space(text, 0)
+    if text[index : index + 1] != '[':
+        raise json.JSONDecodeError('Expecting a JSON array', text, index)
+    index = _skip_space(text, index + 1)
+    if text[index : index + 1] == ']':
+        return
+    while True:
+        record, end = decoder.raw_decode(text, index)
+        start = to_bytes(index)
+        yield record, start, to_bytes(end) - start
+        index = _skip_space(text, end)
+        if text[index : index + 1] == ',':
+            index = _skip_space(text, index + 1)
+        elif text[index : index + 1] == ']':
+            return
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+
+
+def _skip_space(text, index):
+    while index < len(text) and text[index] in ' \t\n\r':
+        index += 1
+    return index
+
+
+class RecordIndex:
+    """
+    A byte-offset index of one data file's records by natural key.
+
+    The index is a SQLite file in the 'index' directory of
+    settings.NED_CACHE_DIR, covering every file the data file is read from
+    (its .json/.ndjson variants and shards). For each record it holds the
+    natural key, the source file and the record's byte offset and length,
+    so a lookup reads and parses only that slice, through a memory map.
+
+    Each source file is recorded with its SHA-1 digest and (mtime_ns,
+    size, inode) stamp. A lookup stats the sources; a changed stamp, or one
+    taken too recently to trust (see canonical_store), means re-hashing
+    the file, and a changed digest re-indexes just that file. The mapped
+    file is checked against the indexed one after its slice is read (by
+    stamp, or by digest while the stamp is untrusted), and a lookup that
+    raced with a write starts again.
+    """
+
+    def __init__(self, filename, directory=None):
+        """
+        Args:
+            filename (str): The data file's name in NATURAL_KEYS, e.g.
+                'experiment.json'.
+            directory (str | None): Where to keep the index (default: the
+                'index' directory of settings.NED_CACHE_DIR).
+        """
+        self.filename = filename
+        self.key = NATURAL_KEYS[filename]
+        data_path = os.path.abspath(build_json_data_file_path(filename))
+        directory = directory or os.path.join(settings.NED_CACHE_DIR, 'index')
+        # One index per checkout: the same name may be indexed elsewhere.
+        checkout = hashlib.sha256(data_path.encode('utf-8')).hexdigest()[:12]
+        stem = os.path.splitext(filename)[0]
+        self.data_path = data_path
+        self.index_path = os.path.join(directory, f'{stem}-{checkout}.sqlite3')
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        connection = sqlite3.connect(self.index_path)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def refresh(self, connection):
+        """
+        Bring the index up to date with the data files.
+
+        Args:
+            connection (sqlite3.Connection): The index database.
+
+        Returns:
+            int: The number of source files (re-)indexed.
+
+        Raises:
+            json.JSONDecodeError: If a changed file is not valid JSON.
+        """
+        paths = list_data_file_paths(self.data_path)
+        known = {
+            path: (stamp, digest)
+            for path, stamp, digest in connection.execute(
+                'SELECT path, stamp, digest FROM sources'
+            )
+        }
+        indexed = 0
+        with connection:
+            for path in set(known) - set(paths):
+                connection.execute('DELETE FROM sources WHERE path = ?', (path,))
+                connection.execute('DELETE FROM records WHERE path = ?', (path,))
+            for order, path in enumerate(paths):
+                indexed += self._refresh_source(
+                    connection, path, order, known.get(path)
+                )
+        return indexed
+
+    def _refresh_source(self, connection, path, order, known):
+        stat = os.stat(path)
+        stamp = _stamp_text(stat)
+        trusted = stat.st_mtime_ns < time.time_ns() - RACY_WINDOW_NS
+        if known is not None and known[0] == stamp and trusted:
+            connection.execute(
+                'UPDATE sources SET ord = ? WHERE path = ?', (order, path)
+            )
+            return 0
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        # A stamp taken while the file was racy may be shared by a later
+        # version of it, so it is only stored once it can be trusted.
+        stored_stamp = stamp if trusted else None
+        if known is not None and known[1] == digest:
+            connection.execute(
+                'UPDATE sources SET ord = ?, stamp = ? WHERE path = ?',
+                (order, stored_stamp, path),
+            )
+            return 0
+
+        rows = []
+        for record, offset, length in scan_record_spans(path, data):
+            if '_comment' in record:
+                continue
+            try:
+                key = self.key(record)
+            except (KeyError, IndexError, TypeError):
+                continue
+            rows.append((_key_text(key), path, offset, length))
+        connection.execute('DELETE FROM records WHERE path = ?', (path,))
+        # The first record with a key wins, as in the CanonicalStore.
+        connection.executemany(
+            'INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?)', rows
+        )
+        connection.execute(
+            'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+            (path, order, stored_stamp, digest),
+        )
+        return 1
+
+    def lookup(self, key):
+        """
+        Read one record by natural key.
+
+        Args:
+            key (tuple[str, ...]): The natural key, as NATURAL_KEYS computes
+                it, e.g. ('exp001',) or ('R-2020|fra1', '1').
+
+        Returns:
+            dict | None: The record, or None if no record has the key.
+
+        Raises:
+            json.JSONDecodeError: If a changed file is not valid JSON.
+            RuntimeError: If the file changed under every attempt to read it.
+        """
+        for _ in range(_LOOKUP_ATTEMPTS):
+            connection = self._connect()
+            try:
+                self.refresh(connection)
+                row = connection.execute(
+                    'SELECT records.path, records.offset, records.length, '
+                    'sources.stamp, sources.digest '
+                    'FROM records JOIN sources ON sources.path = records.path '
+                    'WHERE records.key = ? ORDER BY sources.ord LIMIT 1',
+                    (_key_text(key),),
+                ).fetchone()
+            finally:
+                connection.close()
+            if row is None:
+                return None
+            data = self._read_span(*row)
+            if data is not None:
+                return loads(data)
+        raise RuntimeError(
+            f'{self.filename} kept changing while it was read; try again.'
+        )
+
+    def _read_span(self, path, offset, length, stamp, digest):
+        """
+        Read a record's bytes, if the file is still the one indexed.
+
+        Args:
+            path (str): The source file.
+            offset (int): The record's byte offset.
+            length (int): The record's byte length.
+            stamp (str | None): The indexed stamp, or None if it was taken
+                too recently to trust.
+            digest (str): The indexed SHA-1 digest.
+
+        Returns:
+            bytes | None: The record's bytes, or None if the file has been
+            replaced or changed since it was indexed.
+        """
+        try:
+            with (
+                open(path, 'rb') as f,
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            ):
+                data = mapped[offset : offset + length]
+                # Checked after the slice is taken, so that a write during
+                # the read is caught too.
+                if stamp is not None:
+                    unchanged = _stamp_text(os.fstat(f.fileno())) == stamp
+                else:
+                    unchanged = hashlib.sha1(mapped).hexdigest() == digest
+        except (FileNotFoundError, ValueError):
+            # Removed, or emptied (an empty file cannot be mapped).
+            return None
+        return data if unchanged else None
+
+
+def lookup_record(filename, key):
+    """
+    Read one record of a canonical data file by natural key.
+
+    Args:
+        filename (str): The data file's name, e.g. 'experiment.json'.
+        key (tuple[str, ...]): The natural key (see RecordIndex.lookup).
+
+    Returns:
+        dict | None: The record, or None if no record has the key.
+    """
+    return RecordIndex(filename).lookup(key)
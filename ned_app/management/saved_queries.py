@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from django.conf import settings
+from django.db import connection
+
+from ned_app.serialization.file_and_path_utiles import (
+    PARENT_RESOURCES_DIR,
+    build_path_from_base_dir,
+)
+
+
+# The checked-in registry of named query_to_csv queries.
+SAVED_QUERIES_FILE = os.path.join(PARENT_RESOURCES_DIR, 'saved_queries.json')
+
+# query_to_csv options a saved query may set.
+QUERY_KEYS = ('model', 'fields', 'filter', 'group_by', 'agg', 'format')
+
+_FILE_EXTENSIONS = {'csv': '.csv', 'ndjson': '.ndjson', 'parquet': '.parquet'}
+
+
+def load_saved_queries(path=None):
+    """
+    Load the registry of named queries.
+
+    The registry is a JSON object mapping each query name to its
+    query_to_csv options (model, fields, filter, group_by, agg, format) and
+    an optional description.
+
+    Args:
+        path (str | None): The registry file (default: SAVED_QUERIES_FILE
+            under settings.BASE_DIR).
+
+    Returns:
+        dict[str, dict]: Query definitions by name.
+
+    Raises:
+        ValueError: If the registry is missing, unreadable or malformed.
+    """
+    path = path or build_path_from_base_dir(SAVED_QUERIES_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f'No saved query registry at {path}.')
+    except json.JSONDecodeError as ex:
+        raise ValueError(f'Invalid JSON in {path}: {ex}')
+
+    if not isinstance(registry, dict):
+        raise ValueError(f'{path} must contain a JSON object of named queries.')
+    for name, definition in registry.items():
+        if not isinstance(definition, dict) or 'model' not in definition:
+            raise ValueError(f"Saved query '{name}' must be an object with a model.")
+        unknown = set(definition) - set(QUERY_KEYS) - {'description'}
+        if unknown:
+            raise ValueError(
+                f"Saved query '{name}' has unknown keys: "
+                f'{", ".join(sorted(unknown))}'
+            )
+    return registry
+
+
+def _results_dir():
+    """Return the directory holding cached query results."""
+    return os.path.join(settings.NED_CACHE_DIR, 'queries')
+
+
+def clear_cached_results():
+    """
+    Forget every cached query result, e.g. after the database was edited.
+
+    Results still being written ('.partial' files) are left for their
+    writers to finish.
+    """
+    directory = _results_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith('.partial'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def cache_paths(definition, dataset_key):
+    """
+    Return the cache files for a query's result against a dataset.
+
+    Args:
+        definition (dict): The query options (see QUERY_KEYS); the format
+            must be set.
+        dataset_key (str): The database's dataset_versions.dataset_cache_key().
+
+    Returns:
+        tuple[str, str]: The cached result path (an uncompressed file, as
+        query_to_csv writes it) and its metadata path.
+    """
+    key_source = json.dumps(
+        {
+            'query': {key: definition.get(key) for key in QUERY_KEYS},
+            'database': str(connection.settings_dict['NAME']),
+            'dataset': dataset_key,
+        },
+        sort_keys=True,
+    )
+    key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    directory = _results_dir()
+    extension = _FILE_EXTENSIONS[definition['format']]
+    return (
+        os.path.join(directory, key + extension),
+        os.path.join(directory, key + '.json'),
+    )
+
+
+def read_cached_row_count(meta_path):
+    """
+    Return the row count of a cached result, if the result is cached.
+
+    Args:
+        meta_path (str): The metadata path from cache_paths.
+
+    Returns:
+        int | None: The row count, or None on a cache miss.
+    """
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['rows']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store_cached_result(result_path, meta_path, row_count):
+    """
+    Mark a freshly written cached result as complete.
+
+    The metadata is written last, so an interrupted export never produces
+    a cache hit.
+
+    Args:
+        result_path (str): The result path from cache_paths.
+        meta_path (str): The metadata path from cache_paths.
+        row_count (int): The number of rows in the result.
+    """
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'rows': row_count, 'result': os.path.basename(result_path)}, f)
+
+
+def deliver_cached_result(result_path, output_file, output_format, stdout):
+    """
+    Copy a cached result to the requested destination.
+
+    The cache holds the uncompressed file. A '.gz' destination is compressed
+    on the way out, and CSV sent to stdout or gzip drops the UTF-8 BOM that
+    only uncompressed CSV files carry, matching a fresh export byte for byte.
+
+    Args:
+        result_path (str): The cached result path.
+        output_file (str): The destination path, '-' for stdout.
+        output_format (str): The result's format.
+        stdout: The command's stdout stream.
+    """
+    to_stdout = output_file == '-'
+    if not to_stdout and not output_file.endswith('.gz'):
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        shutil.copyfile(result_path, output_file)
+        return
+
+    if output_format == 'parquet':
+        with open(result_path, 'rb') as src:
+            shutil.copyfileobj(src, stdout.buffer)
+        stdout.buffer.flush()
+        return
+
+    encoding = 'utf-8-sig' if output_format == 'csv' else 'utf-8'
+    with open(result_path, 'r', encoding=encoding, newline='') as src:
+        if to_stdout:
+            for block in iter(lambda: src.read(1 << 20), ''):
+                stdout.write(block, ending='')
+            return
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        with gzip.open(output_file, 'wt', encoding='utf-8', newline='') as out:
+            shutil.copyfileobj(src, out)
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ned_app', '0034_reference_reference_label'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'created_at',
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text='When the ingest run recorded this version.',
+                        verbose_name='created at',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Dataset Version',
+                'verbose_name_plural': 'Dataset Versions',
+            },
+        ),
+        migrations.CreateModel(
+            name='DatasetChange',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'model',
+                    models.CharField(
+                        help_text="The changed record's model name.",
+                        max_length=100,
+                        verbose_name='model',
+                    ),
+                ),
+                (
+                    'natural_key',
+                    models.JSONField(
+                        help_text="The changed record's natural key.",
+                        verbose_name='natural key',
+                    ),
+                ),
+                (
+                    'change_type',
+                    models.CharField(
+                        choices=[
+                            ('created', 'Created'),
+                            ('updated', 'Updated'),
+                            ('deleted', 'Deleted'),
+                        ],
+                        help_text='Whether the record was created, updated or deleted.',
+                        max_length=10,
+                        verbose_name='change type',
+                    ),
+                ),
+                (
+                    'dataset_version',
+                    models.ForeignKey(
+                        help_text='The version whose ingest run made the change.',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='changes',
+                        to='ned_app.datasetversion',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Dataset Change',
+                'verbose_name_plural': 'Dataset Changes',
+            },
+        ),
+    ]
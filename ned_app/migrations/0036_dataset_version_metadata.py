@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ned_app', '0035_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetversion',
+            name='duration',
+            field=models.DurationField(
+                blank=True,
+                help_text='How long the ingest run took.',
+                null=True,
+                verbose_name='duration',
+            ),
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='fingerprint',
+            field=models.CharField(
+                blank=True,
+                help_text='SHA-256 of the data files loaded; empty if the run had failures.',
+                max_length=64,
+                verbose_name='fingerprint',
+            ),
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='git_commit',
+            field=models.CharField(
+                blank=True,
+                help_text='The git commit the data files were read from, if known.',
+                max_length=40,
+                verbose_name='git commit',
+            ),
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='row_counts',
+            field=models.JSONField(
+                default=dict,
+                help_text="Each model's number of rows after the ingest run.",
+                verbose_name='row counts',
+            ),
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='source',
+            field=models.CharField(
+                blank=True,
+                help_text='Where the data files were read from.',
+                max_length=255,
+                verbose_name='source',
+            ),
+        ),
+    ]
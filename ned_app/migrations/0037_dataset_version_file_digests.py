@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ned_app', '0036_dataset_version_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetversion',
+            name='file_digests',
+            field=models.JSONField(
+                default=dict,
+                help_text='SHA-256 of each data file loaded, by name; empty if the run had failures.',
+                verbose_name='file digests',
+            ),
+        ),
+    ]
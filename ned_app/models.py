@@ -146,6 +146,12 @@ class EDPUnitChoices(models.TextChoices):
     CUSTOM = 'Custom'
 
 
+class ChangeTypeChoices(models.TextChoices):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+
+
 class DSClassChoices(models.TextChoices):
     NO_DAMAGE = 'No damage'
     INCONSEQUENTIAL = 'Inconsequential'
@@ -935,3 +941,122 @@ class Component(models.Model):
 
     def __str__(self):
         return self.id
+
+
+class DatasetVersion(models.Model):
+    """
+    A dataset version: one ingest run that changed the database or loaded
+    different data files.
+
+    Versions are numbered by their auto-incrementing id, so a later ingest
+    always has a higher version. The changes it made are its DatasetChange
+    rows. The latest version describes what the database was built from,
+    so caches of derived data can be keyed on it (see
+    ned_app.management.dataset_versions.dataset_cache_key).
+
+    Attributes:
+        created_at (datetime): When the ingest run recorded the version.
+        fingerprint (str): SHA-256 of the names and bytes of the data files
+            loaded; empty if the run had failures.
+        git_commit (str): The git commit the data files were read from, if
+            known.
+        source (str): Where the data files were read from.
+        row_counts (dict): Each model's number of rows after the run.
+        duration (timedelta): How long the ingest run took.
+        file_digests (dict): SHA-256 of each data file loaded, by name;
+            empty if the run had failures.
+    """
+
+    created_at = models.DateTimeField(
+        _('created at'),
+        auto_now_add=True,
+        help_text='When the ingest run recorded this version.',
+    )
+    fingerprint = models.CharField(
+        _('fingerprint'),
+        max_length=64,
+        blank=True,
+        help_text=(
+            'SHA-256 of the data files loaded; empty if the run had failures.'
+        ),
+    )
+    git_commit = models.CharField(
+        _('git commit'),
+        max_length=40,
+        blank=True,
+        help_text='The git commit the data files were read from, if known.',
+    )
+    source = models.CharField(
+        _('source'),
+        max_length=255,
+        blank=True,
+        help_text='Where the data files were read from.',
+    )
+    row_counts = models.JSONField(
+        _('row counts'),
+        default=dict,
+        help_text="Each model's number of rows after the ingest run.",
+    )
+    duration = models.DurationField(
+        _('duration'),
+        null=True,
+        blank=True,
+        help_text='How long the ingest run took.',
+    )
+    file_digests = models.JSONField(
+        _('file digests'),
+        default=dict,
+        help_text=(
+            'SHA-256 of each data file loaded, by name; empty if the run had '
+            'failures.'
+        ),
+    )
+
+    class Meta:
+        verbose_name = 'Dataset Version'
+        verbose_name_plural = 'Dataset Versions'
+
+    def __str__(self):
+        return f'v{self.pk}'
+
+
+class DatasetChange(models.Model):
+    """
+    One record created, updated or deleted by the ingest run of a version.
+
+    Attributes:
+        dataset_version (id): The version whose ingest run made the change.
+        model (str): The changed record's model name (e.g. 'Experiment').
+        natural_key (dict): The record's natural key, as used by ingest to
+            find it (e.g. {'id': 'exp001'} or {'reference_id': 'Smith-2020'}).
+        change_type (str): 'created', 'updated' or 'deleted'.
+    """
+
+    dataset_version = models.ForeignKey(
+        'DatasetVersion',
+        on_delete=models.CASCADE,
+        related_name='changes',
+        help_text='The version whose ingest run made the change.',
+    )
+    model = models.CharField(
+        _('model'),
+        max_length=100,
+        help_text="The changed record's model name.",
+    )
+    natural_key = models.JSONField(
+        _('natural key'),
+        help_text="The changed record's natural key.",
+    )
+    change_type = models.CharField(
+        _('change type'),
+        choices=ChangeTypeChoices.choices,
+        max_length=10,
+        help_text='Whether the record was created, updated or deleted.',
+    )
+
+    class Meta:
+        verbose_name = 'Dataset Change'
+        verbose_name_plural = 'Dataset Changes'
+
+    def __str__(self):
+        return f'{self.dataset_version} {self.change_type} {self.model}'
@@ -1,16 +1,85 @@
 import os
+import re
+
+from django.conf import settings
 
 PARENT_RESOURCES_DIR = 'resources'
 DATA_DIR = os.path.join(PARENT_RESOURCES_DIR, 'data')
 
 
-def build_path_from_cwd(relative_path: str) -> str:
-    return os.path.join(os.getcwd(), relative_path)
+def build_path_from_base_dir(relative_path: str) -> str:
+    # Relative to the project (settings.BASE_DIR), whatever the current
+    # working directory.
+    return os.path.join(settings.BASE_DIR, relative_path)
 
 
 def get_data_dir() -> str:
-    return build_path_from_cwd(DATA_DIR)
+    return build_path_from_base_dir(DATA_DIR)
 
 
 def build_json_data_file_path(json_data_filename: str) -> str:
     return os.path.join(get_data_dir(), json_data_filename)
+
+
+# Canonical data files that may be split into shards, one file per value of a
+# field: experiment.json as experiment/<reference>.json. Readers take the
+# records of the single file (if any) followed by those of its shards.
+SHARD_FIELDS = {'experiment.json': 'reference'}
+
+# Canonical data files (and shards) may be stored as newline-delimited JSON
+# instead, with this suffix in place of '.json': one record per line.
+NDJSON_SUFFIX = '.ndjson'
+
+# Field values that can be used as a shard's file name.
+_SHARD_NAME = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_.-]*')
+
+
+def get_shard_dir(json_data_file_path: str) -> str:
+    return os.path.splitext(json_data_file_path)[0]
+
+
+def build_shard_filename(
+    json_data_filename: str, shard_value, suffix: str = '.json'
+) -> str | None:
+    # None when the value cannot name a file; such records stay in the
+    # single file.
+    if not isinstance(shard_value, str) or not _SHARD_NAME.fullmatch(shard_value):
+        return None
+    return os.path.join(get_shard_dir(json_data_filename), f'{shard_value}{suffix}')
+
+
+def is_ndjson_path(path: str) -> bool:
+    return path.endswith(NDJSON_SUFFIX)
+
+
+def get_ndjson_path(json_data_file_path: str) -> str:
+    return os.path.splitext(json_data_file_path)[0] + NDJSON_SUFFIX
+
+
+def resolve_data_file_path(json_data_file_path: str) -> str:
+    # The file's NDJSON variant when that is the one stored.
+    if is_ndjson_path(json_data_file_path) or os.path.exists(json_data_file_path):
+        return json_data_file_path
+    ndjson_path = get_ndjson_path(json_data_file_path)
+    return ndjson_path if os.path.exists(ndjson_path) else json_data_file_path
+
+
+def list_data_file_paths(json_data_file_path: str) -> list[str]:
+    # The existing files holding a data file's records, in reading order: the
+    # file itself (.json and/or .ndjson), then its shards by name.
+    paths = [
+        path
+        for path in dict.fromkeys((
+            json_data_file_path,
+            get_ndjson_path(json_data_file_path),
+        ))
+        if os.path.exists(path)
+    ]
+    shard_dir = get_shard_dir(json_data_file_path)
+    if os.path.isdir(shard_dir):
+        paths.extend(
+            os.path.join(shard_dir, name)
+            for name in sorted(os.listdir(shard_dir))
+            if name.endswith(('.json', NDJSON_SUFFIX)) and not name.startswith('.')
+        )
+    return paths
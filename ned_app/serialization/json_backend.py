@@ -0,0 +1,97 @@
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib parser is used instead.
+    orjson = None
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """
+    Custom JSON encoder to handle Decimal objects.
+
+    Converts Decimal instances to float for JSON serialization.
+    """
+
+    def default(self, obj):
+        """
+        Override default JSON encoding to handle Decimal objects.
+
+        Args:
+            obj: The object to encode.
+
+        Returns:
+            float: The float representation of a Decimal object.
+            Any: The default encoding for non-Decimal objects.
+        """
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super().default(obj)
+
+
+def loads(data):
+    """
+    Parse JSON text, with orjson when it is installed.
+
+    orjson gives the same values as the stdlib, with one exception: it
+    reads integers beyond 64 bits as floats (none of the models can store
+    those). Input it rejects but the stdlib accepts (NaN, a byte-order
+    mark, lone surrogates) is parsed by the stdlib, which also raises the
+    error for invalid JSON.
+
+    Args:
+        data (bytes | str): The JSON text.
+
+    Returns:
+        Any: The parsed value.
+
+    Raises:
+        json.JSONDecodeError: If the text is not valid JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def dumps_canonical(data, trailing_newline=False):
+    """
+    Serialize data in the canonical layout of the files in resources/data/.
+
+    The layout is json.dumps(indent=4, sort_keys=True, ensure_ascii=True),
+    with Decimals written as floats. It is always produced by the stdlib:
+    orjson can only indent by two spaces, does not escape non-ASCII text and
+    formats some floats differently (e.g. 1e-05 as 0.00001), and converting
+    its output costs as much as it saves.
+
+    Args:
+        data: The value to serialize, usually a list of records.
+        trailing_newline (bool): End the text with a newline (export_data
+            files have none; files written by the importers do).
+
+    Returns:
+        str: The serialized text.
+    """
+    text = json.dumps(
+        data, indent=4, sort_keys=True, ensure_ascii=True, cls=DecimalEncoder
+    )
+    return text + '\n' if trailing_newline else text
+
+
+def dumps_line(record):
+    """
+    Serialize a record as one canonical NDJSON line, newline included.
+
+    Args:
+        record (dict): The record.
+
+    Returns:
+        str: The line.
+    """
+    return (
+        json.dumps(record, sort_keys=True, ensure_ascii=True, cls=DecimalEncoder)
+        + '\n'
+    )
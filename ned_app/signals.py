@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+
+from ned_app.management.saved_queries import clear_cached_results
+from ned_app.models import DatasetChange, DatasetVersion
+
+# Set while cached query results need not be cleared on every write.
+_suspended = threading.local()
+
+
+@contextmanager
+def cache_invalidation_suspended():
+    """
+    Stop saves and deletes in this thread from clearing cached query results.
+
+    Used by ingest, which records a new dataset version instead: cached
+    results are keyed on it, so they go stale without a cleanup per row.
+    """
+    previous = getattr(_suspended, 'active', False)
+    _suspended.active = True
+    try:
+        yield
+    finally:
+        _suspended.active = previous
+
+
+def clear_saved_query_results(sender, **kwargs):
+    """
+    Drop cached saved-query results when a data record is saved or deleted.
+
+    Results are cached against the data ingest last loaded, so this catches
+    the edits made without ingest: in the admin, through the API or in a
+    shell. Bulk writes that send no signals (QuerySet.update(), raw SQL)
+    are not seen; run the query with --no-cache after those.
+    """
+    if not getattr(_suspended, 'active', False):
+        clear_cached_results()
+
+
+def connect_receivers(app_config):
+    """
+    Connect clear_saved_query_results to the app's data models only.
+
+    Args:
+        app_config (AppConfig): The ned_app config.
+    """
+    for model in app_config.get_models():
+        if model in (DatasetVersion, DatasetChange):
+            continue
+        for signal in (post_save, post_delete):
+            signal.connect(
+                clear_saved_query_results,
+                sender=model,
+                dispatch_uid=f'clear_saved_query_results.{model.__name__}',
+            )
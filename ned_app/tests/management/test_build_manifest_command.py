@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from ned_app.management import data_manifest
+
+
+class BuildManifestCommandTests(SimpleTestCase):
+    """Tests for the build_manifest command and the manifest helpers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        os.mkdir(self.data_dir)
+        self.output = os.path.join(self.temp_dir, 'data_manifest.json')
+        patcher = patch(
+            'ned_app.management.data_manifest.get_data_dir',
+            return_value=self.data_dir,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self._write('component.json', [{'component_id': 'B.10', 'name': 'Wall'}])
+        self._write(
+            'fragility_curve.json',
+            [
+                {'fragility_model': 'R-2020|fra1', 'ds_rank': 1, 'median': 0.5},
+                {'fragility_model': 'R-2020|fra1', 'ds_rank': 2, 'median': 0.9},
+            ],
+        )
+
+    def _write(self, name, records):
+        with open(os.path.join(self.data_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
+
+    def _build(self, *args):
+        out = StringIO()
+        call_command('build_manifest', *args, output=self.output, stdout=out)
+        return out.getvalue()
+
+    def test_manifest_hashes_records_by_natural_key(self):
+        self._build()
+        with open(self.output) as f:
+            manifest = json.load(f)
+        curves = manifest['files']['fragility_curve.json']
+        self.assertEqual(
+            sorted(curves['records']), ['R-2020|fra1|1', 'R-2020|fra1|2']
+        )
+        self.assertEqual(curves['count'], 2)
+        self.assertEqual(
+            sorted(manifest['files']), ['component.json', 'fragility_curve.json']
+        )
+
+        # The hashes do not depend on the layout of the file.
+        with open(os.path.join(self.data_dir, 'fragility_curve.json')) as f:
+            records = json.load(f)
+        os.remove(os.path.join(self.data_dir, 'fragility_curve.json'))
+        with open(os.path.join(self.data_dir, 'fragility_curve.ndjson'), 'w') as f:
+            f.writelines(json.dumps(r) + '\n' for r in reversed(records))
+        self.assertEqual(data_manifest.build_manifest()['root'], manifest['root'])
+
+    def test_unchanged_files_reuse_the_stored_subtree(self):
+        previous = data_manifest.build_manifest()
+        with patch.object(data_manifest.DirectorySource, 'records') as records:
+            self.assertEqual(data_manifest.build_manifest(previous), previous)
+        records.assert_not_called()
+
+    def test_check_and_compare_list_the_differing_records(self):
+        self._build()
+        self.assertIn('Up to date', self._build('--check'))
+        old = os.path.join(self.temp_dir, 'old_manifest.json')
+        shutil.copy(self.output, old)
+
+        self._write(
+            'fragility_curve.json',
+            [
+                {'fragility_model': 'R-2020|fra1', 'ds_rank': 1, 'median': 0.6},
+                {'fragility_model': 'R-2020|fra1', 'ds_rank': 3, 'median': 1.2},
+            ],
+        )
+        with self.assertRaisesMessage(CommandError, 'out of date'):
+            self._build('--check')
+
+        self.assertEqual(
+            data_manifest.diff_manifests(
+                data_manifest.load_manifest(old), data_manifest.build_manifest()
+            ),
+            {
+                'fragility_curve.json': {
+                    'added': ['R-2020|fra1|3'],
+                    'removed': ['R-2020|fra1|2'],
+                    'changed': ['R-2020|fra1|1'],
+                }
+            },
+        )
+        output = self._build('--compare', old)
+        self.assertIn('changed (1):\n    R-2020|fra1|1', output)
+        self.assertNotIn('component.json', output)
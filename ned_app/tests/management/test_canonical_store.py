@@ -0,0 +1,195 @@
+"""
+Tests for the shared CanonicalStore: memoized parsing, invalidation by
+stamp and digest, natural-key views, and invalidation on our own writes.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from ned_app.management import canonical_store, import_utils
+
+
+class CanonicalStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.store = canonical_store.CanonicalStore()
+
+    def _write(self, name, records, age=None):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4)
+        if age is not None:
+            old = time.time() - age
+            os.utime(path, (old, old))
+        return path
+
+    def _count_parses(self):
+        patcher = patch.object(canonical_store, 'loads', wraps=canonical_store.loads)
+        loads = patcher.start()
+        self.addCleanup(patcher.stop)
+        return loads
+
+    def test_unchanged_file_is_parsed_once(self):
+        path = self._write('component.json', [{'component_id': 'A'}], age=3600)
+        loads = self._count_parses()
+        first = self.store.records(path)
+        self.assertIs(self.store.records(path), first)
+        self.assertEqual(loads.call_count, 1)
+
+    def test_changed_stamp_is_reparsed(self):
+        path = self._write('component.json', [{'component_id': 'A'}], age=3600)
+        self.store.records(path)
+        self._write('component.json', [{'component_id': 'A'}, {'component_id': 'B'}])
+        self.assertEqual(len(self.store.records(path)), 2)
+
+    def test_recent_rewrite_with_same_stamp_is_caught_by_digest(self):
+        path = self._write('component.json', [{'component_id': 'A'}])
+        stat = os.stat(path)
+        loads = self._count_parses()
+        self.assertEqual(self.store.records(path), [{'component_id': 'A'}])
+        self.store.records(path)
+        self.assertEqual(loads.call_count, 1)
+
+        # Same size, same mtime, same inode: only the bytes differ.
+        with open(path, 'r+', encoding='utf-8') as f:
+            text = f.read().replace('"A"', '"B"')
+            f.seek(0)
+            f.write(text)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.store.records(path), [{'component_id': 'B'}])
+
+    def test_missing_file_is_empty_until_created(self):
+        path = os.path.join(self.temp_dir, 'experiment.json')
+        self.assertEqual(self.store.records(path), [])
+        self._write('experiment.json', [{'id': 'exp001'}])
+        self.assertEqual(self.store.records(path), [{'id': 'exp001'}])
+
+    def test_index_uses_natural_keys_and_is_memoized(self):
+        path = self._write(
+            'reference.json',
+            [
+                {'_comment': 'skipped'},
+                {'csl_data': {'author': [{'family': 'Smith'}]}},  # no year
+                {
+                    'reference_label': 'FEMA_P58',
+                    'csl_data': {'issued': {'date-parts': [[2012]]}},
+                },
+            ],
+            age=3600,
+        )
+        index = self.store.index(path)
+        self.assertEqual(list(index), [('FEMA_P58-2012',)])
+        self.assertIs(self.store.index(path), index)
+
+        curves = self._write(
+            'fragility_curve.json',
+            [{'fragility_model': 'R-2020|fra1', 'ds_rank': 1}],
+        )
+        self.assertEqual(list(self.store.index(curves)), [('R-2020|fra1', '1')])
+
+    def test_own_writes_invalidate_the_shared_store(self):
+        path = os.path.join(self.temp_dir, 'experiment.json')
+        with patch(
+            'ned_app.management.import_utils.build_json_data_file_path',
+            side_effect=lambda name: os.path.join(self.temp_dir, name),
+        ):
+            import_utils.write_json('experiment.json', [{'id': 'exp001'}])
+            self.assertIn(('exp001',), import_utils.load_index('experiment.json'))
+            with patch.object(
+                canonical_store.canonical_store, 'invalidate'
+            ) as invalidate:
+                import_utils.append_json('experiment.json', [{'id': 'exp002'}])
+            invalidate.assert_called_with(path)
+            import_utils.append_json('experiment.json', [{'id': 'exp003'}])
+            self.assertEqual(
+                sorted(import_utils.load_index('experiment.json')),
+                [('exp001',), ('exp002',), ('exp003',)],
+            )
+
+
+@patch.object(canonical_store, '_MIN_CACHED_SIZE', 0)
+class ParseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.cache = canonical_store.ParseCache(os.path.join(self.temp_dir, 'cache'))
+
+    def _write(self, records, age=None):
+        path = os.path.join(self.temp_dir, 'component.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4)
+        if age is not None:
+            old = time.time() - age
+            os.utime(path, (old, old))
+        return path
+
+    def _fresh_store(self):
+        # A new process: nothing parsed in memory, the same cache on disk.
+        return canonical_store.CanonicalStore(self.cache)
+
+    def test_old_file_is_served_from_cache_without_reading(self):
+        path = self._write([{'component_id': 'A'}], age=3600)
+        self.assertEqual(self._fresh_store().records(path), [{'component_id': 'A'}])
+
+        with patch.object(canonical_store, 'parse_records') as parse:
+            with patch('builtins.open', wraps=open) as opened:
+                records = self._fresh_store().records(path)
+        self.assertEqual(records, [{'component_id': 'A'}])
+        parse.assert_not_called()
+        self.assertNotIn(path, [call.args[0] for call in opened.call_args_list])
+
+    def test_changed_file_is_reparsed_and_recached(self):
+        path = self._write([{'component_id': 'A'}], age=3600)
+        self._fresh_store().records(path)
+        self._write([{'component_id': 'B'}], age=60)
+        self.assertEqual(self._fresh_store().records(path), [{'component_id': 'B'}])
+        with patch.object(canonical_store, 'parse_records') as parse:
+            self.assertEqual(
+                self._fresh_store().records(path), [{'component_id': 'B'}]
+            )
+        parse.assert_not_called()
+
+    def test_recent_file_is_checked_by_digest(self):
+        path = self._write([{'component_id': 'A'}])
+        stat = os.stat(path)
+        self._fresh_store().records(path)
+
+        # Same stamp, different bytes: the cached parse must not be used.
+        with open(path, 'r+', encoding='utf-8') as f:
+            text = f.read().replace('"A"', '"B"')
+            f.seek(0)
+            f.write(text)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self._fresh_store().records(path), [{'component_id': 'B'}])
+
+    def test_corrupt_cache_is_a_miss(self):
+        path = self._write([{'component_id': 'A'}], age=3600)
+        self._fresh_store().records(path)
+        (name,) = os.listdir(self.cache.directory)
+        with open(os.path.join(self.cache.directory, name), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(self._fresh_store().records(path), [{'component_id': 'A'}])
+
+    def test_settings_cache_is_off_unless_enabled(self):
+        # The default store's cache writes nothing until NED_PARSE_CACHE is
+        # set, and then writes under NED_CACHE_DIR (a temporary directory
+        # while testing).
+        path = self._write([{'component_id': 'A'}], age=3600)
+        cache = canonical_store.ParseCache()
+        self.assertNotEqual(
+            str(settings.NED_CACHE_DIR), str(settings.BASE_DIR / '.ned_cache')
+        )
+        with override_settings(NED_CACHE_DIR=os.path.join(self.temp_dir, 'ned')):
+            canonical_store.CanonicalStore(cache).records(path)
+            self.assertFalse(os.path.exists(cache.directory))
+            with override_settings(NED_PARSE_CACHE=True):
+                canonical_store.CanonicalStore(cache).records(path)
+            self.assertEqual(len(os.listdir(cache.directory)), 1)
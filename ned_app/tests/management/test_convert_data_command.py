@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+
+class ConvertDataCommandTests(SimpleTestCase):
+    """Tests for the convert_data management command."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = patch(
+            'ned_app.management.commands.convert_data.build_json_data_file_path',
+            side_effect=lambda name: os.path.join(self.temp_dir, name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, name, records):
+        path = os.path.join(self.temp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
+        return path
+
+    def _read(self, name):
+        with open(os.path.join(self.temp_dir, name), encoding='utf-8') as f:
+            return f.read()
+
+    def test_converts_files_and_shards_both_ways(self):
+        self._write('component.json', [{'component_id': 'B.10', 'name': 'Wall'}])
+        self._write(
+            os.path.join('experiment', 'A-2020.json'),
+            [{'id': 'e1', 'reference': 'A-2020'}],
+        )
+        original = self._read('component.json')
+
+        call_command('convert_data', to='ndjson', stdout=StringIO())
+        self.assertEqual(
+            sorted(os.listdir(self.temp_dir)), ['component.ndjson', 'experiment']
+        )
+        self.assertEqual(
+            self._read(os.path.join('experiment', 'A-2020.ndjson')),
+            '{"id": "e1", "reference": "A-2020"}\n',
+        )
+
+        out = StringIO()
+        call_command('convert_data', to='ndjson', stdout=out)
+        self.assertIn('already ndjson', out.getvalue())
+
+        call_command('convert_data', to='json', stdout=StringIO())
+        self.assertEqual(self._read('component.json'), original)
+        self.assertEqual(
+            os.listdir(os.path.join(self.temp_dir, 'experiment')), ['A-2020.json']
+        )
+
+    def test_refuses_when_both_formats_exist(self):
+        self._write('component.json', [{'component_id': 'B.10'}])
+        with open(os.path.join(self.temp_dir, 'component.ndjson'), 'w') as f:
+            f.write('{"component_id": "B.20"}\n')
+        with self.assertRaises(CommandError):
+            call_command('convert_data', to='ndjson', stdout=StringIO())
+        self.assertEqual(
+            sorted(os.listdir(self.temp_dir)), ['component.json', 'component.ndjson']
+        )
@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from ned_app.management.data_diff import MISSING, describe_changes, field_changes
+
+CURVES = [
+    {'fragility_model': 'R-2020|fra1', 'ds_rank': 1, 'median': 0.5},
+    {'fragility_model': 'R-2020|fra1', 'ds_rank': 2, 'median': 0.9},
+    {'fragility_model': 'R-2020|fra1', 'ds_rank': 3, 'median': 1.2},
+]
+
+
+class DataDiffCommandTests(SimpleTestCase):
+    """Tests for the data_diff command."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.old = os.path.join(self.temp_dir, 'old')
+        self.new = os.path.join(self.temp_dir, 'new')
+        for directory in (self.old, self.new):
+            os.mkdir(directory)
+            self._write(directory, 'component.json', [{'component_id': 'B.10'}])
+        self._write(self.old, 'fragility_curve.json', CURVES)
+
+    def _write(self, directory, name, records):
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
+
+    def _diff(self, *args):
+        out = StringIO()
+        call_command('data_diff', self.old, self.new, *args, stdout=out)
+        return out.getvalue()
+
+    def test_records_are_matched_by_natural_key_not_position(self):
+        # Reordered, and stored as NDJSON: the same records.
+        with open(os.path.join(self.new, 'fragility_curve.ndjson'), 'w') as f:
+            f.writelines(json.dumps(record) + '\n' for record in reversed(CURVES))
+        self.assertIn('No differences.', self._diff())
+
+    def test_moved_comments_and_repeated_keys_are_not_differences(self):
+        # Records without a key of their own are labelled by content, not
+        # position, so moving them changes nothing (as long as a repeat stays
+        # after the record whose key it repeats, which is the one read).
+        comment = {'_comment': 'Curves from Smith (2020).'}
+        repeat = {**CURVES[1], 'median': 0.95}
+        self._write(self.old, 'fragility_curve.json', [comment, *CURVES, repeat])
+        self._write(
+            self.new,
+            'fragility_curve.json',
+            [CURVES[0], CURVES[1], repeat, comment, CURVES[2]],
+        )
+        self.assertIn('No differences.', self._diff())
+
+        # Editing one is a removal and an addition, not a change.
+        self._write(
+            self.new,
+            'fragility_curve.json',
+            [{'_comment': 'Curves from Smith et al.'}, *CURVES, repeat],
+        )
+        report = json.loads(self._diff('--format', 'json'))
+        changes = report['files']['fragility_curve.json']
+        self.assertEqual(len(changes['added']), 1)
+        self.assertEqual(len(changes['removed']), 1)
+        self.assertTrue(changes['added'][0].startswith('#'))
+        self.assertEqual(changes['changed'], {})
+
+    def test_reports_added_removed_and_changed_fields(self):
+        self._write(
+            self.new,
+            'fragility_curve.json',
+            [
+                {**CURVES[2], 'median': 1.5, 'beta': 0.4},
+                CURVES[0],
+                {**CURVES[0], 'ds_rank': 4},
+            ],
+        )
+        text = self._diff()
+        self.assertIn('fragility_curve.json: 1 added, 1 removed, 1 changed', text)
+        self.assertIn('  + R-2020|fra1|4', text)
+        self.assertIn('  - R-2020|fra1|2', text)
+        self.assertIn('  ~ R-2020|fra1|3', text)
+        self.assertIn('beta: (unset) -> 0.4', text)
+        self.assertIn('median: 1.2 -> 1.5', text)
+        self.assertNotIn('component.json', text)
+
+        report = json.loads(self._diff('--format', 'json'))
+        self.assertEqual(report['old'], self.old)
+        self.assertEqual(
+            report['files'],
+            {
+                'fragility_curve.json': {
+                    'added': ['R-2020|fra1|4'],
+                    'removed': ['R-2020|fra1|2'],
+                    'changed': {
+                        'R-2020|fra1|3': {
+                            'beta': {'new': 0.4},
+                            'median': {'old': 1.2, 'new': 1.5},
+                        }
+                    },
+                }
+            },
+        )
+
+    def test_identical_files_are_not_parsed(self):
+        self._write(self.new, 'fragility_curve.json', CURVES)
+        with patch('ned_app.management.data_diff.parse_records') as parse:
+            self.assertIn('No differences.', self._diff())
+        parse.assert_not_called()
+
+    def test_bad_source(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'data_diff',
+                os.path.join(self.temp_dir, 'missing'),
+                stdout=StringIO(),
+            )
+
+    def test_field_changes_flattens_nested_objects(self):
+        self.assertEqual(
+            field_changes(
+                {'csl_data': {'title': 'A', 'issued': 2020}, 'x': 1},
+                {'csl_data': {'title': 'B', 'issued': 2020}},
+            ),
+            {'csl_data.title': ('A', 'B'), 'x': (1, MISSING)},
+        )
+
+    def test_describe_changes_renders_field_changes(self):
+        self.assertEqual(
+            describe_changes(
+                {'id': 'exp001', 'notes': 'old', 'csl_data': {'DOI': '10.1/a'}},
+                {'id': 'exp001', 'csl_data': {'DOI': '10.1/b'}},
+            ),
+            ['csl_data.DOI: "10.1/a" -> "10.1/b"', 'notes: "old" -> (unset)'],
+        )
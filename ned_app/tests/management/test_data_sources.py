@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import zipfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+
+from ned_app.management.data_manifest import build_manifest
+from ned_app.management.data_sources import (
+    DataSource,
+    DirectorySource,
+    GitSource,
+    ZipSource,
+    open_data_source,
+)
+from ned_app.models import Component
+from ned_app.serialization.file_and_path_utiles import DATA_DIR
+
+COMPONENTS = [
+    {'component_id': 'B.20.1.1.A', 'name': 'CFS Exterior Walls'},
+    {'component_id': 'D.30.3.2.B', 'name': 'Water Heater'},
+]
+EXPERIMENTS = [{'id': 'exp002', 'reference': 'Smith-2020'}]
+SHARD = [{'id': 'exp001', 'reference': 'Smith-2020'}]
+
+
+def _git_available():
+    try:
+        subprocess.run(['git', '--version'], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+class DataSourceTests(SimpleTestCase):
+    """Tests for serving the data files from a directory, a zip or git."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.data_dir = os.path.join(self.temp_dir, 'resources', 'data')
+        os.makedirs(os.path.join(self.data_dir, 'experiment'))
+        self._write('component.json', COMPONENTS)
+        self._write('experiment.json', EXPERIMENTS)
+        self._write('experiment/Smith-2020.json', SHARD)
+        # Not a shard: shards are .json/.ndjson files, and not hidden.
+        self._write('experiment/notes.txt', [])
+        self._write('experiment/.Jones-2021.json', SHARD)
+
+    def _write(self, name, records):
+        with open(os.path.join(self.data_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
+
+    def _zip(self, prefix):
+        path = os.path.join(self.temp_dir, 'data.zip')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for root, _, files in os.walk(self.data_dir):
+                for name in files:
+                    full = os.path.join(root, name)
+                    relative = os.path.relpath(full, self.data_dir)
+                    archive.write(full, prefix + relative.replace(os.sep, '/'))
+        return path
+
+    def _git_repository(self):
+        def git(*args):
+            subprocess.run(
+                ['git', '-C', self.temp_dir, *args], check=True, capture_output=True
+            )
+
+        git('init', '-q')
+        git('add', 'resources')
+        git(
+            '-c', 'user.name=NED', '-c', 'user.email=ned@example.com',
+            'commit', '-q', '-m', 'Data',
+        )  # fmt: skip
+        git('tag', 'v1')
+        return self.temp_dir
+
+    def assertServesTheData(self, source):
+        with source:
+            self.assertEqual(
+                source.data_files('experiment.json'),
+                ['experiment.json', 'experiment/Smith-2020.json'],
+            )
+            self.assertEqual(source.data_files('component.json'), ['component.json'])
+            self.assertEqual(source.data_files('fragility_curve.json'), [])
+            self.assertEqual(source.records('component.json'), COMPONENTS)
+            self.assertEqual(source.records('experiment/Smith-2020.json'), SHARD)
+            self.assertEqual(json.loads(source.read('component.json')), COMPONENTS)
+
+    def test_directory_source(self):
+        self.assertServesTheData(DirectorySource(self.data_dir))
+
+    def test_directory_source_defaults_to_the_project_not_the_cwd(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.temp_dir)
+        with self.settings(BASE_DIR=Path(self.temp_dir)):
+            self.assertServesTheData(DirectorySource())
+        self.assertEqual(
+            DirectorySource().root, os.path.join(settings.BASE_DIR, DATA_DIR)
+        )
+
+    def test_data_source_requires_data_files_and_read(self):
+        class Partial(DataSource):
+            def read(self, name):
+                return b'[]'
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+    def test_zip_source_finds_the_data_directory_in_the_archive(self):
+        self.assertServesTheData(ZipSource(self._zip('')))
+        self.assertServesTheData(ZipSource(self._zip('ned-1.0/resources/data/')))
+
+    def test_zip_source_reads_the_commit_git_archive_records(self):
+        path = self._zip('')
+        with ZipSource(path) as source:
+            self.assertIsNone(source.commit)
+        with zipfile.ZipFile(path, 'a') as archive:
+            archive.comment = b'0123456789abcdef0123456789abcdef01234567'
+        with ZipSource(path) as source:
+            self.assertEqual(
+                source.commit, '0123456789abcdef0123456789abcdef01234567'
+            )
+
+    @unittest.skipUnless(_git_available(), 'git is not installed')
+    def test_git_source_reads_the_revision_not_the_working_tree(self):
+        repository = self._git_repository()
+        source = DirectorySource(self.data_dir)
+        self.assertEqual(source.commit, GitSource('v1', repository).commit)
+        self._write('component.json', COMPONENTS[:1])
+        # The working tree no longer matches any commit.
+        self.assertIsNone(source.commit)
+        self.assertServesTheData(GitSource('v1', repository))
+
+        with self.assertRaises(ValueError):
+            GitSource('no-such-tag', repository)
+
+    def test_open_data_source_parses_the_spec(self):
+        self.assertIsNone(open_data_source())
+        self.assertIsInstance(open_data_source(self.data_dir), DirectorySource)
+        self.assertIsInstance(
+            open_data_source(f'dir:{self.data_dir}'), DirectorySource
+        )
+        with open_data_source(self._zip('')) as source:
+            self.assertIsInstance(source, ZipSource)
+        with self.settings(NED_DATA_SOURCE=self.data_dir):
+            self.assertEqual(open_data_source().root, self.data_dir)
+        with self.assertRaises(ValueError):
+            open_data_source(os.path.join(self.temp_dir, 'missing'))
+        with self.assertRaises(ValueError):
+            open_data_source(os.path.join(self.temp_dir, 'missing.zip'))
+
+    def test_manifest_does_not_depend_on_the_source(self):
+        expected = build_manifest(source=DirectorySource(self.data_dir))
+        with ZipSource(self._zip('resources/data/')) as source:
+            self.assertEqual(build_manifest(source=source)['root'], expected['root'])
+
+        out = StringIO()
+        call_command(
+            'build_manifest',
+            source=self._zip(''),
+            output=os.path.join(self.temp_dir, 'manifest.json'),
+            stdout=out,
+        )
+        self.assertIn(expected['root'], out.getvalue())
+
+
+class IngestSourceTests(TestCase):
+    """Tests for ingest --source."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.archive = os.path.join(self.temp_dir, 'data.zip')
+        with zipfile.ZipFile(self.archive, 'w') as archive:
+            archive.writestr('component.json', json.dumps(COMPONENTS))
+        # The working-tree data is not read when a source is given.
+        patcher = patch(
+            'ned_app.management.commands.ingest.build_json_data_file_path',
+            side_effect=lambda filename: os.path.join(self.temp_dir, filename),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ingest_reads_the_given_source(self):
+        call_command('ingest', source=self.archive, stdout=StringIO())
+        self.assertEqual(
+            sorted(Component.objects.values_list('component_id', flat=True)),
+            ['B.20.1.1.A', 'D.30.3.2.B'],
+        )
+
+    def test_ingest_reports_a_bad_source(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'ingest',
+                source=os.path.join(self.temp_dir, 'missing.zip'),
+                stdout=StringIO(),
+            )
@@ -1,12 +1,21 @@
 import os
 import tempfile
 import json
+from io import StringIO
 from decimal import Decimal
-from django.test import TestCase
+import shutil
+import sqlite3
+from contextlib import closing, contextmanager
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from ned_app.management.commands.export_data import EXPORT_CONFIG
 from ned_app.models import (
     Reference,
     Component,
+    DatasetChange,
+    DatasetVersion,
     Experiment,
     FragilityModel,
     ExperimentFragilityModelBridge,
@@ -365,6 +374,196 @@ class ExportDataCommandTest(TestCase):
             self.assertNotIn('edp_unit', curve)
             self.assertNotIn('reference', curve)
 
+    def test_partitioned_export_concat_matches_single_export(self):
+        """Concatenated parts are byte-identical to an unpartitioned export."""
+        Experiment.objects.create(
+            id='test-exp-000',
+            reference=self.reference,
+            component=self.component,
+            edp_value=Decimal('0.02'),
+        )
+        single_dir = os.path.join(self.temp_dir, 'single')
+        parts_dir = os.path.join(self.temp_dir, 'parts')
+        call_command('export_data', output_dir=single_dir, stdout=StringIO())
+        call_command(
+            'export_data',
+            output_dir=parts_dir,
+            partitions=2,
+            concat=True,
+            stdout=StringIO(),
+        )
+
+        for name in os.listdir(single_dir):
+            with open(os.path.join(single_dir, name)) as f:
+                single = f.read()
+            with open(os.path.join(parts_dir, name)) as f:
+                self.assertEqual(f.read(), single)
+        # Both are in primary-key order, not creation order.
+        with open(os.path.join(parts_dir, 'experiment.json')) as f:
+            ids = [record['id'] for record in json.load(f)]
+        self.assertEqual(ids, ['test-exp-000', 'test-exp-001'])
+        self.assertFalse(
+            os.path.exists(os.path.join(parts_dir, 'experiment.json.parts'))
+        )
+
+    def test_partitioned_export_removes_other_variants_and_shards(self):
+        """As a plain export does, --partitions clears stale data files."""
+        call_command(
+            'export_data', output_dir=self.temp_dir, sharded=True, stdout=StringIO()
+        )
+        call_command(
+            'export_data',
+            output_dir=self.temp_dir,
+            format='ndjson',
+            stdout=StringIO(),
+        )
+        call_command(
+            'export_data',
+            output_dir=self.temp_dir,
+            partitions=2,
+            concat=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            sorted(os.listdir(self.temp_dir)),
+            sorted(config['file'] for config in EXPORT_CONFIG),
+        )
+
+    def test_partitioned_export_writes_manifest(self):
+        """Without --concat, parts and a manifest are left per file."""
+        call_command(
+            'export_data', output_dir=self.temp_dir, partitions=4, stdout=StringIO()
+        )
+        directory = os.path.join(self.temp_dir, 'experiment.json.parts')
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['model'], 'Experiment')
+        self.assertEqual(manifest['rows'], 1)
+        (part,) = manifest['parts']
+        with open(os.path.join(directory, part['file'])) as f:
+            self.assertEqual(json.load(f)[0]['id'], 'test-exp-001')
+
+    def test_sharded_export_writes_one_file_per_reference(self):
+        """--sharded splits experiment.json by reference; a plain export undoes it."""
+        other = Reference.objects.create(
+            reference_id='Jones-2021',
+            study_type='Experiment',
+            comp_type='Test Component Type',
+            pdf_saved=False,
+            csl_data={
+                'type': 'article-journal',
+                'title': 'Another Article',
+                'author': [{'family': 'Jones', 'given': 'Ann'}],
+                'issued': {'date-parts': [[2021]]},
+            },
+        )
+        Experiment.objects.create(
+            id='test-exp-002', reference=other, component=self.component
+        )
+        call_command(
+            'export_data', output_dir=self.temp_dir, sharded=True, stdout=StringIO()
+        )
+
+        shard_dir = os.path.join(self.temp_dir, 'experiment')
+        self.assertEqual(
+            sorted(os.listdir(shard_dir)), ['Jones-2021.json', 'test-ref-001.json']
+        )
+        with open(os.path.join(shard_dir, 'Jones-2021.json')) as f:
+            self.assertEqual([e['id'] for e in json.load(f)], ['test-exp-002'])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.temp_dir, 'experiment.json'))
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.temp_dir, 'reference.json'))
+        )
+
+        call_command('export_data', output_dir=self.temp_dir, stdout=StringIO())
+        self.assertFalse(os.path.exists(shard_dir))
+        with open(os.path.join(self.temp_dir, 'experiment.json')) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_ndjson_export_holds_the_same_records_one_per_line(self):
+        """--format ndjson writes .ndjson files in place of the .json ones."""
+        call_command('export_data', output_dir=self.temp_dir, stdout=StringIO())
+        with open(os.path.join(self.temp_dir, 'experiment.json')) as f:
+            expected = json.load(f)
+
+        call_command(
+            'export_data',
+            output_dir=self.temp_dir,
+            format='ndjson',
+            stdout=StringIO(),
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.temp_dir, 'experiment.json'))
+        )
+        with open(os.path.join(self.temp_dir, 'experiment.ndjson')) as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+        self.assertEqual(lines[0], json.dumps(expected[0], sort_keys=True))
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'export_data',
+                output_dir=self.temp_dir,
+                format='ndjson',
+                partitions=2,
+                stdout=StringIO(),
+            )
+
+    def test_export_since_version_writes_delta_and_tombstones(self):
+        """--since exports only records changed after the version, plus tombstones."""
+        old = DatasetVersion.objects.create()
+        DatasetChange.objects.create(
+            dataset_version=old,
+            model='Component',
+            natural_key={'component_id': 'B.20.1.1.A'},
+            change_type='created',
+        )
+        new = DatasetVersion.objects.create()
+        for model, key, change_type in [
+            ('Experiment', {'id': 'test-exp-001'}, 'updated'),
+            ('Experiment', {'id': 'test-exp-gone'}, 'created'),
+            ('Experiment', {'id': 'test-exp-gone'}, 'deleted'),
+            ('Component', {'component_id': 'C.10.1.1.A'}, 'deleted'),
+        ]:
+            DatasetChange.objects.create(
+                dataset_version=new,
+                model=model,
+                natural_key=key,
+                change_type=change_type,
+            )
+
+        out = StringIO()
+        call_command(
+            'export_data', output_dir=self.temp_dir, since=old.pk, stdout=out
+        )
+
+        with open(os.path.join(self.temp_dir, 'experiment.json')) as f:
+            self.assertEqual([e['id'] for e in json.load(f)], ['test-exp-001'])
+        # The component changed in the consumer's version is not re-sent.
+        with open(os.path.join(self.temp_dir, 'component.json')) as f:
+            self.assertEqual(json.load(f), [])
+        with open(os.path.join(self.temp_dir, 'delta.json')) as f:
+            delta = json.load(f)
+        self.assertEqual(delta['since'], old.pk)
+        self.assertEqual(delta['version'], new.pk)
+        self.assertEqual(
+            delta['deleted'],
+            {
+                'Component': [{'component_id': 'C.10.1.1.A'}],
+                'Experiment': [{'id': 'test-exp-gone'}],
+            },
+        )
+        self.assertIn('1 changed record(s) and 2 deletion(s)', out.getvalue())
+
+    def test_export_since_rejects_unknown_version(self):
+        """--since beyond the latest version is an error."""
+        with self.assertRaises(CommandError):
+            call_command(
+                'export_data', output_dir=self.temp_dir, since=1, stdout=StringIO()
+            )
+
     def tearDown(self):
         """Clean up test data and temporary files."""
         FragilityCurve.objects.all().delete()
@@ -378,3 +577,57 @@ class ExportDataCommandTest(TestCase):
         import shutil
 
         shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+@contextmanager
+def file_database(path):
+    """
+    Point the default connection at a file copy of the in-memory test database.
+
+    Worker processes cannot see an in-memory database, so this lets the
+    parallel path of run_partitions run. The in-memory connection is set
+    aside, not closed, since closing it would discard the test database.
+    """
+    connection.ensure_connection()
+    with closing(sqlite3.connect(path)) as target:
+        connection.connection.backup(target)
+    memory, name = connection.connection, connection.settings_dict['NAME']
+    connection.connection = None
+    connection.settings_dict['NAME'] = path
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = name
+        connection.connection = memory
+
+
+class ParallelExportTest(TransactionTestCase):
+    """Partitioned exports run by worker processes against a database file."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        for index in (3, 1, 2):
+            Component.objects.create(
+                component_id=f'B.20.1.1.{"ABC"[index - 1]}', name=f'Walls {index}'
+            )
+
+    def test_workers_write_the_parts_of_a_plain_export(self):
+        single_dir = os.path.join(self.temp_dir, 'single')
+        parts_dir = os.path.join(self.temp_dir, 'parts')
+        call_command('export_data', output_dir=single_dir, stdout=StringIO())
+        with file_database(os.path.join(self.temp_dir, 'db.sqlite3')):
+            self.assertFalse(connection.is_in_memory_db())
+            call_command(
+                'export_data',
+                output_dir=parts_dir,
+                partitions=2,
+                concat=True,
+                stdout=StringIO(),
+            )
+        for config in EXPORT_CONFIG:
+            with open(os.path.join(single_dir, config['file'])) as f:
+                single = f.read()
+            with open(os.path.join(parts_dir, config['file'])) as f:
+                self.assertEqual(f.read(), single)
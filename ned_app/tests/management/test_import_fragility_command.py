@@ -2,8 +2,8 @@
 Tests for the import_fragility management command.
 
 Covers the keystone contract (template -> import -> ingest produces the
-model/curve/bridge graph), the cross-row consistency check (the one check
-this command still enforces), and dedupe / dry-run behaviors.
+model/curve/bridge graph), the cross-row consistency check, import-time
+validation against the canonical JSON, and dedupe / dry-run behaviors.
 """
 
 import json
@@ -16,6 +16,7 @@ from unittest.mock import patch
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TransactionTestCase
+from rest_framework import serializers
 
 from ned_app.management import import_utils
 from ned_app.models import (
@@ -25,6 +26,7 @@ from ned_app.models import (
     FragilityModel,
     Reference,
 )
+from ned_app.serialization.serializer import FragilityCurveSerializer
 
 TEMPLATE_DIR = 'resources/import_templates'
 FRAGILITY_TEMPLATE = os.path.join(TEMPLATE_DIR, 'fragility_import_template.csv')
@@ -63,21 +65,38 @@ class ImportFragilityCommandTests(TransactionTestCase):
             f.write(content)
         return path
 
+    def _write_json(self, filename, data):
+        with open(self._json_path(filename), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
     def _make_base_data(self):
-        Reference.objects.create(
-            reference_id='Smith-2020',
-            study_type='Experiment',
-            comp_type='Sprinkler systems',
-            pdf_saved=True,
-            csl_data={
-                'type': 'article-journal',
-                'title': 'Seismic performance of CPVC sprinkler systems',
-                'author': [{'family': 'Smith', 'given': 'John'}],
-                'issued': {'date-parts': [[2020]]},
-            },
-        )
+        # The template's reference and components, in the database and in the
+        # canonical JSON that imported fragility models are validated against.
         Component.objects.create(component_id='A.40.1.1', name='Sprinkler pipe')
         Component.objects.create(component_id='A.40.1.2', name='Sprinkler head')
+        self._write_json(
+            'reference.json',
+            [
+                {
+                    'study_type': 'Experiment',
+                    'comp_type': 'Sprinkler systems',
+                    'pdf_saved': True,
+                    'csl_data': {
+                        'type': 'article-journal',
+                        'title': 'Seismic performance of CPVC sprinkler systems',
+                        'author': [{'family': 'Smith', 'given': 'John'}],
+                        'issued': {'date-parts': [[2020]]},
+                    },
+                }
+            ],
+        )
+        self._write_json(
+            'component.json',
+            [
+                {'component_id': 'A.40.1.1', 'name': 'Sprinkler pipe'},
+                {'component_id': 'A.40.1.2', 'name': 'Sprinkler head'},
+            ],
+        )
 
     # -- Tier 1: keystone template -> import -> ingest ------------------
 
@@ -88,6 +107,9 @@ class ImportFragilityCommandTests(TransactionTestCase):
         call_command('import_fragility', input_file=FRAGILITY_TEMPLATE, stdout=out)
         self.assertNotIn('unrecognized column', out.getvalue())
 
+        # The template's components are outside the NISTIR taxonomy, so they
+        # exist as database fixtures only and are not re-ingested.
+        os.remove(self._json_path('component.json'))
         call_command('ingest', stdout=StringIO(), stderr=StringIO())
 
         # The template defines two models (fra001 with 2 curves, fra002 with 1).
@@ -161,10 +183,11 @@ class ImportFragilityCommandTests(TransactionTestCase):
     def test_duplicate_model_is_skipped(self):
         # Pre-seed the model PK so the template's fra001/fra002 dedupe logic
         # has something to skip against.
-        with open(
-            self._json_path('fragility_model.json'), 'w', encoding='utf-8'
-        ) as f:
-            json.dump([{'reference': 'Smith-2020', 'model_id': 'fra001'}], f)
+        self._make_base_data()
+        self._write_json(
+            'fragility_model.json',
+            [{'reference': 'Smith-2020', 'model_id': 'fra001'}],
+        )
 
         out = StringIO()
         call_command('import_fragility', input_file=FRAGILITY_TEMPLATE, stdout=out)
@@ -173,9 +196,39 @@ class ImportFragilityCommandTests(TransactionTestCase):
         model_ids = [r['model_id'] for r in self._read_json('fragility_model.json')]
         self.assertEqual(sorted(model_ids), ['fra001', 'fra002'])
 
+    def test_merge_updates_curves_by_key(self):
+        self._make_base_data()
+        call_command(
+            'import_fragility', input_file=FRAGILITY_TEMPLATE, stdout=StringIO()
+        )
+        before = self._read_json('fragility_curve.json')
+        path = self._write_csv(
+            'edits.csv',
+            'reference,model_id,ds_rank,ds_description,median,beta\n'
+            'Smith-2020,fra001,2,,1.3,\n'
+            'Smith-2020,fra001,3,Collapse,2.0,0.6\n',
+        )
+
+        out = StringIO()
+        call_command('import_fragility', input_file=path, mode='merge', stdout=out)
+        value = out.getvalue()
+        self.assertIn('Updated 1 fragility curve(s) in fragility_curve.json:', value)
+        self.assertIn(
+            '  Row 2: Smith-2020|fra001 | 2\n    median: 1.2 -> 1.3\n', value
+        )
+        # The model's other columns are empty here, so it is left as it was.
+        self.assertIn('  0 fragility model(s) -> fragility_model.json', value)
+
+        curves = self._read_json('fragility_curve.json')
+        self.assertEqual(len(curves), len(before) + 1)
+        rank_2 = before[1] | {'median': 1.3}
+        self.assertEqual(curves[1], rank_2)
+        self.assertEqual(curves[-1]['ds_rank'], 3)
+
     def test_non_numeric_ds_rank_does_not_crash(self):
         # A non-numeric ds_rank must convert (passing the raw value through)
-        # rather than crashing; ingest reports the bad value later.
+        # rather than crashing; validation then reports it as a row error.
+        self._make_base_data()
         header = (
             'reference,model_id,p58_fragility,comp_detail,material,size_class,'
             'comp_description,reviewer,source,edp_metric,edp_unit,component_ids,'
@@ -188,8 +241,128 @@ class ImportFragilityCommandTests(TransactionTestCase):
         )
         path = self._write_csv('badrank.csv', header + row)
 
-        call_command('import_fragility', input_file=path, stdout=StringIO())
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_fragility', input_file=path, stdout=StringIO(), stderr=err
+            )
+        self.assertIn('Row 2: ds_rank:', err.getvalue())
+
+        call_command(
+            'import_fragility', input_file=path, no_validate=True, stdout=StringIO()
+        )
 
         curves = self._read_json('fragility_curve.json')
         self.assertEqual(len(curves), 1)
         self.assertEqual(curves[0]['ds_rank'], 'one')
+
+    def test_unknown_references_are_reported_and_nothing_written(self):
+        # The reference and one component are missing from the canonical JSON;
+        # every bad row is reported before the command aborts.
+        self._write_json(
+            'component.json',
+            [{'component_id': 'A.40.1.1', 'name': 'Sprinkler pipe'}],
+        )
+
+        err = StringIO()
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'import_fragility',
+                input_file=FRAGILITY_TEMPLATE,
+                stdout=StringIO(),
+                stderr=err,
+            )
+        self.assertIn('No records were imported', str(cm.exception))
+        errors = err.getvalue()
+        self.assertIn("Row 2: reference: unknown Reference 'Smith-2020'", errors)
+        self.assertIn("Row 2: component: unknown Component 'A.40.1.2'", errors)
+        self.assertNotIn("'A.40.1.1'", errors)
+        # Curves name the models of this CSV, which are accepted.
+        self.assertNotIn('fragility_model:', errors)
+        self.assertFalse(os.path.exists(self._json_path('fragility_model.json')))
+
+    def test_object_level_validation_runs_and_errors_are_in_row_order(self):
+        # The serializer's validate() sees every curve, with its fragility
+        # model standing in for the database row, and its errors are
+        # reported in numeric row order (row 10 after row 9).
+        self._make_base_data()
+        header = (
+            'reference,model_id,comp_description,edp_metric,edp_unit,'
+            'component_ids,ds_rank,ds_description,median,beta\n'
+        )
+        rows = ''.join(
+            f'Smith-2020,fraA,Desc,"Peak Floor Acceleration, horizontal",g,'
+            f'A.40.1.1,{rank},DS,0.5,0.4\n'
+            for rank in range(1, 12)
+        )
+        path = self._write_csv('ranks.csv', header + rows)
+        seen = []
+
+        def validate(attrs):
+            seen.append(attrs['fragility_model'].fragility_model_id)
+            raise serializers.ValidationError('median must increase with ds_rank')
+
+        err = StringIO()
+        with (
+            patch.object(FragilityCurveSerializer, 'validate', side_effect=validate),
+            self.assertRaises(CommandError),
+        ):
+            call_command(
+                'import_fragility', input_file=path, stdout=StringIO(), stderr=err
+            )
+        self.assertEqual(seen, ['Smith-2020|fraA'] * 11)
+        lines = [line for line in err.getvalue().splitlines() if 'Row' in line]
+        self.assertEqual(
+            lines,
+            [
+                f'  - Row {row}: non_field_errors: median must increase with ds_rank'
+                for row in range(2, 13)
+            ],
+        )
+        self.assertFalse(os.path.exists(self._json_path('fragility_curve.json')))
+
+    def test_models_split_across_chunks_are_grouped_in_csv_order(self):
+        # Rows of one model are scattered through a CSV that is read in
+        # chunks of two rows; each model is still built from all its rows,
+        # and models are appended in the order they first appear.
+        header = (
+            'reference,model_id,comp_description,edp_metric,edp_unit,'
+            'component_ids,ds_rank,ds_description,median,beta\n'
+        )
+        rows = ''.join(
+            f'Smith-2020,{model_id},Desc,Drift,%,A.40.1.1,{rank},DS,0.5,0.4\n'
+            for model_id, rank in [
+                ('fraB', 1),
+                ('fraA', 1),
+                ('fraC', 1),
+                ('fraB', 2),
+                ('fraA', 2),
+                ('fraB', 3),
+            ]
+        )
+        path = self._write_csv('scattered.csv', header + rows)
+
+        with patch.object(import_utils, 'CSV_CHUNK_SIZE', 2):
+            out = StringIO()
+            call_command(
+                'import_fragility', input_file=path, no_validate=True, stdout=out
+            )
+        self.assertIn('Found 3 unique fragility model(s)', out.getvalue())
+
+        models = self._read_json('fragility_model.json')
+        self.assertEqual([m['model_id'] for m in models], ['fraB', 'fraA', 'fraC'])
+        curves = [
+            (c['fragility_model'], c['ds_rank'])
+            for c in self._read_json('fragility_curve.json')
+        ]
+        self.assertEqual(
+            curves,
+            [
+                ('Smith-2020|fraB', 1),
+                ('Smith-2020|fraB', 2),
+                ('Smith-2020|fraB', 3),
+                ('Smith-2020|fraA', 1),
+                ('Smith-2020|fraA', 2),
+                ('Smith-2020|fraC', 1),
+            ],
+        )
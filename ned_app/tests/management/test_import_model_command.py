@@ -3,9 +3,9 @@ Tests for the import_model management command.
 
 Covers the keystone contract (template -> import -> ingest produces correct
 records) and the importer's own behaviors (append, dry-run, column warnings, and
-stored-key dedupe for Experiment/the bridge). References have no dedupe key —
-their derived id is validated at ingest and by the data-integrity tests, not
-here. Validation itself is delegated to ingest and is not retested here.
+stored-key dedupe for Experiment/the bridge, and import-time validation against
+the canonical JSON). References have no dedupe key; a derived id that collides
+with an existing one is rejected by validation.
 """
 
 import json
@@ -21,7 +21,7 @@ from django.core.management.base import CommandError
 from django.test import TransactionTestCase
 
 from ned_app.management import import_utils
-from ned_app.models import Component, Experiment, Reference
+from ned_app.models import Experiment, Reference
 
 TEMPLATE_DIR = 'resources/import_templates'
 
@@ -67,18 +67,28 @@ class ImportModelCommandTests(TransactionTestCase):
             f.write(content)
         return path
 
-    def _make_reference(self, reference_id='Smith-2020'):
-        return Reference.objects.create(
-            reference_id=reference_id,
-            study_type='Experiment',
-            comp_type='Sprinkler systems',
-            pdf_saved=True,
-            csl_data={
-                'type': 'article-journal',
-                'title': 'Seismic performance of CPVC sprinkler systems',
-                'author': [{'family': 'Smith', 'given': 'John'}],
-                'issued': {'date-parts': [[2020]]},
-            },
+    def _write_base_data(self):
+        # Canonical JSON for the Smith-2020 reference and the template's
+        # component, which imported experiments are validated against.
+        self._write_json(
+            'reference.json',
+            [
+                {
+                    'study_type': 'Experiment',
+                    'comp_type': 'Sprinkler systems',
+                    'pdf_saved': True,
+                    'csl_data': {
+                        'type': 'article-journal',
+                        'title': 'Seismic performance of CPVC sprinkler systems',
+                        'author': [{'family': 'Smith', 'given': 'John'}],
+                        'issued': {'date-parts': [[2020]]},
+                    },
+                }
+            ],
+        )
+        self._write_json(
+            'component.json',
+            [{'component_id': 'D.50.2.1.A', 'name': 'CPVC sprinkler pipe'}],
         )
 
     # -- Tier 1: keystone template -> import -> ingest ------------------
@@ -126,10 +136,7 @@ class ImportModelCommandTests(TransactionTestCase):
         )
 
     def test_experiment_template_imports_and_ingests(self):
-        self._make_reference()
-        Component.objects.create(
-            component_id='D.50.2.1.A', name='CPVC sprinkler pipe'
-        )
+        self._write_base_data()
 
         call_command(
             'import_model',
@@ -151,6 +158,7 @@ class ImportModelCommandTests(TransactionTestCase):
             'import_model',
             model='ExperimentFragilityModelBridge',
             input_file=_template('experiment_fragility_bridge_template.csv'),
+            no_validate=True,
             stdout=StringIO(),
         )
         records = self._read_json('experiment_fragility_model_bridge.json')
@@ -190,17 +198,69 @@ class ImportModelCommandTests(TransactionTestCase):
     # -- Tier 3: behaviors ---------------------------------------------
 
     def test_reference_rows_are_appended_without_dedupe(self):
-        # References have no dedupe key (reference_id is derived), so the importer
-        # is a pure converter: identical rows are appended, not collapsed.
+        # References have no dedupe key (reference_id is derived), so without
+        # validation the importer is a pure converter: identical rows are
+        # appended, not collapsed.
         header = 'study_type,pdf_saved,csl_type,csl_title,csl_year,csl_authors\n'
         row = 'Experiment,True,article-journal,A Title,2020,"Smith, John"\n'
         path = self._write_csv('dups.csv', header + row + row)
 
         out = StringIO()
-        call_command('import_model', model='Reference', input_file=path, stdout=out)
+        call_command(
+            'import_model',
+            model='Reference',
+            input_file=path,
+            no_validate=True,
+            stdout=out,
+        )
         self.assertEqual(len(self._read_json('reference.json')), 2)
         self.assertNotIn('duplicate', out.getvalue().lower())
 
+    def test_colliding_derived_reference_id_is_rejected(self):
+        # Validation rejects a reference whose derived id already exists, in
+        # the canonical JSON or earlier in the same CSV.
+        self._write_base_data()
+        header = 'study_type,pdf_saved,csl_type,csl_title,csl_year,csl_authors\n'
+        row = 'Experiment,True,article-journal,A Title,2020,"Smith, John"\n'
+        path = self._write_csv('dups.csv', header + row)
+
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_model',
+                model='Reference',
+                input_file=path,
+                stdout=StringIO(),
+                stderr=err,
+            )
+        self.assertIn("Row 2: reference_id: derives 'Smith-2020'", err.getvalue())
+        self.assertEqual(len(self._read_json('reference.json')), 1)
+
+    def test_invalid_experiment_rows_are_reported_and_nothing_written(self):
+        self._write_base_data()
+        with open(_template('experiment_template.csv'), encoding='utf-8') as f:
+            header, valid = f.read().splitlines()[:2]
+        unknown_ref = valid.replace('exp001,Smith-2020', 'exp002,Nobody-1999')
+        bad_edp = valid.replace('exp001', 'exp003').replace(',g,0.45,', ',g,lots,')
+        rows = [header, valid, unknown_ref, bad_edp]
+        path = self._write_csv('bad_exp.csv', '\n'.join(rows) + '\n')
+
+        err = StringIO()
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'import_model',
+                model='Experiment',
+                input_file=path,
+                stdout=StringIO(),
+                stderr=err,
+            )
+        self.assertIn('No records were imported', str(cm.exception))
+        errors = err.getvalue()
+        self.assertIn("Row 3: reference: unknown Reference 'Nobody-1999'", errors)
+        self.assertIn('Row 4: edp_value:', errors)
+        self.assertNotIn('Row 2:', errors)
+        self.assertFalse(os.path.exists(self._json_path('experiment.json')))
+
     def test_experiment_dedupe_by_stored_key(self):
         # Models with a stored natural key (Experiment id) still dedupe — against
         # the existing JSON and within the CSV — reported so no drop is silent.
@@ -214,7 +274,13 @@ class ImportModelCommandTests(TransactionTestCase):
         path = self._write_csv('dup_exp.csv', header + rows)
 
         out = StringIO()
-        call_command('import_model', model='Experiment', input_file=path, stdout=out)
+        call_command(
+            'import_model',
+            model='Experiment',
+            input_file=path,
+            no_validate=True,
+            stdout=out,
+        )
         value = out.getvalue()
         self.assertIn('already present', value)  # exp001
         self.assertIn('within this CSV', value)  # the second exp002
@@ -222,6 +288,88 @@ class ImportModelCommandTests(TransactionTestCase):
         ids = [r['id'] for r in self._read_json('experiment.json')]
         self.assertEqual(sorted(ids), ['exp001', 'exp002'])
 
+    def test_upsert_replaces_matching_records_and_reports_changes(self):
+        self._write_base_data()
+        template = _template('experiment_template.csv')
+        call_command(
+            'import_model',
+            model='Experiment',
+            input_file=template,
+            stdout=StringIO(),
+        )
+        with open(template, encoding='utf-8') as f:
+            header, row = f.read().splitlines()[:2]
+        edited = row.replace(',g,0.45,', ',g,0.5,')
+        added = row.replace('exp001', 'exp002')
+        path = self._write_csv(
+            'edits.csv', '\n'.join([header, edited, added]) + '\n'
+        )
+
+        out = StringIO()
+        call_command(
+            'import_model',
+            model='Experiment',
+            input_file=path,
+            mode='upsert',
+            stdout=out,
+        )
+        value = out.getvalue()
+        self.assertIn('Updated 1 record(s) in experiment.json:', value)
+        self.assertIn('  Row 2: exp001\n    edp_value: 0.45 -> 0.5\n', value)
+        self.assertIn('Appended 1 record(s) to experiment.json.', value)
+        records = {r['id']: r for r in self._read_json('experiment.json')}
+        self.assertEqual(list(records), ['exp001', 'exp002'])
+        self.assertEqual(records['exp001']['edp_value'], 0.5)
+
+    def test_merge_overwrites_only_filled_columns(self):
+        self._write_json(
+            'experiment.json',
+            [{'id': 'exp001', 'test_type': 'Static', 'edp_value': 0.45}],
+        )
+        path = self._write_csv('merge.csv', 'id,test_type,edp_value\nexp001,,0.5\n')
+        options = {
+            'model': 'Experiment',
+            'input_file': path,
+            'mode': 'merge',
+            'no_validate': True,
+        }
+
+        call_command('import_model', stdout=StringIO(), **options)
+        self.assertEqual(
+            self._read_json('experiment.json'),
+            [{'id': 'exp001', 'test_type': 'Static', 'edp_value': 0.5}],
+        )
+
+        out = StringIO()
+        call_command('import_model', stdout=out, **options)
+        self.assertIn('1 matching record(s) are already up to date', out.getvalue())
+
+    def test_merge_fills_reference_csl_fields_by_derived_id(self):
+        self._write_base_data()
+        path = self._write_csv(
+            'doi.csv',
+            'csl_authors,csl_year,csl_doi,study_type\n"Smith, John",2020,10.1/x,\n',
+        )
+        out = StringIO()
+        call_command(
+            'import_model',
+            model='Reference',
+            input_file=path,
+            mode='merge',
+            stdout=out,
+        )
+        self.assertIn(
+            'Row 2: Smith-2020\n    csl_data.DOI: (unset) -> "10.1/x"',
+            out.getvalue(),
+        )
+        [reference] = self._read_json('reference.json')
+        self.assertEqual(reference['csl_data']['DOI'], '10.1/x')
+        self.assertEqual(reference['study_type'], 'Experiment')
+        self.assertEqual(
+            reference['csl_data']['title'],
+            'Seismic performance of CPVC sprinkler systems',
+        )
+
     def test_dry_run_writes_nothing(self):
         call_command(
             'import_model',
@@ -264,15 +412,29 @@ class ImportModelCommandTests(TransactionTestCase):
 
     def test_non_numeric_csl_year_does_not_crash(self):
         # A non-numeric csl_year must convert (passing the raw value through)
-        # rather than crashing; ingest's CSL validation reports it later.
+        # rather than crashing; validation then reports it as a row error.
         header = 'study_type,pdf_saved,csl_type,csl_title,csl_year,csl_authors\n'
         row = 'Experiment,True,article-journal,A Title,in press,"Smith, John"\n'
         path = self._write_csv('badyear.csv', header + row)
 
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_model',
+                model='Reference',
+                input_file=path,
+                stdout=StringIO(),
+                stderr=err,
+            )
+        self.assertIn('Row 2: csl_data:', err.getvalue())
+
         call_command(
-            'import_model', model='Reference', input_file=path, stdout=StringIO()
+            'import_model',
+            model='Reference',
+            input_file=path,
+            no_validate=True,
+            stdout=StringIO(),
         )
-
         rec = self._read_json('reference.json')[0]
         self.assertEqual(rec['csl_data']['issued'], {'date-parts': [['in press']]})
 
@@ -293,3 +455,89 @@ class ImportModelCommandTests(TransactionTestCase):
             )
         self.assertIn('semicolon-delimited', str(cm.exception))
         self.assertFalse(os.path.exists(self._json_path('reference.json')))
+
+    # -- Batch imports ----------------------------------------------------
+
+    def test_templates_infer_their_models(self):
+        from ned_app.management.commands.import_model import _infer_model
+
+        templates = {
+            'reference_template.csv': 'Reference',
+            'experiment_template.csv': 'Experiment',
+            'experiment_fragility_bridge_template.csv': (
+                'ExperimentFragilityModelBridge'
+            ),
+        }
+        for template_name, model_name in templates.items():
+            columns, _ = import_utils.read_csv(_template(template_name))
+            self.assertEqual(_infer_model(columns), model_name, template_name)
+        self.assertIsNone(_infer_model(['nothing', 'known']))
+
+    def test_input_dir_applies_models_in_dependency_order_in_one_batch(self):
+        # The experiment refers to the reference imported in the same run, and
+        # the bridge to that experiment; files are named so that the directory
+        # order is the reverse of the dependency order.
+        self._write_json(
+            'component.json',
+            [{'component_id': 'D.50.2.1.A', 'name': 'CPVC sprinkler pipe'}],
+        )
+        self._write_json(
+            'fragility_model.json',
+            [{'reference': 'Smith-2020', 'model_id': 'fra001'}],
+        )
+        batch_dir = os.path.join(self.temp_dir, 'batch')
+        os.mkdir(batch_dir)
+        for name, template in (
+            ('a_bridge.csv', 'experiment_fragility_bridge_template.csv'),
+            ('b_experiment.csv', 'experiment_template.csv'),
+            ('c_reference.csv', 'reference_template.csv'),
+        ):
+            shutil.copy(_template(template), os.path.join(batch_dir, name))
+
+        out = StringIO()
+        with patch(
+            'ned_app.management.commands.import_model.append_json_files',
+            wraps=import_utils.append_json_files,
+        ) as append:
+            call_command('import_model', input_dir=batch_dir, stdout=out)
+
+        append.assert_called_once()
+        self.assertEqual(
+            list(append.call_args.args[0]),
+            [
+                'reference.json',
+                'experiment.json',
+                'experiment_fragility_model_bridge.json',
+            ],
+        )
+        self.assertEqual(len(self._read_json('reference.json')), 1)
+        self.assertEqual(self._read_json('experiment.json')[0]['id'], 'exp001')
+        self.assertEqual(
+            self._read_json('experiment_fragility_model_bridge.json'),
+            [{'experiment': 'exp001', 'fragility_model': 'Smith-2020|fra001'}],
+        )
+
+    def test_multiple_input_files_report_errors_by_file(self):
+        self._write_base_data()
+        bad = self._write_csv(
+            'bad.csv', 'id,reference,component\nexp009,Nobody-1999,D.50.2.1.A\n'
+        )
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_model',
+                input_file=[_template('experiment_template.csv'), bad],
+                stdout=StringIO(),
+                stderr=err,
+            )
+        self.assertIn(
+            f"{bad} row 2: reference: unknown Reference 'Nobody-1999'",
+            err.getvalue(),
+        )
+        self.assertFalse(os.path.exists(self._json_path('experiment.json')))
+
+    def test_uninferable_header_requires_model(self):
+        path = self._write_csv('mystery.csv', 'colour,size\nred,2\n')
+        with self.assertRaises(CommandError) as cm:
+            call_command('import_model', input_file=path, stdout=StringIO())
+        self.assertIn('Pass --model', str(cm.exception))
@@ -7,12 +7,14 @@ import json
 import os
 import shutil
 import tempfile
+import time
 from unittest.mock import patch
 
 from django.test import SimpleTestCase
 
 from ned_app.management import import_utils
 from ned_app.management.commands import import_model
+from ned_app.serialization import json_backend
 
 
 class CoerceValueTests(SimpleTestCase):
@@ -126,6 +128,45 @@ class ReadCsvTests(SimpleTestCase):
         self.assertEqual(columns, ['reference_id', 'study_type'])
         self.assertEqual(rows, [])
 
+    def test_chunks_carry_spreadsheet_row_numbers(self):
+        path = self._write('id\n' + ''.join(f'e{i}\n' for i in range(5)))
+        self.assertEqual(import_utils.read_csv_header(path), ['id'])
+        chunks = list(import_utils.read_csv_chunks(path, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[2], [(6, {'id': 'e4'})])
+
+    def test_header_only_yields_no_chunks(self):
+        path = self._write('id\n')
+        self.assertEqual(list(import_utils.read_csv_chunks(path)), [])
+
+
+class SpoolAndExternalSortTests(SimpleTestCase):
+    """Tests for import_utils.RecordSpool and external_sort."""
+
+    def test_spool_round_trips_values_in_order(self):
+        with import_utils.RecordSpool() as spool:
+            spool.append((2, {'a': 'é', 'b': None}))
+            spool.append((3, {'a': 0.1}))
+            self.assertEqual(len(spool), 2)
+            self.assertEqual(
+                list(spool), [[2, {'a': 'é', 'b': None}], [3, {'a': 0.1}]]
+            )
+            # Appending after a read continues at the end.
+            spool.append(4)
+            self.assertEqual(list(spool)[-1], 4)
+
+    def test_external_sort_is_stable_across_runs(self):
+        items = [
+            (key, position) for position, key in enumerate([3, 1, 2, 1, 3, 2, 1])
+        ]
+        result = list(
+            import_utils.external_sort(items, key=lambda item: item[0], chunk_size=2)
+        )
+        self.assertEqual(
+            result,
+            [[1, 1], [1, 3], [1, 6], [2, 2], [2, 5], [3, 0], [3, 4]],
+        )
+
 
 class ParseAuthorsTests(SimpleTestCase):
     """Tests for import_model._parse_authors CSL author parsing."""
@@ -276,6 +317,11 @@ class WriteJsonFilesTests(SimpleTestCase):
         with open(self._path(name), encoding='utf-8') as f:
             return json.load(f)
 
+    def _leftovers(self):
+        # The lock file stays, so that every process locks the same file.
+        names = set(os.listdir(self.temp_dir)) - {import_utils.LOCK_FILENAME}
+        return sorted(names)
+
     def test_writes_all_files_with_trailing_newline(self):
         import_utils.write_json_files({'a.json': [{'x': 1}], 'b.json': [{'y': 2}]})
         self.assertEqual(self._read('a.json'), [{'x': 1}])
@@ -330,6 +376,424 @@ class WriteJsonFilesTests(SimpleTestCase):
         self.assertEqual(self._read('a.json'), [{'x': 1}])
         self.assertFalse(os.path.exists(self._path('c.json')))
 
+    def test_targets_untouched_until_all_files_written(self):
+        import_utils.write_json_files({'a.json': [{'x': 1}], 'b.json': [{'y': 1}]})
+
+        real_dump = import_utils._dump_json
+        seen = []
+
+        def checking(filepath, data):
+            # Data goes to a hidden temp file beside the target, and the
+            # targets still hold their old contents while it is written.
+            self.assertNotIn(filepath, (self._path('a.json'), self._path('b.json')))
+            self.assertEqual(os.path.dirname(filepath), self.temp_dir)
+            self.assertEqual(self._read('a.json'), [{'x': 1}])
+            seen.append(filepath)
+            real_dump(filepath, data)
+
+        with (
+            patch.object(import_utils, '_dump_json', side_effect=checking),
+            patch.object(import_utils.shutil, 'copy2') as copy2,
+        ):
+            import_utils.write_json_files({
+                'a.json': [{'x': 2}],
+                'b.json': [{'y': 2}],
+            })
+
+        self.assertEqual(len(seen), 2)
+        copy2.assert_not_called()
+        self.assertEqual(self._read('a.json'), [{'x': 2}])
+        self.assertEqual(self._read('b.json'), [{'y': 2}])
+        self.assertEqual(self._leftovers(), ['a.json', 'b.json'])
+
+    def test_failure_while_publishing_restores_all_files(self):
+        import_utils.write_json_files({'a.json': [{'x': 1}]})
+
+        real_replace = os.replace
+
+        def flaky(src, dst):
+            if str(dst).endswith('c.json'):
+                raise OSError('disk full')
+            real_replace(src, dst)
+
+        with patch.object(import_utils.os, 'replace', side_effect=flaky):
+            with self.assertRaises(OSError):
+                import_utils.write_json_files({
+                    'a.json': [{'x': 2}],
+                    'c.json': [{'z': 2}],
+                })
+
+        self.assertEqual(self._read('a.json'), [{'x': 1}])
+        self.assertEqual(self._leftovers(), ['a.json'])
+
+
+class AppendJsonFilesTests(SimpleTestCase):
+    """Tests for import_utils.append_json_files in-place appends."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = patch(
+            'ned_app.management.import_utils.build_json_data_file_path',
+            side_effect=lambda name: os.path.join(self.temp_dir, name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, name, text):
+        with open(os.path.join(self.temp_dir, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _read_text(self, name):
+        with open(os.path.join(self.temp_dir, name), encoding='utf-8') as f:
+            return f.read()
+
+    def test_splice_matches_full_rewrite(self):
+        existing = [{'b': 1, 'a': 'x'}, {'a': 'y', 'nested': {'z': [1, 2]}}]
+        new = [{'id': 'é', 'value': 0.5}, {'a': None}]
+        for trailing in ('', '\n'):
+            with self.subTest(trailing=repr(trailing)):
+                # export_data leaves no trailing newline; _dump_json adds one.
+                self._write(
+                    'a.json',
+                    json.dumps(existing, indent=4, sort_keys=True) + trailing,
+                )
+                import_utils.append_json('a.json', new)
+                self.assertEqual(
+                    self._read_text('a.json'),
+                    json.dumps(existing + new, indent=4, sort_keys=True) + trailing,
+                )
+
+    def test_splice_does_not_parse_existing_file(self):
+        self._write('a.json', json.dumps([{'x': 1}], indent=4))
+        with patch.object(import_utils, 'load_json') as load:
+            import_utils.append_json('a.json', [{'x': 2}])
+        load.assert_not_called()
+        self.assertEqual(json.loads(self._read_text('a.json')), [{'x': 1}, {'x': 2}])
+
+    def test_non_canonical_and_missing_files_are_rewritten(self):
+        self._write('compact.json', json.dumps([{'x': 1}]))
+        self._write('empty.json', '[]')
+        import_utils.append_json_files({
+            'compact.json': [{'x': 2}],
+            'empty.json': [{'y': 1}],
+            'new.json': [{'z': 1}],
+        })
+        self.assertEqual(
+            self._read_text('compact.json'),
+            json.dumps([{'x': 1}, {'x': 2}], indent=4, sort_keys=True) + '\n',
+        )
+        self.assertEqual(json.loads(self._read_text('empty.json')), [{'y': 1}])
+        self.assertEqual(json.loads(self._read_text('new.json')), [{'z': 1}])
+
+    def test_records_may_come_from_a_generator(self):
+        self._write('a.json', json.dumps([{'x': 1}], indent=4, sort_keys=True))
+        import_utils.append_json_files({
+            'a.json': ({'x': n} for n in (2, 3)),
+            'b.json': (r for r in []),
+        })
+        self.assertEqual(
+            json.loads(self._read_text('a.json')), [{'x': 1}, {'x': 2}, {'x': 3}]
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'b.json')))
+
+    def test_failure_rolls_back_spliced_files(self):
+        canonical = json.dumps([{'x': 1}], indent=4, sort_keys=True)
+        self._write('a.json', canonical)
+        self._write('b.json', json.dumps([{'y': 1}]))
+
+        with patch.object(
+            import_utils, '_dump_json', side_effect=KeyboardInterrupt('interrupted')
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                import_utils.append_json_files({
+                    'a.json': [{'x': 2}],
+                    'b.json': [{'y': 2}],
+                })
+
+        self.assertEqual(self._read_text('a.json'), canonical)
+        self.assertEqual(json.loads(self._read_text('b.json')), [{'y': 1}])
+
+    def test_splice_writes_in_place_and_rolls_back_by_truncating(self):
+        canonical = json.dumps([{'x': 1}], indent=4, sort_keys=True)
+        self._write('a.json', canonical)
+        path = os.path.join(self.temp_dir, 'a.json')
+        inode = os.stat(path).st_ino
+
+        # Only the new records are written: the file is not copied.
+        with (
+            patch.object(import_utils.shutil, 'copyfile') as copyfile,
+            patch.object(import_utils.shutil, 'copy2') as copy2,
+        ):
+            import_utils.append_json('a.json', [{'x': 2}, {'x': 3}])
+        copyfile.assert_not_called()
+        copy2.assert_not_called()
+        self.assertEqual(os.stat(path).st_ino, inode)
+        appended = self._read_text('a.json')
+        self.assertEqual(json.loads(appended), [{'x': 1}, {'x': 2}, {'x': 3}])
+
+        # Interrupted mid-splice: the file gets its original bytes back.
+        real_dumps = import_utils.dumps_canonical
+        calls = []
+
+        def interrupt(data):
+            calls.append(data)
+            if len(calls) > 1:
+                raise KeyboardInterrupt
+            return real_dumps(data)
+
+        with patch.object(import_utils, 'dumps_canonical', side_effect=interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                import_utils.append_json('a.json', [{'x': 4}, {'x': 5}])
+        self.assertEqual(self._read_text('a.json'), appended)
+        self.assertEqual(
+            sorted(set(os.listdir(self.temp_dir)) - {import_utils.LOCK_FILENAME}),
+            ['a.json'],
+        )
+
+    def test_failed_rewrite_rolls_back_the_splices(self):
+        self._write('a.json', json.dumps([{'x': 1}], indent=4, sort_keys=True))
+        # Not in the canonical layout, so b.json is rewritten after a.json
+        # has been spliced.
+        self._write('b.json', '[{"x": 0}]')
+        before = self._read_text('a.json')
+        spliced = []
+
+        def fail(path, data, **kwargs):
+            spliced.append(self._read_text('a.json'))
+            raise OSError('disk full')
+
+        with patch.object(import_utils, '_dump_json', side_effect=fail):
+            with self.assertRaises(OSError):
+                import_utils.append_json_files({
+                    'a.json': [{'x': 2}],
+                    'b.json': [{'x': 3}],
+                })
+        self.assertEqual(json.loads(spliced[0]), [{'x': 1}, {'x': 2}])
+        self.assertEqual(self._read_text('a.json'), before)
+        self.assertEqual(self._read_text('b.json'), '[{"x": 0}]')
+
+    def test_replacements_rewrite_in_place_keeping_layout(self):
+        existing = [{'id': 'a', 'v': 1}, {'id': 'b', 'v': 2}]
+        self._write('a.json', json.dumps(existing, indent=4, sort_keys=True))
+        import_utils.append_json_files(
+            {'a.json': [{'id': 'c', 'v': 3}]},
+            replacements={'a.json': {1: {'id': 'b', 'v': 20}}},
+        )
+        # export_data's layout: no trailing newline, kept on rewrite.
+        self.assertEqual(
+            self._read_text('a.json'),
+            json.dumps(
+                [{'id': 'a', 'v': 1}, {'id': 'b', 'v': 20}, {'id': 'c', 'v': 3}],
+                indent=4,
+                sort_keys=True,
+            ),
+        )
+
+    def test_sharded_file_reads_and_writes_only_its_shards(self):
+        os.mkdir(os.path.join(self.temp_dir, 'experiment'))
+        self._write(
+            'experiment.json', json.dumps([{'id': 'e1', 'reference': 'A-2020'}])
+        )
+        self._write(
+            os.path.join('experiment', 'A-2020.json'),
+            json.dumps([{'id': 'e2', 'reference': 'A-2020'}]),
+        )
+        # The single file's records, then each shard's.
+        self.assertEqual(
+            [r['id'] for r in import_utils.load_json('experiment.json')],
+            ['e1', 'e2'],
+        )
+        self.assertEqual(
+            import_utils.load_positions('experiment.json'), {('e1',): 0, ('e2',): 1}
+        )
+
+        import_utils.append_json_files(
+            {
+                'experiment.json': [
+                    {'id': 'e3', 'reference': 'B-2021'},
+                    {'id': 'e4', 'reference': ''},  # cannot name a shard
+                ]
+            },
+            replacements={
+                'experiment.json': {1: {'id': 'e2', 'reference': 'A-2020', 'v': 1}}
+            },
+        )
+
+        def ids(name):
+            return [(r['id'], r.get('v')) for r in json.loads(self._read_text(name))]
+
+        self.assertEqual(ids('experiment.json'), [('e1', None), ('e4', None)])
+        self.assertEqual(ids(os.path.join('experiment', 'A-2020.json')), [('e2', 1)])
+        self.assertEqual(
+            ids(os.path.join('experiment', 'B-2021.json')), [('e3', None)]
+        )
+
+    def test_ndjson_file_gets_lines_appended_and_replaced(self):
+        line = json_backend.dumps_line
+        # The last line lacks its newline, as a hand edit might leave it.
+        self._write('a.ndjson', line({'id': 'a'}) + line({'id': 'b'}).rstrip('\n'))
+        self.assertEqual(
+            import_utils.load_json('a.json'), [{'id': 'a'}, {'id': 'b'}]
+        )
+        import_utils.append_json('a.json', [{'id': 'c', 'é': 1}])
+        self.assertEqual(
+            self._read_text('a.ndjson'),
+            line({'id': 'a'}) + line({'id': 'b'}) + line({'id': 'c', 'é': 1}),
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'a.json')))
+
+        import_utils.append_json_files(
+            {'a.json': []}, replacements={'a.json': {0: {'id': 'a', 'v': 1}}}
+        )
+        self.assertEqual(
+            self._read_text('a.ndjson').splitlines()[0],
+            line({'id': 'a', 'v': 1})[:-1],
+        )
+
+    def test_convert_data_file_round_trips_byte_for_byte(self):
+        records = [{'b': 1, 'a': 'é'}, {'nested': {'z': [1, 2.5, None]}}]
+        canonical = json.dumps(records, indent=4, sort_keys=True, ensure_ascii=True)
+        self._write('a.json', canonical)
+        json_path = os.path.join(self.temp_dir, 'a.json')
+        ndjson_path = os.path.join(self.temp_dir, 'a.ndjson')
+
+        self.assertEqual(import_utils.convert_data_file(json_path, ndjson_path), 2)
+        self.assertFalse(os.path.exists(json_path))
+        self.assertEqual(
+            self._read_text('a.ndjson'),
+            ''.join(json_backend.dumps_line(r) for r in records),
+        )
+
+        import_utils.convert_data_file(ndjson_path, json_path)
+        self.assertFalse(os.path.exists(ndjson_path))
+        self.assertEqual(self._read_text('a.json'), canonical)
+
+
+class ConcurrentImportTests(SimpleTestCase):
+    """Tests for data_lock and append_json_files' snapshot check."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = patch(
+            'ned_app.management.import_utils.build_json_data_file_path',
+            side_effect=lambda name: os.path.join(self.temp_dir, name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        import_utils.write_json('experiment.json', [{'id': 'exp1'}])
+
+    def _ids(self):
+        return [record['id'] for record in import_utils.load_json('experiment.json')]
+
+    def test_lock_excludes_other_holders_and_is_reentrant(self):
+        lock_path = os.path.join(self.temp_dir, import_utils.LOCK_FILENAME)
+        with import_utils.data_lock():
+            # Writes inside the lock take it again without blocking.
+            import_utils.append_json('experiment.json', [{'id': 'exp2'}])
+            with open(lock_path, 'a+b') as other:
+                self.assertFalse(import_utils._try_lock(other))
+            with patch.object(import_utils, '_held_locks', {}):
+                with self.assertRaises(TimeoutError):
+                    with import_utils.data_lock(timeout=0):
+                        pass
+        with open(lock_path, 'a+b') as other:
+            self.assertTrue(import_utils._try_lock(other))
+
+    def test_appends_are_rebased_onto_a_concurrent_change(self):
+        snapshot = import_utils.snapshot_data_files(['experiment.json'])
+        # Another import commits while this one is running.
+        import_utils.append_json('experiment.json', [{'id': 'exp2'}])
+        import_utils.append_json_files(
+            {'experiment.json': [{'id': 'exp3'}]}, expected=snapshot
+        )
+        self.assertEqual(self._ids(), ['exp1', 'exp2', 'exp3'])
+
+    def test_conflicting_appends_are_not_written(self):
+        snapshot = import_utils.snapshot_data_files(['experiment.json'])
+        import_utils.append_json('experiment.json', [{'id': 'exp2'}])
+        with self.assertRaises(import_utils.DataConflictError):
+            import_utils.append_json_files(
+                {'experiment.json': [{'id': 'exp3'}, {'id': 'exp2'}]},
+                expected=snapshot,
+            )
+        self.assertEqual(self._ids(), ['exp1', 'exp2'])
+
+    def test_replacements_need_an_unchanged_file(self):
+        snapshot = import_utils.snapshot_data_files(['experiment.json'])
+        import_utils.write_json('experiment.json', [{'id': 'exp0'}, {'id': 'exp1'}])
+        with self.assertRaises(import_utils.DataConflictError):
+            import_utils.append_json_files(
+                {},
+                replacements={'experiment.json': {0: {'id': 'exp1', 'x': 1}}},
+                expected=snapshot,
+            )
+        self.assertEqual(self._ids(), ['exp0', 'exp1'])
+
+        # Without a concurrent change the snapshot does not get in the way.
+        snapshot = import_utils.snapshot_data_files(['experiment.json'])
+        import_utils.append_json_files(
+            {'experiment.json': [{'id': 'exp2'}]},
+            replacements={'experiment.json': {1: {'id': 'exp1', 'x': 1}}},
+            expected=snapshot,
+        )
+        self.assertEqual(self._ids(), ['exp0', 'exp1', 'exp2'])
+
+    def test_snapshot_reads_only_recently_modified_files(self):
+        path = os.path.join(self.temp_dir, 'experiment.json')
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        with patch.object(import_utils, '_sha1_file') as sha1:
+            snapshot = import_utils.snapshot_data_files(['experiment.json'])
+            import_utils.append_json_files(
+                {'experiment.json': [{'id': 'exp2'}]}, expected=snapshot
+            )
+        sha1.assert_not_called()
+        self.assertEqual(self._ids(), ['exp1', 'exp2'])
+
+    def test_snapshot_hashes_files_whose_stamp_is_racy(self):
+        # Rewritten in place with the same size and mtime: only the digest
+        # taken while the stamp was racy shows the change.
+        path = os.path.join(self.temp_dir, 'experiment.json')
+        snapshot = import_utils.snapshot_data_files(['experiment.json'])
+        stat = os.stat(path)
+        with open(path, 'r+b') as f:
+            text = f.read().replace(b'exp1', b'expX')
+            f.seek(0)
+            f.write(text)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with self.assertRaises(import_utils.DataConflictError):
+            import_utils.append_json_files(
+                {},
+                replacements={'experiment.json': {0: {'id': 'exp1', 'x': 1}}},
+                expected=snapshot,
+            )
+
+
+class UpdateRecordTests(SimpleTestCase):
+    """Tests for import_utils.update_record."""
+
+    existing = {
+        'id': 'exp001',
+        'notes': 'old',
+        'csl_data': {'title': 'T', 'DOI': '10.1/a'},
+    }
+
+    def test_upsert_replaces_record(self):
+        changes = {'id': 'exp001', 'notes': 'new'}
+        self.assertEqual(
+            import_utils.update_record(self.existing, changes, 'upsert'), changes
+        )
+
+    def test_merge_overwrites_given_fields_and_nested_keys(self):
+        merged = import_utils.update_record(
+            self.existing, {'csl_data': {'DOI': '10.1/b'}}, 'merge'
+        )
+        self.assertEqual(merged['notes'], 'old')
+        self.assertEqual(merged['csl_data'], {'title': 'T', 'DOI': '10.1/b'})
+        self.assertEqual(self.existing['csl_data']['DOI'], '10.1/a')
+
 
 class LooksSemicolonDelimitedTests(SimpleTestCase):
     """Tests for import_utils.looks_semicolon_delimited detection."""
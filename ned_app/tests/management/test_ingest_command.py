@@ -7,15 +7,20 @@ import tempfile
 import json
 from io import StringIO
 from unittest.mock import patch
-from django.test import SimpleTestCase, TransactionTestCase
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.conf import settings
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from ned_app.management.commands.ingest import _format_errors
+from ned_app.management.dataset_versions import (
+    dataset_cache_key,
+    latest_dataset_version,
+)
 from ned_app.models import (
     Component,
+    DatasetVersion,
     Reference,
     Experiment,
     FragilityModel,
@@ -398,6 +403,141 @@ class IngestCommandTests(TransactionTestCase):
             self.assertEqual(Component.objects.count(), 1)
             self.assertEqual(FragilityModel.objects.count(), 0)
 
+    def test_ingest_records_dataset_fingerprint(self):
+        """A successful ingest records a fingerprint of its data files."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, 'component.json'), 'w') as f:
+                json.dump([{'component_id': 'B.20.1.1.A', 'name': 'Walls'}], f)
+
+            def mock_build_path(filename):
+                return os.path.join(temp_dir, filename)
+
+            with (
+                override_settings(NED_CACHE_DIR=os.path.join(temp_dir, 'cache')),
+                patch(
+                    'ned_app.management.commands.ingest.build_json_data_file_path',
+                    side_effect=mock_build_path,
+                ),
+            ):
+                call_command('ingest', stdout=StringIO())
+                first = latest_dataset_version()
+                call_command('ingest', stdout=StringIO())
+                # Unchanged data keeps the version, so cached results stay.
+                self.assertEqual(latest_dataset_version(), first)
+
+                with open(os.path.join(temp_dir, 'component.json'), 'w') as f:
+                    f.write('[{"component_id": "B.20.1.1.A",}]')
+                with self.assertRaises(CommandError):
+                    call_command('ingest', stdout=StringIO(), stderr=StringIO())
+                # A failed ingest that changed nothing records no version.
+                self.assertEqual(latest_dataset_version(), first)
+            self.assertEqual(len(first.fingerprint), 64)
+
+    def test_ingest_records_dataset_versions_and_prunes(self):
+        """Each changing run records a version with its created/updated/deleted keys."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            component_file = os.path.join(temp_dir, 'component.json')
+
+            def ingest(components, **options):
+                with open(component_file, 'w') as f:
+                    json.dump(components, f)
+                with patch(
+                    'ned_app.management.commands.ingest.build_json_data_file_path',
+                    side_effect=lambda filename: os.path.join(temp_dir, filename),
+                ):
+                    call_command('ingest', stdout=StringIO(), **options)
+
+            def changes(version):
+                return sorted(
+                    (change.change_type, change.natural_key['component_id'])
+                    for change in version.changes.all()
+                )
+
+            walls = {'component_id': 'B.20.1.1.A', 'name': 'Walls'}
+            pipe = {'component_id': 'D.50.2.1.A', 'name': 'Pipe'}
+            ingest([walls, pipe])
+            first = DatasetVersion.objects.get()
+            self.assertEqual(
+                changes(first),
+                [('created', 'B.20.1.1.A'), ('created', 'D.50.2.1.A')],
+            )
+
+            # An unchanged re-ingest records no new version.
+            ingest([walls, pipe])
+            self.assertEqual(DatasetVersion.objects.count(), 1)
+
+            ingest([{**walls, 'name': 'Exterior walls'}, pipe])
+            second = DatasetVersion.objects.latest('pk')
+            self.assertGreater(second.pk, first.pk)
+            self.assertEqual(changes(second), [('updated', 'B.20.1.1.A')])
+
+            # Without --prune a record missing from the file is kept.
+            ingest([pipe])
+            self.assertEqual(Component.objects.count(), 2)
+            ingest([pipe], prune=True)
+            self.assertEqual(
+                list(Component.objects.values_list('component_id', flat=True)),
+                ['D.50.2.1.A'],
+            )
+            third = DatasetVersion.objects.latest('pk')
+            self.assertEqual(changes(third), [('deleted', 'B.20.1.1.A')])
+
+    def test_dataset_version_records_what_the_database_was_built_from(self):
+        """A version holds the data fingerprint, row counts and run time."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            component_file = os.path.join(temp_dir, 'component.json')
+            walls = {'component_id': 'B.20.1.1.A', 'name': 'Walls'}
+
+            def ingest(text):
+                with open(component_file, 'w') as f:
+                    f.write(text)
+                with (
+                    override_settings(NED_CACHE_DIR=os.path.join(temp_dir, 'cache')),
+                    patch(
+                        'ned_app.management.commands.ingest.build_json_data_file_path',
+                        side_effect=lambda filename: os.path.join(
+                            temp_dir, filename
+                        ),
+                    ),
+                ):
+                    call_command('ingest', stdout=StringIO(), stderr=StringIO())
+                    return latest_dataset_version().fingerprint
+
+            self.assertEqual(dataset_cache_key(), 'v0')
+            fingerprint = ingest(json.dumps([walls]))
+            version = latest_dataset_version()
+            self.assertEqual(version.fingerprint, fingerprint)
+            self.assertEqual(version.source, temp_dir)
+            self.assertEqual(version.git_commit, '')
+            self.assertEqual(
+                DatasetVersion.objects.get().row_counts,
+                {
+                    'Reference': 0,
+                    'Component': 1,
+                    'FragilityModel': 0,
+                    'ComponentFragilityModelBridge': 0,
+                    'Experiment': 0,
+                    'ExperimentFragilityModelBridge': 0,
+                    'FragilityCurve': 0,
+                },
+            )
+            self.assertGreater(version.duration.total_seconds(), 0)
+            key = dataset_cache_key()
+            self.assertEqual(key, f'v{version.pk}-{fingerprint[:16]}')
+
+            # Reformatted files change no rows, but are different data files.
+            ingest(json.dumps([walls], indent=4))
+            self.assertEqual(DatasetVersion.objects.count(), 2)
+            self.assertNotEqual(dataset_cache_key(), key)
+            key = dataset_cache_key()
+            ingest(json.dumps([walls], indent=4))
+            self.assertEqual(dataset_cache_key(), key)
+
+            # A failed run that changed rows is recorded without a fingerprint.
+            with self.assertRaises(CommandError):
+                ingest(json.dumps([{**walls, 'name': 'Exterior walls'}, {}]))
+            self.assertTrue(dataset_cache_key().endswith('-partial'))
+
     def test_ingest_handles_corrupt_json(self):
         """Test that the command handles corrupt JSON files gracefully."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -947,6 +1087,149 @@ class IngestCommandTests(TransactionTestCase):
             self.assertTrue(Experiment.objects.filter(id='exp-good').exists())
             self.assertFalse(Experiment.objects.filter(id='exp-bad').exists())
 
+    def test_ingest_reads_sharded_experiments(self):
+        """Experiments are read from experiment.json and experiment/*.json/.ndjson."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            experiment = {
+                'reference': 'Smith-2020',
+                'component': 'B.20.1.1.A',
+                'test_type': 'Quasi-static Cyclic, uniaxial',
+                'comp_description': 'Sharded experiment',
+                'ds_description': 'Cracking',
+                'edp_metric': 'Story Drift Ratio',
+                'edp_unit': 'Ratio',
+                'edp_value': '0.025',
+                'ds_class': 'Consequential',
+            }
+            files_data = {
+                'reference.json': [
+                    {
+                        'study_type': 'Experiment',
+                        'csl_data': {
+                            'type': 'article-journal',
+                            'title': 'Shard Test Reference',
+                            'author': [{'family': 'Smith', 'given': 'John'}],
+                            'issued': {'date-parts': [[2020]]},
+                        },
+                    },
+                ],
+                'component.json': [
+                    {'component_id': 'B.20.1.1.A', 'name': 'CFS Exterior Walls'},
+                ],
+                'experiment.json': [{'id': 'exp-legacy', **experiment}],
+                os.path.join('experiment', 'Smith-2020.ndjson'): [
+                    {'id': 'exp-ndjson', **experiment}
+                ],
+                os.path.join('experiment', 'Smith-2020.json'): [
+                    {'id': 'exp-shard', **experiment}
+                ],
+            }
+            os.mkdir(os.path.join(temp_dir, 'experiment'))
+            for filename, data in files_data.items():
+                with open(os.path.join(temp_dir, filename), 'w') as f:
+                    if filename.endswith('.ndjson'):
+                        f.writelines(json.dumps(r) + '\n' for r in data)
+                    else:
+                        json.dump(data, f)
+
+            with patch(
+                'ned_app.management.commands.ingest.build_json_data_file_path',
+                side_effect=lambda filename: os.path.join(temp_dir, filename),
+            ):
+                call_command('ingest', stdout=StringIO(), stderr=StringIO())
+
+            self.assertEqual(
+                sorted(Experiment.objects.values_list('id', flat=True)),
+                ['exp-legacy', 'exp-ndjson', 'exp-shard'],
+            )
+
+    def test_incremental_ingest_skips_unchanged_files(self):
+        """--incremental loads only the files changed since the latest version."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            experiment = {
+                'component': 'B.20.1.1.A',
+                'test_type': 'Quasi-static Cyclic, uniaxial',
+                'comp_description': 'Sharded experiment',
+                'ds_description': 'Cracking',
+                'edp_metric': 'Story Drift Ratio',
+                'edp_unit': 'Ratio',
+                'edp_value': '0.025',
+                'ds_class': 'Consequential',
+            }
+            smith = {'id': 'exp-smith', 'reference': 'Smith-2020', **experiment}
+            doe = {'id': 'exp-doe', 'reference': 'Doe-2021', **experiment}
+
+            def write(filename, data):
+                with open(os.path.join(temp_dir, filename), 'w') as f:
+                    json.dump(data, f)
+
+            write(
+                'reference.json',
+                [
+                    {
+                        'study_type': 'Experiment',
+                        'csl_data': {
+                            'type': 'article-journal',
+                            'title': title,
+                            'author': [{'family': family, 'given': 'J.'}],
+                            'issued': {'date-parts': [[year]]},
+                        },
+                    }
+                    for title, family, year in [
+                        ('First', 'Smith', 2020),
+                        ('Second', 'Doe', 2021),
+                    ]
+                ],
+            )
+            write(
+                'component.json', [{'component_id': 'B.20.1.1.A', 'name': 'Walls'}]
+            )
+            os.mkdir(os.path.join(temp_dir, 'experiment'))
+            write(os.path.join('experiment', 'Smith-2020.json'), [smith])
+            write(
+                os.path.join('experiment', 'Doe-2021.json'),
+                [doe, {**doe, 'id': 'exp-doe-2'}],
+            )
+
+            def ingest(**options):
+                out = StringIO()
+                with patch(
+                    'ned_app.management.commands.ingest.build_json_data_file_path',
+                    side_effect=lambda filename: os.path.join(temp_dir, filename),
+                ):
+                    call_command('ingest', stdout=out, incremental=True, **options)
+                return out.getvalue()
+
+            ingest()
+            self.assertEqual(
+                sorted(latest_dataset_version().file_digests),
+                [
+                    'component.json',
+                    'experiment/Doe-2021.json',
+                    'experiment/Smith-2020.json',
+                    'reference.json',
+                ],
+            )
+            # Edited in the database since: kept, as the file is unchanged.
+            Experiment.objects.filter(id='exp-smith').update(notes='edited')
+
+            write(
+                os.path.join('experiment', 'Doe-2021.json'),
+                [{**doe, 'comp_description': 'Changed'}],
+            )
+            output = ingest(prune=True)
+            self.assertEqual(output.count('Skipping 1 unchanged file(s).'), 3)
+            self.assertIn(
+                'Experiment processing complete: 0 created, 1 updated', output
+            )
+            self.assertEqual(
+                dict(Experiment.objects.values_list('id', 'notes')),
+                {'exp-doe': '', 'exp-smith': 'edited'},
+            )
+            self.assertEqual(
+                Experiment.objects.get(id='exp-doe').comp_description, 'Changed'
+            )
+
     def test_ingest_handles_empty_data_directory(self):
         """Test that the command handles empty data directory (no files found) gracefully."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -1,22 +1,28 @@
 """
 Tests for the query_to_csv management command, including the foreign-key
-natural-key fix, filter parsing, field selection, friendly errors, and the
-no-truncate-on-empty-result behavior.
+natural-key fix, filter parsing, field selection (including related-field
+paths), friendly errors, and the no-truncate-on-empty-result behavior.
 """
 
 import csv
+import gzip
+import importlib.util
 import json
 import os
 import shutil
 import tempfile
 from decimal import Decimal
 from io import StringIO
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
 
+from django.contrib.auth.models import User
 from django.core.management import call_command
 from django.core.management.base import CommandError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from ned_app.models import Component, Experiment, Reference
+from ned_app.models import Component, DatasetVersion, Experiment, Reference
+from ned_app.signals import cache_invalidation_suspended
 
 
 class QueryToCsvCommandTests(TestCase):
@@ -84,6 +90,33 @@ class QueryToCsvCommandTests(TestCase):
         self.assertEqual(rows['exp001']['reference'], 'Smith-2020')
         self.assertEqual(rows['exp001']['component'], 'D.50.2.1.A')
 
+    # -- streaming export ----------------------------------------------
+
+    def test_export_is_a_single_query(self):
+        # The first row is pulled from the streaming iterator instead of a
+        # separate exists()/count(), so the whole export is one SELECT.
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                stdout=out,
+            )
+        self.assertIn('Exported 2 rows', out.getvalue())
+        self.assertEqual(len(self._read_rows()), 2)
+
+    def test_reverse_relation_field_exports_empty_column(self):
+        call_command(
+            'query_to_csv',
+            model='Reference',
+            output_file=self.output_file,
+            fields='reference_id,experiment',
+            stdout=StringIO(),
+        )
+        row = self._read_rows()[0]
+        self.assertEqual(row, {'reference_id': 'Smith-2020', 'experiment': ''})
+
     # -- field selection / filtering -----------------------------------
 
     def test_fields_selection_limits_columns(self):
@@ -122,6 +155,408 @@ class QueryToCsvCommandTests(TestCase):
         self.assertEqual(len(rows), 1)
         self.assertEqual(rows[0]['id'], 'exp002')
 
+    # -- related-field columns -----------------------------------------
+
+    def test_related_field_paths_export_joined_values(self):
+        with self.assertNumQueries(1):
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                fields='id,component__name,reference__title,reference__year',
+                stdout=StringIO(),
+            )
+        row = {r['id']: r for r in self._read_rows()}['exp001']
+        self.assertEqual(row['component__name'], 'CPVC sprinkler pipe')
+        self.assertEqual(row['reference__title'], 'A Title')
+        self.assertEqual(row['reference__year'], '2020')
+
+    def test_many_valued_related_path_is_rejected(self):
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'query_to_csv',
+                model='Reference',
+                output_file=self.output_file,
+                fields='reference_id,experiment__material',
+                stderr=StringIO(),
+            )
+        self.assertIn("Invalid field 'experiment__material'", str(cm.exception))
+        self.assertFalseFileWritten()
+
+    def test_unknown_related_field_reports_friendly_error(self):
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                fields='id,component__bogus',
+                stderr=StringIO(),
+            )
+        self.assertIn("Field 'component__bogus' does not exist", str(cm.exception))
+
+    def _export_ids(self, filter_text):
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=self.output_file,
+            fields='id',
+            filter=filter_text,
+            stdout=StringIO(),
+        )
+        return sorted(r['id'] for r in self._read_rows())
+
+    def test_filter_lookups(self):
+        self._make_experiment('exp003', material='Steel', notes='')
+        Experiment.objects.filter(id='exp003').update(edp_value=Decimal('0.05'))
+
+        self.assertEqual(self._export_ids('edp_value__lt=0.1'), ['exp003'])
+        self.assertEqual(
+            self._export_ids('material__icontains=stee'), ['exp001', 'exp003']
+        )
+        self.assertEqual(
+            self._export_ids('id__in=exp001;exp002'), ['exp001', 'exp002']
+        )
+
+    def test_filter_or_and_negation(self):
+        self.assertEqual(
+            self._export_ids('material=Steel|notes=ratio=0.5'), ['exp001', 'exp002']
+        )
+        self.assertEqual(self._export_ids('material!=Steel'), ['exp002'])
+        self.assertEqual(
+            self._export_ids('!(material=Steel|material=CPVC),id=exp001|id=exp002'),
+            ['exp002'],
+        )
+
+    def test_filter_on_related_field_is_one_query(self):
+        with self.assertNumQueries(1):
+            ids = self._export_ids(
+                'component__name__startswith=CPVC,reference__year=2020'
+            )
+        self.assertEqual(ids, ['exp001', 'exp002'])
+
+    def test_filter_with_invalid_value_reports_friendly_error(self):
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                filter='edp_value__gte=abc',
+                stderr=StringIO(),
+            )
+        self.assertIn('Invalid filter', str(cm.exception))
+        self.assertFalseFileWritten()
+
+    # -- aggregation mode ----------------------------------------------
+
+    def test_group_by_with_native_aggregates(self):
+        self._make_experiment('exp003', material='Steel', notes='')
+        Experiment.objects.filter(id='exp003').update(edp_value=Decimal('0.15'))
+
+        with self.assertNumQueries(1):
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                group_by='material,component',
+                agg='count,min,max:edp_value',
+                stdout=StringIO(),
+            )
+        rows = self._read_rows()
+        self.assertEqual(
+            list(rows[0]),
+            ['material', 'component', 'count', 'min_edp_value', 'max_edp_value'],
+        )
+        by_material = {r['material']: r for r in rows}
+        self.assertEqual(by_material['Steel']['count'], '2')
+        self.assertEqual(by_material['Steel']['component'], 'D.50.2.1.A')
+        self.assertEqual(
+            Decimal(by_material['Steel']['min_edp_value']), Decimal('0.15')
+        )
+        self.assertEqual(
+            Decimal(by_material['Steel']['max_edp_value']), Decimal('0.45')
+        )
+        self.assertEqual(by_material['CPVC']['count'], '1')
+
+    def test_quantiles_computed_in_streaming_pass(self):
+        for exp_id, value in (('exp003', '0.10'), ('exp004', '0.20')):
+            self._make_experiment(exp_id, material='Steel', notes='')
+            Experiment.objects.filter(id=exp_id).update(edp_value=Decimal(value))
+
+        with self.assertNumQueries(2):
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=self.output_file,
+                group_by='material',
+                agg='count,median,p25:edp_value',
+                filter='material=Steel',
+                stdout=StringIO(),
+            )
+        (row,) = self._read_rows()
+        # Steel edp_values: 0.10, 0.20, 0.45
+        self.assertEqual(row['count'], '3')
+        self.assertAlmostEqual(float(row['median_edp_value']), 0.20)
+        self.assertAlmostEqual(float(row['p25_edp_value']), 0.15)
+
+    def test_aggregate_without_group_by_summarizes_table(self):
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=self.output_file,
+            agg='count,avg:edp_value',
+            stdout=StringIO(),
+        )
+        (row,) = self._read_rows()
+        self.assertEqual(row['count'], '2')
+        self.assertAlmostEqual(float(row['avg_edp_value']), 0.45)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_decimal_averages_are_the_same_floats_in_csv_and_parquet(self):
+        import pyarrow.parquet as pq
+
+        self._make_experiment('exp003', material='Steel', notes='')
+        Experiment.objects.filter(id='exp003').update(edp_value=Decimal('0.15'))
+        options = {'model': 'Experiment', 'agg': 'avg,stddev:edp_value'}
+        call_command(
+            'query_to_csv',
+            output_file=self.output_file,
+            stdout=StringIO(),
+            **options,
+        )
+        path = os.path.join(self.temp_dir, 'out.parquet')
+        call_command(
+            'query_to_csv',
+            output_file=path,
+            format='parquet',
+            stdout=StringIO(),
+            **options,
+        )
+        (row,) = self._read_rows()
+        (expected,) = pq.read_table(path).to_pylist()
+        # Floats, not Decimals printed with SQLite's 15 digits.
+        self.assertEqual(
+            row,
+            {column: repr(value) for column, value in expected.items()},
+        )
+        self.assertAlmostEqual(expected['avg_edp_value'], 0.35)
+
+    def test_group_by_rejects_fields_and_bad_aggregates(self):
+        for options in (
+            {'group_by': 'material', 'fields': 'id'},
+            {'group_by': 'material', 'agg': 'avg'},
+            {'group_by': 'material', 'agg': 'mode:edp_value'},
+            {'agg': 'median:material'},
+            {'agg': 'sum:component'},
+            {'group_by': 'bogus_field'},
+        ):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'query_to_csv',
+                        model='Experiment',
+                        output_file=self.output_file,
+                        stderr=StringIO(),
+                        **options,
+                    )
+        self.assertFalseFileWritten()
+
+    # -- output formats, compression and stdout ------------------------
+
+    def test_ndjson_output_keeps_json_and_numbers_typed(self):
+        path = os.path.join(self.temp_dir, 'out.ndjson')
+        call_command(
+            'query_to_csv',
+            model='Reference',
+            output_file=path,
+            fields='reference_id,year,csl_data',
+            format='ndjson',
+            stdout=StringIO(),
+        )
+        with open(path, 'rb') as f:
+            content = f.read()
+        self.assertFalse(content.startswith(b'\xef\xbb\xbf'))
+        (record,) = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(record['reference_id'], 'Smith-2020')
+        self.assertEqual(record['year'], 2020)
+        self.assertEqual(record['csl_data']['title'], 'A Title')
+
+    def test_ndjson_decimal_values_are_numbers(self):
+        path = os.path.join(self.temp_dir, 'out.ndjson')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=path,
+            fields='id,edp_value',
+            filter='id=exp001',
+            format='ndjson',
+            stdout=StringIO(),
+        )
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.read())['edp_value'], 0.45)
+
+    def test_gz_suffix_compresses_output(self):
+        path = os.path.join(self.temp_dir, 'out.csv.gz')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=path,
+            fields='id,material',
+            stdout=StringIO(),
+        )
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(sorted(r['id'] for r in rows), ['exp001', 'exp002'])
+
+    def test_dash_streams_to_stdout_with_status_on_stderr(self):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file='-',
+            fields='id',
+            filter='id=exp001',
+            stdout=out,
+            stderr=err,
+        )
+        self.assertEqual(out.getvalue().splitlines(), ['id', 'exp001'])
+        self.assertIn('Exported 1 rows to stdout', err.getvalue())
+
+    def test_parquet_rejects_gz_suffix(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=os.path.join(self.temp_dir, 'out.parquet.gz'),
+                format='parquet',
+                stderr=StringIO(),
+            )
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_output(self):
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.temp_dir, 'out.parquet')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=path,
+            fields='id,edp_value,alt_edp_value',
+            format='parquet',
+            stdout=StringIO(),
+        )
+        table = pq.read_table(path).to_pydict()
+        self.assertEqual(sorted(table['id']), ['exp001', 'exp002'])
+        self.assertEqual(table['edp_value'], [0.45, 0.45])
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    @patch('ned_app.management.query_utils._PARQUET_BATCH_SIZE', 1)
+    def test_parquet_types_come_from_the_model_not_the_first_batch(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # exp001 comes first, with no alt_edp_value: its batch is all null.
+        Experiment.objects.filter(id='exp002').update(alt_edp_value=Decimal('0.3'))
+        path = os.path.join(self.temp_dir, 'out.parquet')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=path,
+            fields='id,alt_edp_value,ds_rank,reference__pdf_saved',
+            format='parquet',
+            stdout=StringIO(),
+        )
+        table = pq.read_table(path)
+        self.assertEqual(table.schema.field('alt_edp_value').type, pa.float64())
+        self.assertEqual(table.schema.field('ds_rank').type, pa.int64())
+        self.assertEqual(table.schema.field('reference__pdf_saved').type, pa.bool_())
+        values = dict(
+            zip(table['id'].to_pylist(), table['alt_edp_value'].to_pylist())
+        )
+        self.assertEqual(values, {'exp001': None, 'exp002': 0.3})
+
+    @skipIf(importlib.util.find_spec('pyarrow'), 'pyarrow is installed')
+    def test_parquet_without_pyarrow_reports_friendly_error(self):
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'query_to_csv',
+                model='Experiment',
+                output_file=os.path.join(self.temp_dir, 'out.parquet'),
+                format='parquet',
+                stderr=StringIO(),
+            )
+        self.assertIn('pyarrow', str(cm.exception))
+
+    # -- partitioned export --------------------------------------------
+
+    def test_partitions_write_parts_and_manifest(self):
+        self._make_experiment('exp003', material='Steel', notes='third')
+        out = StringIO()
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=self.output_file,
+            fields='id,material',
+            partitions=2,
+            stdout=out,
+        )
+        directory = f'{self.output_file}.parts'
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['rows'], 3)
+        self.assertEqual(
+            [part['file'] for part in manifest['parts']],
+            ['part-00000.csv', 'part-00001.csv'],
+        )
+        ids = []
+        for part in manifest['parts']:
+            path = os.path.join(directory, part['file'])
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), part['rows'])
+            ids.extend(r['id'] for r in rows)
+        self.assertEqual(ids, ['exp001', 'exp002', 'exp003'])
+        self.assertIn('Exported 3 rows to 2 parts', out.getvalue())
+        self.assertFalse(os.path.exists(self.output_file))
+
+    def test_partitions_concat_matches_single_export(self):
+        self._make_experiment('exp003', material='Steel', notes='third')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=self.output_file,
+            filter='material=Steel',
+            partitions=3,
+            concat=True,
+            stdout=StringIO(),
+        )
+        self.assertFalse(os.path.exists(f'{self.output_file}.parts'))
+        with open(self.output_file, 'rb') as f:
+            concatenated = f.read()
+
+        single = os.path.join(self.temp_dir, 'single.csv')
+        call_command(
+            'query_to_csv',
+            model='Experiment',
+            output_file=single,
+            filter='material=Steel',
+            stdout=StringIO(),
+        )
+        with open(single, 'rb') as f:
+            self.assertEqual(concatenated, f.read())
+
+    def test_partitions_reject_stdout_and_summary_mode(self):
+        for extra in ({'output_file': '-'}, {'group_by': 'material'}):
+            options = {'output_file': self.output_file, **extra}
+            with self.assertRaises(CommandError):
+                call_command(
+                    'query_to_csv',
+                    model='Experiment',
+                    partitions=2,
+                    stdout=StringIO(),
+                    stderr=StringIO(),
+                    **options,
+                )
+
     # -- friendly error handling ---------------------------------------
 
     def test_invalid_filter_field_reports_friendly_error(self):
@@ -218,3 +653,152 @@ class QueryToCsvCommandTests(TestCase):
         )
         with open(self.output_file, 'rb') as f:
             self.assertEqual(f.read(3), b'\xef\xbb\xbf')
+
+
+class SavedQueryTests(TestCase):
+    """Tests for query_to_csv --saved and its result cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.output_file = os.path.join(self.temp_dir, 'out.csv')
+
+        settings_override = override_settings(
+            NED_CACHE_DIR=os.path.join(self.temp_dir, 'cache')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        registry = os.path.join(self.temp_dir, 'saved_queries.json')
+        with open(registry, 'w') as f:
+            json.dump(
+                {
+                    'components': {
+                        'description': 'Component names',
+                        'fields': 'component_id,name',
+                        'model': 'Component',
+                    },
+                },
+                f,
+            )
+        registry_patch = patch(
+            'ned_app.management.saved_queries.SAVED_QUERIES_FILE', registry
+        )
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+
+        Component.objects.create(component_id='D.50.2.1.A', name='Sprinkler pipe')
+        self._ingested('1' * 64)
+
+    def _ingested(self, fingerprint):
+        # Stand in for ingest, which records a dataset version.
+        DatasetVersion.objects.create(fingerprint=fingerprint)
+
+    def _run(self, **options):
+        out = StringIO()
+        call_command(
+            'query_to_csv',
+            saved='components',
+            output_file=self.output_file,
+            stdout=out,
+            **options,
+        )
+        with open(self.output_file, 'rb') as f:
+            return out.getvalue(), f.read()
+
+    def test_repeat_run_is_served_from_cache(self):
+        first_message, first = self._run()
+        self.assertNotIn('(cached)', first_message)
+        # Only the dataset version is read.
+        with self.assertNumQueries(1):
+            message, cached = self._run()
+        self.assertIn('Exported 1 rows', message)
+        self.assertIn('(cached)', message)
+        self.assertEqual(cached, first)
+
+    def test_cached_result_matches_fresh_gz_and_stdout_output(self):
+        self._run()
+        for output_file in (os.path.join(self.temp_dir, 'out.csv.gz'), '-'):
+            cached_out, fresh_out = StringIO(), StringIO()
+            call_command(
+                'query_to_csv',
+                saved='components',
+                output_file=output_file,
+                stdout=cached_out,
+                stderr=StringIO(),
+            )
+            cached = self._read_output(output_file, cached_out)
+            call_command(
+                'query_to_csv',
+                saved='components',
+                output_file=output_file,
+                no_cache=True,
+                stdout=fresh_out,
+                stderr=StringIO(),
+            )
+            self.assertEqual(cached, self._read_output(output_file, fresh_out))
+
+    def _read_output(self, output_file, out):
+        if output_file == '-':
+            return out.getvalue()
+        with gzip.open(output_file, 'rt', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def test_new_dataset_version_invalidates_cache(self):
+        self._run()
+        # bulk_create sends no signals: only the new version shows the change.
+        Component.objects.bulk_create([
+            Component(component_id='B.20.1.1.A', name='Exterior walls')
+        ])
+        self.assertIn('(cached)', self._run()[0])
+        self._ingested('2' * 64)
+        message, result = self._run()
+        self.assertNotIn('(cached)', message)
+        self.assertIn(b'Exterior walls', result)
+
+    def test_editing_a_record_outside_ingest_invalidates_cache(self):
+        self._run()
+        # As the admin or a shell would: a save, then a delete.
+        component = Component.objects.get()
+        component.name = 'Sprinkler piping'
+        component.save()
+        message, result = self._run()
+        self.assertNotIn('(cached)', message)
+        self.assertIn(b'Sprinkler piping', result)
+
+        Component.objects.create(component_id='B.20.1.1.A', name='Walls')
+        self._run()
+        Component.objects.get(component_id='B.20.1.1.A').delete()
+        message, result = self._run()
+        self.assertNotIn('(cached)', message)
+        self.assertNotIn(b'Walls', result)
+
+    def test_only_data_edits_outside_ingest_clear_the_cache(self):
+        with patch('ned_app.signals.clear_cached_results') as clear:
+            # Version records and other apps' models are not data records.
+            DatasetVersion.objects.create(fingerprint='x' * 64)
+            User.objects.create(username='editor')
+            # Ingest writes inside this.
+            with cache_invalidation_suspended():
+                Component.objects.create(component_id='B.20.1.1.A', name='Walls')
+            clear.assert_not_called()
+            Component.objects.get(component_id='B.20.1.1.A').delete()
+        clear.assert_called_once()
+
+    def test_unknown_saved_query_and_conflicting_options(self):
+        with self.assertRaises(CommandError) as cm:
+            call_command('query_to_csv', saved='nope', output_file=self.output_file)
+        self.assertIn('--list-saved', str(cm.exception))
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'query_to_csv',
+                saved='components',
+                fields='name',
+                output_file=self.output_file,
+            )
+        self.assertIn('--fields', str(cm.exception))
+
+    def test_list_saved(self):
+        out = StringIO()
+        call_command('query_to_csv', list_saved=True, stdout=out)
+        self.assertIn('components: Component names', out.getvalue())
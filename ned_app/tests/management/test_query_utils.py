@@ -0,0 +1,196 @@
+"""
+Unit tests for the query_to_csv helpers in query_utils: column resolution
+the --filter grammar and --agg parsing (pure functions, no database).
+"""
+
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import Q
+from django.test import SimpleTestCase
+
+from ned_app.management import query_utils
+from ned_app.models import (
+    Experiment,
+    ExperimentFragilityModelBridge,
+    Reference,
+)
+
+
+class ResolveColumnTests(SimpleTestCase):
+    """Tests for query_utils.resolve_column."""
+
+    def test_plain_field_uses_attname(self):
+        self.assertEqual(
+            query_utils.resolve_column(Experiment, 'material'),
+            ('material', 'material', False),
+        )
+
+    def test_foreign_key_uses_stored_natural_key(self):
+        self.assertEqual(
+            query_utils.resolve_column(Experiment, 'reference'),
+            ('reference', 'reference_id', False),
+        )
+
+    def test_related_path_becomes_join_lookup(self):
+        self.assertEqual(
+            query_utils.resolve_column(
+                ExperimentFragilityModelBridge, 'fragility_model__reference__year'
+            ),
+            (
+                'fragility_model__reference__year',
+                'fragility_model__reference__year',
+                False,
+            ),
+        )
+
+    def test_related_json_field_flagged(self):
+        _, _, is_json = query_utils.resolve_column(Experiment, 'reference__csl_data')
+        self.assertTrue(is_json)
+
+    def test_top_level_reverse_relation_has_no_lookup(self):
+        self.assertEqual(
+            query_utils.resolve_column(Reference, 'experiment'),
+            ('experiment', None, False),
+        )
+
+    def test_cannot_follow_non_relation(self):
+        with self.assertRaises(FieldError):
+            query_utils.resolve_column(Experiment, 'material__name')
+
+    def test_cannot_follow_reverse_relation(self):
+        with self.assertRaises(FieldError):
+            query_utils.resolve_column(Reference, 'experiment__material')
+
+    def test_unknown_segment_raises(self):
+        with self.assertRaises(FieldDoesNotExist):
+            query_utils.resolve_column(Experiment, 'component__bogus')
+
+
+class EncodeRowTests(SimpleTestCase):
+    """Tests for query_utils.encode_row."""
+
+    def test_json_values_encoded_and_empty_columns_filled(self):
+        columns = [
+            ('csl_data', 'csl_data', True),
+            ('experiment', None, False),
+            ('year', 'year', False),
+        ]
+        self.assertEqual(
+            query_utils.encode_row(columns, ({'title': 'T'}, 2020)),
+            ['{"title": "T"}', '', 2020],
+        )
+
+
+class ParseFilterTests(SimpleTestCase):
+    """Tests for query_utils.parse_filter."""
+
+    def test_comma_joins_with_and(self):
+        self.assertEqual(
+            query_utils.parse_filter('material=Steel,test_type=Tensile'),
+            Q(material='Steel') & Q(test_type='Tensile'),
+        )
+
+    def test_value_may_contain_equals(self):
+        self.assertEqual(
+            query_utils.parse_filter('notes=ratio=0.5'), Q(notes='ratio=0.5')
+        )
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertEqual(
+            query_utils.parse_filter('a=1,b=2|c=3'),
+            (Q(a='1') & Q(b='2')) | Q(c='3'),
+        )
+
+    def test_parentheses_group(self):
+        self.assertEqual(
+            query_utils.parse_filter('a=1,(b=2|c=3)'),
+            Q(a='1') & (Q(b='2') | Q(c='3')),
+        )
+
+    def test_negation(self):
+        self.assertEqual(query_utils.parse_filter('!a=1'), ~Q(a='1'))
+        self.assertEqual(query_utils.parse_filter('a!=1'), ~Q(a='1'))
+        self.assertEqual(
+            query_utils.parse_filter('!(a=1|b=2)'), ~(Q(a='1') | Q(b='2'))
+        )
+
+    def test_list_and_boolean_lookups(self):
+        self.assertEqual(
+            query_utils.parse_filter('component__in=C.10.1.1.A; C.30.3.2.A'),
+            Q(component__in=['C.10.1.1.A', 'C.30.3.2.A']),
+        )
+        self.assertEqual(
+            query_utils.parse_filter('edp_value__range=0.1;0.5'),
+            Q(edp_value__range=['0.1', '0.5']),
+        )
+        self.assertEqual(
+            query_utils.parse_filter('alt_edp_value__isnull=True'),
+            Q(alt_edp_value__isnull=True),
+        )
+
+    def test_quoted_value_keeps_separators(self):
+        self.assertEqual(
+            query_utils.parse_filter(
+                'test_type="Dynamic, uniaxial"|notes="a ""b"""'
+            ),
+            Q(test_type='Dynamic, uniaxial') | Q(notes='a "b"'),
+        )
+
+    def test_legacy_pairs_keep_values_literally(self):
+        # Filters from before the expression syntax: values are taken up to
+        # the next ',' even when they hold '|' or parentheses.
+        self.assertEqual(
+            query_utils.parse_filter('specimen=W1 (repair),notes=a|b'),
+            Q(specimen='W1 (repair)') & Q(notes='a|b'),
+        )
+        self.assertEqual(query_utils.parse_filter('a=1)'), Q(a='1)'))
+        # Text that parses as an expression is read as one.
+        self.assertEqual(
+            query_utils.parse_filter('notes=a|b=c'), Q(notes='a') | Q(b='c')
+        )
+
+    def test_malformed_expressions_raise(self):
+        for text in (
+            'no_equals_sign',
+            'a=1,',
+            '(a=1',
+            '!a="unterminated',
+            'edp_value__range=1',
+            'notes__isnull=maybe',
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    query_utils.parse_filter(text)
+
+
+class ParseAggregatesTests(SimpleTestCase):
+    """Tests for query_utils.parse_aggregates and quantile."""
+
+    def test_bare_functions_take_next_field(self):
+        self.assertEqual(
+            query_utils.parse_aggregates('count,min,max,avg:edp_value'),
+            [
+                ('count', None),
+                ('min', 'edp_value'),
+                ('max', 'edp_value'),
+                ('avg', 'edp_value'),
+            ],
+        )
+
+    def test_explicit_fields_and_quantiles(self):
+        self.assertEqual(
+            query_utils.parse_aggregates(
+                'count:component,median:edp_value,p90:ds_rank'
+            ),
+            [('count', 'component'), ('median', 'edp_value'), ('p90', 'ds_rank')],
+        )
+
+    def test_invalid_aggregates_raise(self):
+        for text in ('avg', 'mode:edp_value', 'p100:edp_value', 'count,max'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    query_utils.parse_aggregates(text)
+
+    def test_quantile_interpolates(self):
+        self.assertEqual(query_utils.quantile([1.0, 2.0, 4.0], 0.5), 2.0)
+        self.assertEqual(query_utils.quantile([1.0, 2.0, 4.0], 0.75), 3.0)
+        self.assertEqual(query_utils.quantile([5.0], 0.9), 5.0)
@@ -0,0 +1,125 @@
+"""
+Tests for the byte-offset record index: spans in .json and .ndjson files,
+lookups across shards, and re-indexing when a file changes.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from ned_app.management import record_index
+
+
+class RecordIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        os.makedirs(os.path.join(self.data_dir, 'experiment'))
+        patcher = patch(
+            'ned_app.management.record_index.build_json_data_file_path',
+            side_effect=lambda name: os.path.join(self.data_dir, name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _index(self):
+        return record_index.RecordIndex(
+            'experiment.json', directory=os.path.join(self.temp_dir, 'index')
+        )
+
+    def _write(self, name, text, age=None):
+        path = os.path.join(self.data_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if age is not None:
+            old = time.time() - age
+            os.utime(path, (old, old))
+        return path
+
+    def test_spans_cover_each_record_in_both_formats(self):
+        records = [{'id': 'é1', 'v': [1, {'w': '],'}]}, {'id': 'e2'}, {}]
+        cases = {
+            # Non-ASCII text, as a hand edit might leave it.
+            'a.json': json.dumps(records, indent=4, ensure_ascii=False),
+            'b.json': json.dumps(records),
+            'c.ndjson': '\n'.join(json.dumps(r) for r in records) + '\n\n',
+            'd.json': ' [ ] ',
+        }
+        for name, text in cases.items():
+            with self.subTest(name=name):
+                data = text.encode('utf-8')
+                spans = list(record_index.scan_record_spans(name, data))
+                for record, offset, length in spans:
+                    self.assertEqual(
+                        json.loads(data[offset : offset + length]), record
+                    )
+                self.assertEqual(
+                    [r for r, _, _ in spans], [] if name == 'd.json' else records
+                )
+
+    def test_lookup_reads_only_the_indexed_slice(self):
+        self._write(
+            'experiment.json',
+            json.dumps([{'id': 'e1'}, {'_comment': 'x'}, {'id': 'e2', 'v': 'é'}]),
+            age=3600,
+        )
+        self._write(
+            os.path.join('experiment', 'A-2020.ndjson'),
+            '{"id": "e2", "v": "shadowed"}\n{"id": "e3"}\n',
+            age=3600,
+        )
+        index = self._index()
+        self.assertEqual(index.lookup(('e2',)), {'id': 'e2', 'v': 'é'})
+        self.assertEqual(index.lookup(('e3',)), {'id': 'e3'})
+        self.assertIsNone(index.lookup(('missing',)))
+
+        # Once indexed, unchanged files are neither read nor parsed again.
+        with patch.object(record_index, 'scan_record_spans') as scan:
+            self.assertEqual(self._index().lookup(('e1',)), {'id': 'e1'})
+        scan.assert_not_called()
+
+    def test_changed_and_removed_files_are_reindexed(self):
+        path = self._write('experiment.json', json.dumps([{'id': 'e1', 'v': 1}]))
+        shard = self._write(
+            os.path.join('experiment', 'A-2020.json'), json.dumps([{'id': 'e2'}])
+        )
+        index = self._index()
+        self.assertEqual(index.lookup(('e1',)), {'id': 'e1', 'v': 1})
+
+        # Same size, mtime and inode: only the digest shows the change.
+        stat = os.stat(path)
+        self._write('experiment.json', json.dumps([{'id': 'e1', 'v': 2}]))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(index.lookup(('e1',)), {'id': 'e1', 'v': 2})
+
+        os.remove(shard)
+        self.assertIsNone(index.lookup(('e2',)))
+
+    def test_file_replaced_after_indexing_is_not_sliced_blindly(self):
+        # A writer publishes a new file between the index refresh and the
+        # read: the old offsets would cut the wrong bytes, so the lookup
+        # notices the new stamp, re-indexes and reads again.
+        path = self._write(
+            'experiment.json', json.dumps([{'id': 'e1'}, {'id': 'e2'}]), age=3600
+        )
+        index = self._index()
+        refresh = index.refresh
+        replaced = []
+
+        def refresh_then_replace(connection):
+            indexed = refresh(connection)
+            if not replaced:
+                temp = self._write('experiment.tmp', json.dumps([{'id': 'e2'}]))
+                os.replace(temp, path)
+                replaced.append(path)
+            return indexed
+
+        with patch.object(index, 'refresh', side_effect=refresh_then_replace) as p:
+            self.assertEqual(index.lookup(('e2',)), {'id': 'e2'})
+        self.assertEqual(p.call_count, 2)
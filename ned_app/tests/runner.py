@@ -0,0 +1,27 @@
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class NEDTestRunner(DiscoverRunner):
+    """
+    Test runner that keeps the tests out of the project's cache directory.
+
+    NED_CACHE_DIR points at a temporary directory for the whole run, so that
+    cached query results, record indexes and parsed files written by the
+    tests (or cleared by them, e.g. when a model is saved) never touch the
+    developer's own .ned_cache/.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='ned-test-cache-')
+        self._cache_settings = override_settings(NED_CACHE_DIR=self._cache_dir)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
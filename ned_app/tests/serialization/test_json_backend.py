@@ -0,0 +1,126 @@
+import itertools
+import json
+import os
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from ned_app.serialization import json_backend
+from ned_app.serialization.file_and_path_utiles import get_data_dir
+
+
+# Values whose text differs between JSON libraries, or that only the stdlib
+# accepts.
+_TRICKY_JSON = [
+    b'[1e-05, 1e+16, 1.5e-07, 0.1, -0.0, 100000000000000.0, 5e-324]',
+    b'{"a": 1, "a": 2}',
+    b'"\\u00e9\\ud83d\\ude00\\u2028\\u007f \xc3\xa9"',
+    b'[NaN, Infinity, -Infinity]',
+    b'18446744073709551615',
+    b'\xef\xbb\xbf[1]',
+    b'"\\ud800"',
+]
+
+# The installed parsers: orjson (when installed) and the stdlib fallback.
+_BACKENDS = [json_backend.orjson, None] if json_backend.orjson else [None]
+
+
+def _backend_name(orjson):
+    return 'stdlib' if orjson is None else 'orjson'
+
+
+class CanonicalDumpsTests(SimpleTestCase):
+    """dumps_canonical must write the files' existing bytes, always."""
+
+    def test_matches_the_stdlib_canonical_layout(self):
+        records = [
+            {'b': 0.1, 'a': 'é 😀 \x7f', 'c': [1e-05, 1e16, {}, []], 'd': None},
+            {'value': Decimal('0.025'), 'flag': True, 'n': -3},
+        ]
+        expected = json.dumps(
+            [{**records[0]}, {**records[1], 'value': 0.025}],
+            indent=4,
+            sort_keys=True,
+            ensure_ascii=True,
+        )
+        self.assertEqual(json_backend.dumps_canonical(records), expected)
+        self.assertEqual(
+            json_backend.dumps_canonical(records, trailing_newline=True),
+            expected + '\n',
+        )
+        self.assertEqual(
+            json_backend.dumps_line(records[1]),
+            '{"flag": true, "n": -3, "value": 0.025}\n',
+        )
+
+    def test_round_trips_the_canonical_data_files_byte_for_byte(self):
+        data_dir = get_data_dir()
+        names = (
+            sorted(name for name in os.listdir(data_dir) if name.endswith('.json'))
+            if os.path.isdir(data_dir)
+            else []
+        )
+        if not names:
+            self.skipTest('No canonical data files in this checkout.')
+        for orjson, name in itertools.product(_BACKENDS, names):
+            with (
+                self.subTest(backend=_backend_name(orjson), name=name),
+                patch.object(json_backend, 'orjson', orjson),
+            ):
+                with open(os.path.join(data_dir, name), 'rb') as f:
+                    data = f.read()
+                text = json_backend.dumps_canonical(json_backend.loads(data))
+                self.assertEqual(text.encode('ascii'), data.rstrip(b'\n'))
+
+    def test_writing_does_not_depend_on_orjson(self):
+        # Writes always use the stdlib, so the files are the same bytes
+        # whether or not orjson is installed.
+        records = [{'b': 1e-05, 'a': 'é', 'c': [1e16, 0.1]}]
+        with patch.object(json_backend, 'orjson', None):
+            expected = (
+                json_backend.dumps_canonical(records),
+                json_backend.dumps_line(records[0]),
+            )
+        for orjson in _BACKENDS:
+            with (
+                self.subTest(backend=_backend_name(orjson)),
+                patch.object(json_backend, 'orjson', orjson),
+            ):
+                self.assertEqual(
+                    (
+                        json_backend.dumps_canonical(records),
+                        json_backend.dumps_line(records[0]),
+                    ),
+                    expected,
+                )
+
+
+class LoadsTests(SimpleTestCase):
+    """loads gives the stdlib's results with or without orjson."""
+
+    def _assert_same(self, data):
+        # repr() also tells floats from ints, -0.0 from 0.0 and compares NaN.
+        self.assertEqual(repr(json_backend.loads(data)), repr(json.loads(data)))
+        if data.isascii():
+            text = data.decode('ascii')
+            self.assertEqual(repr(json_backend.loads(text)), repr(json.loads(text)))
+
+    @skipIf(json_backend.orjson is None, 'orjson is not installed')
+    def test_orjson_results_match_the_stdlib(self):
+        for text in _TRICKY_JSON:
+            with self.subTest(text=text):
+                self._assert_same(text)
+
+    def test_stdlib_fallback(self):
+        with patch.object(json_backend, 'orjson', None):
+            for text in _TRICKY_JSON:
+                with self.subTest(text=text):
+                    self._assert_same(text)
+
+    def test_invalid_json_raises_the_stdlib_error(self):
+        for orjson in _BACKENDS:
+            with patch.object(json_backend, 'orjson', orjson):
+                with self.assertRaises(json.JSONDecodeError):
+                    json_backend.loads(b'[1, 2')
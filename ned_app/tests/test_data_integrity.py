@@ -13,6 +13,16 @@ from ned_app.models import (
     FragilityCurve,
     derive_reference_id,
 )
+from ned_app.management.canonical_store import canonical_store
+from ned_app.serialization.file_and_path_utiles import list_data_file_paths
+
+
+def _read_data_file(path):
+    """Read a canonical data file's records, from the file and its shards."""
+    records = []
+    for data_path in list_data_file_paths(path):
+        records.extend(canonical_store.records(data_path))
+    return records
 
 
 @tag('integrity')
@@ -169,13 +179,13 @@ class DataIntegrityTests(TransactionTestCase):
             }
 
             for json_file, sort_func in json_files.items():
-                canonical_path = os.path.join(canonical_data_dir, json_file)
-                with open(canonical_path, 'r') as f:
-                    canonical_data = json.load(f)
-
-                exported_path = os.path.join(temp_export_dir, json_file)
-                with open(exported_path, 'r') as f:
-                    exported_data = json.load(f)
+                # Each file may be stored whole and/or as shards.
+                canonical_data = _read_data_file(
+                    os.path.join(canonical_data_dir, json_file)
+                )
+                exported_data = _read_data_file(
+                    os.path.join(temp_export_dir, json_file)
+                )
 
                 # Sort both datasets by their key(s) to ensure order-independent comparison
                 canonical_data_sorted = sorted(canonical_data, key=sort_func)
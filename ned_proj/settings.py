@@ -122,3 +122,18 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Runs the tests with NED_CACHE_DIR in a temporary directory.
+TEST_RUNNER = 'ned_app.tests.runner.NEDTestRunner'
+
+# Local cache for derived data such as saved query results. Safe to delete.
+NED_CACHE_DIR = BASE_DIR / '.ned_cache'
+
+# Pickle parsed data files into NED_CACHE_DIR/parsed, so that later commands
+# load large files without re-parsing them. Off unless enabled here.
+NED_PARSE_CACHE = False
+
+# Where ingest and build_manifest read the canonical data files when no
+# --source is given: a directory, a .zip archive or 'git:<revision>'. None
+# reads resources/data/ under BASE_DIR.
+NED_DATA_SOURCE = None